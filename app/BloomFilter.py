@@ -0,0 +1,79 @@
+import math
+
+import polars as pl
+
+DEFAULT_FALSE_POSITIVE_RATE = 0.01
+
+
+def key_struct(frame, key_columns):
+    """Key columns of a DataFrame as one struct Series of strings
+
+    Values are hashed as strings, so both sides must first be cast to the
+    same types, see main.bloom_filter, for equal keys to hash alike.
+    """
+    return frame.select(
+        pl.struct([pl.col(column).cast(pl.String) for column in key_columns]).alias("key")
+    ).to_series()
+
+
+class BloomFilter:
+    """Compact, approximate set of keys with no false negatives.
+
+    Bits are a Boolean Series, which Polars stores packed eight to a byte,
+    so 100 million keys at a 1% false-positive rate take about 120 MB.
+    Bit positions come from two seeded Polars hashes of each key combined
+    by double hashing, so the filter is only valid for the Polars version
+    that built it.
+    """
+    def __init__(self, bits, hash_count):
+        self.bits = bits
+        self.hash_count = hash_count
+
+    @classmethod
+    def for_capacity(cls, expected_keys, false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+        """Empty filter sized for expected_keys at the given false-positive rate"""
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("The false-positive rate must be between 0 and 1")
+        expected_keys = max(expected_keys, 1)
+        size = math.ceil(-expected_keys * math.log(false_positive_rate) / math.log(2) ** 2)
+        return cls(pl.repeat(False, max(size, 64), eager=True).alias("bits"), hash_count(false_positive_rate))
+
+    @property
+    def size(self):
+        return self.bits.len()
+
+    def _positions(self, keys):
+        # Double hashing, h1 + i * h2, stands in for hash_count independent hashes
+        h1 = keys.hash(seed=0) % self.size
+        h2 = keys.hash(seed=1) % self.size
+        for i in range(self.hash_count):
+            yield (h1 + h2 * i) % self.size
+
+    def add(self, keys):
+        """Add a Series of keys, see key_struct
+
+        Each call rewrites the whole bit array, so add keys in large batches.
+        """
+        # Boolean scatter needs sorted indices
+        positions = pl.concat(list(self._positions(keys))).unique().sort()
+        self.bits.scatter(positions, True)
+
+    def contains(self, keys):
+        """Boolean Series, False where a key is certainly not in the filter"""
+        result = None
+        for positions in self._positions(keys):
+            found = self.bits.gather(positions)
+            result = found if result is None else result & found
+        return result.alias("candidate")
+
+    def to_frame(self):
+        return pl.DataFrame({"bits": self.bits})
+
+    @classmethod
+    def from_frame(cls, frame, false_positive_rate):
+        return cls(frame.get_column("bits"), hash_count(false_positive_rate))
+
+
+def hash_count(false_positive_rate):
+    """Optimal number of hashes, which only depends on the false-positive rate"""
+    return max(1, round(-math.log2(false_positive_rate)))
@@ -3,14 +3,18 @@ import polars as pl
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QPushButton, QLabel, QFileDialog, QTabWidget,
                             QTableView, QHeaderView, QFrame, QComboBox,
-                            QGroupBox, QMessageBox, QApplication)
+                            QGroupBox, QMessageBox, QListWidget, QAbstractItemView,
+                            QCheckBox, QDoubleSpinBox)
 from PyQt5.QtCore import Qt, QMimeData
 from PyQt5.QtGui import QDragEnterEvent, QDropEvent
 
+import app.main as main
+import app.export as export
 from app.css.bulk_style import BULK_STYLESHEET
-from app.PolarsTableModel import PolarsTableModel
+from app.PolarsTableModel import PolarsTableModel, DEFAULT_BLOCK_SIZE
+from app.BloomFilter import DEFAULT_FALSE_POSITIVE_RATE
 from app.components.FileListWidget import FileListWidget
-from app.ProcessingDialog import ProcessingDialog
+from app.Worker import run_in_background
 
 class DropArea(QFrame):
     def __init__(self, parent=None):
@@ -89,8 +93,10 @@ class BulkProcessorWindow(QMainWindow):
         
         # State variables
         self.csv_files = []
-        self.df_map = {}  # Map of filename to DataFrame
+        self.schema_map = {}  # Map of filename to schema, data is only read by merge and subtract
         self.result_df = None
+        self.result_path = None  # Working-set file backing an eager result
+        self.result_row_count = 0
         
         # Initialize UI
         self.init_ui()
@@ -193,7 +199,7 @@ class BulkProcessorWindow(QMainWindow):
         subtract_tab = QWidget()
         subtract_layout = QVBoxLayout(subtract_tab)
         
-        subtract_info = QLabel("Subtract CSV2 from CSV1 based on a common column (e.g., remove rows with matching emails).")
+        subtract_info = QLabel("Subtract CSV2 from CSV1 based on common columns (e.g., remove rows with matching emails).")
         subtract_info.setWordWrap(True)
         subtract_layout.addWidget(subtract_info)
         
@@ -221,16 +227,42 @@ class BulkProcessorWindow(QMainWindow):
         subtract_layout.addWidget(files_group)
         
         # Column selection for subtraction
-        subtract_key_group = QGroupBox("Select Matching Column")
+        subtract_key_group = QGroupBox("Select Matching Columns")
         subtract_key_layout = QVBoxLayout()
         subtract_key_label = QLabel("Select a column to match rows:")
         self.subtract_column_combo = QComboBox()
         
+        # Optional extra columns for keys such as first name + last name + company
+        subtract_extra_label = QLabel("Also match on (optional):")
+        self.subtract_key_list = QListWidget()
+        self.subtract_key_list.setSelectionMode(QAbstractItemView.MultiSelection)
+        self.subtract_key_list.setMaximumHeight(100)
+        
         subtract_key_layout.addWidget(subtract_key_label)
         subtract_key_layout.addWidget(self.subtract_column_combo)
+        subtract_key_layout.addWidget(subtract_extra_label)
+        subtract_key_layout.addWidget(self.subtract_key_list)
         subtract_key_group.setLayout(subtract_key_layout)
         subtract_layout.addWidget(subtract_key_group)
         
+        # Approximate pre-filter for exclusion files too large to hold as a key set
+        bloom_layout = QHBoxLayout()
+        self.bloom_checkbox = QCheckBox("Pre-filter with a Bloom filter (for very large File 2)")
+        self.bloom_checkbox.setToolTip(
+            "Rows that certainly have no match are skipped using a compact filter of File 2's keys, "
+            "saved for reuse. Only likely matches are checked exactly, the result is the same."
+        )
+        self.bloom_rate_spin = QDoubleSpinBox()
+        self.bloom_rate_spin.setRange(0.01, 10.0)
+        self.bloom_rate_spin.setSingleStep(0.1)
+        self.bloom_rate_spin.setValue(DEFAULT_FALSE_POSITIVE_RATE * 100)
+        self.bloom_rate_spin.setSuffix(" % false positives")
+        self.bloom_rate_spin.setEnabled(False)
+        self.bloom_checkbox.toggled.connect(self.bloom_rate_spin.setEnabled)
+        bloom_layout.addWidget(self.bloom_checkbox, stretch=1)
+        bloom_layout.addWidget(self.bloom_rate_spin)
+        subtract_layout.addLayout(bloom_layout)
+        
         # Apply subtraction button
         subtract_button_layout = QHBoxLayout()
         subtract_button_layout.addStretch()
@@ -277,6 +309,7 @@ class BulkProcessorWindow(QMainWindow):
         self.table_view.setAlternatingRowColors(True)
         self.table_model = PolarsTableModel()
         self.table_view.setModel(self.table_model)
+        self.table_model.fetch_failed.connect(lambda error: self.status_label.setText(f"Could not read rows: {error}"))
         self.table_view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
         self.table_view.horizontalHeader().setStretchLastSection(True)
         
@@ -296,48 +329,69 @@ class BulkProcessorWindow(QMainWindow):
         main_layout.addLayout(content_layout)
     
     def process_files(self, file_paths):
-        """Process multiple CSV files"""
+        """Register CSV files by their schema, each file is added as soon as it is read
+        
+        Only the header and the rows needed to infer column types are read
+        here. Merge and subtract load the data when they run.
+        """
         if not file_paths:
             return
         
-        progress_dialog = ProcessingDialog(self, "Loading CSV files, please wait...")
-        progress_dialog.set_progress(0)
-        progress_dialog.show()
-        QApplication.processEvents()
+        # Skip files that are already loaded
+        new_paths = [file_path for file_path in dict.fromkeys(file_paths) if file_path not in self.csv_files]
+        if not new_paths:
+            return
         
-        try:
-            total_files = len(file_paths)
-            
-            for i, file_path in enumerate(file_paths):
-                # Update progress
-                progress = int((i / total_files) * 100)
-                progress_dialog.set_progress(progress)
-                progress_dialog.set_message(f"Loading {os.path.basename(file_path)}...")
-                QApplication.processEvents()
-                
-                # Skip if already loaded
-                if file_path in self.csv_files:
-                    continue
-                
-                # Load file
-                df = self._load_csv(file_path)
-                
-                if df is not None:
-                    self.csv_files.append(file_path)
-                    self.df_map[file_path] = df
-                    self.file_list_widget.add_file(file_path)
-            
-            # Update UI with new files
-            self._update_ui_with_files()
-            
-            progress_dialog.set_progress(100)
-            progress_dialog.set_message("Files loaded successfully")
-            QApplication.processEvents()
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error loading files: {str(e)}")
-        finally:
-            progress_dialog.close()
+        # List the files right away, their state follows the load
+        for file_path in new_paths:
+            if os.path.isfile(file_path):
+                self.file_list_widget.add_file(file_path, "Waiting...")
+        
+        def job(progress_callback, cancel_token, partial_callback):
+            total_files = len(new_paths)
+            finished = []
+            
+            def file_callback(file_path, state, value):
+                if state != "loading":
+                    finished.append(file_path)
+                    progress_callback(int(len(finished) / total_files * 100),
+                                      f"Read {len(finished)} of {total_files} files")
+                partial_callback((file_path, state, value))
+            
+            progress_callback(0, f"Reading {total_files} files...")
+            return main.load_csv_files(new_paths, file_callback, cancel_token=cancel_token, schema_only=True)
+        
+        def on_partial(update):
+            file_path, state, value = update
+            if file_path not in self.file_list_widget.files:
+                # Removed from the list while it was loading
+                return
+            if state == "loading":
+                self.file_list_widget.set_file_status(file_path, "Reading...")
+            elif state == "failed":
+                self.file_list_widget.set_file_status(file_path, "Failed", error=True)
+            else:
+                self.csv_files.append(file_path)
+                self.schema_map[file_path] = value
+                self.file_list_widget.set_file_status(file_path, "")
+                self._update_ui_with_files()
+        
+        def drop_unloaded():
+            # Files that failed, or never started because of a cancel, leave the list
+            for file_path in new_paths:
+                if file_path not in self.csv_files:
+                    self.file_list_widget.remove_file(file_path)
+        
+        def on_result(result):
+            _, failed = result
+            if failed:
+                QMessageBox.critical(
+                    self, "Error",
+                    "Failed to load CSV file:\n" + "\n".join(f"{os.path.basename(path)}: {error}" for path, error in failed)
+                )
+        
+        run_in_background(self, "Loading CSV files, please wait...", job, on_result, "Error loading files",
+                          on_finished=drop_unloaded, on_cancelled=self.show_cancelled, on_partial=on_partial)
     
     def add_files(self):
         """Add CSV files to the processor"""
@@ -348,23 +402,24 @@ class BulkProcessorWindow(QMainWindow):
     def clear_files(self):
         """Clear all loaded files"""
         self.csv_files = []
-        self.df_map = {}
+        self.schema_map = {}
         self.file_list_widget.clear()
         self._update_ui_with_files()
         
         # Clear result
-        self.result_df = None
+        self._set_result(None, None, 0)
         self.table_model.setDataFrame(pl.DataFrame())
         self.row_count_label.setText("Rows: 0 | Columns: 0")
         self.status_label.setText("No operation performed yet")
+        self.status_label.setToolTip("")
         self.download_button.setEnabled(False)
     
     def handle_file_removed(self, file_path):
         """Handle file removed from list"""
         if file_path in self.csv_files:
             self.csv_files.remove(file_path)
-            if file_path in self.df_map:
-                del self.df_map[file_path]
+            if file_path in self.schema_map:
+                del self.schema_map[file_path]
             
             self._update_ui_with_files()
     
@@ -380,57 +435,83 @@ class BulkProcessorWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Please select a column for merging")
             return
         
-        # Show processing dialog
-        progress_dialog = ProcessingDialog(self, "Merging CSV files, please wait...")
-        progress_dialog.set_progress(20)
-        progress_dialog.show()
-        QApplication.processEvents()
-        
-        try:
-            # Get all dataframes
-            dataframes = [self.df_map[file] for file in self.csv_files]
-            
-            # Ensure all dataframes have the merge column
-            if not all(merge_column in df.columns for df in dataframes):
-                raise ValueError(f"Not all files have the column: {merge_column}")
-            
-            progress_dialog.set_progress(40)
-            progress_dialog.set_message("Concatenating dataframes...")
-            QApplication.processEvents()
-            
-            # Concatenate dataframes
-            merged_df = pl.concat(dataframes, how="vertical")
-            
-            # Remove duplicates based on the merge column
-            progress_dialog.set_progress(70)
-            progress_dialog.set_message("Removing duplicates...")
-            QApplication.processEvents()
-            
-            merged_df = merged_df.unique(subset=[merge_column])
-            
+        file_paths = list(self.csv_files)
+        file_count = len(file_paths)
+        
+        # Files with other columns or types are aligned to one schema, report what changes
+        _, changes = main.unify_schemas([self.schema_map[file_path] for file_path in file_paths])
+        schema_report = main.describe_schema_changes([os.path.basename(path) for path in file_paths], changes)
+        
+        def job(progress_callback, cancel_token):
+            # Lazily scanned files only show rows that do not fit their sniffed types when read
+            return main.with_relaxed_types(file_paths, lambda: merge_job(progress_callback, cancel_token))
+        
+        def merge_job(progress_callback, cancel_token):
+            if main.use_streaming_merge(file_paths):
+                return streaming_job(progress_callback, cancel_token)
+            
+            # Files are only loaded now, from the parsed-file cache when it has them
+            progress_callback(10, "Loading files...")
+            loaded, failed = main.load_csv_files(file_paths, cancel_token=cancel_token)
+            if failed:
+                raise ValueError("\n".join(f"{os.path.basename(path)}: {error}" for path, error in failed))
+            frames = dict(loaded)
+            dataframes = [frames[file_path] for file_path in file_paths]
+            
+            progress_callback(20, "Checking columns...")
+            
+            # Concatenate the files and remove duplicates based on the merge column,
+            # lazily when some files are above the streaming threshold
+            progress_callback(40, "Concatenating dataframes...")
+            merged_df = main.merge_frames(dataframes, merge_column)
+            progress_callback(80, "Counting rows...")
+            row_count = main.frame_row_count(merged_df)
+            
+            progress_callback(90, "Updating preview...")
+            preview_df = main.frame_head(merged_df, DEFAULT_BLOCK_SIZE)
+            main.check_cancelled(cancel_token)
+            result_path, merged_df = self._spill_result(merged_df)
+            return merged_df, result_path, row_count, preview_df
+        
+        def streaming_job(progress_callback, cancel_token):
+            # Too large to hold together, dedup in streamed passes straight to the working set
+            partitions = main.merge_partitions(file_paths)
+            # The passes read the CSVs themselves, a cached copy could be evicted between them
+            frames = [main.parse_csv(file_path) for file_path in file_paths]
+            result_path = main.streaming_merge(frames, merge_column, partitions, main.WORKING_SET,
+                                               progress_callback, cancel_token)
+            try:
+                merged_df = pl.scan_ipc(result_path)
+                progress_callback(85, "Counting rows...")
+                row_count = main.frame_row_count(merged_df)
+                progress_callback(90, "Updating preview...")
+                preview_df = main.frame_head(merged_df, DEFAULT_BLOCK_SIZE)
+                main.check_cancelled(cancel_token)
+            except BaseException:
+                main.WORKING_SET.release(result_path)
+                raise
+            return merged_df, result_path, row_count, preview_df
+        
+        def on_result(result):
             # Update result
-            self.result_df = merged_df
-            
-            progress_dialog.set_progress(90)
-            progress_dialog.set_message("Updating preview...")
-            QApplication.processEvents()
+            merged_df, result_path, row_count, preview_df = result
+            self._set_result(merged_df, result_path, row_count)
             
             # Update UI
-            preview_df = merged_df.head(100)
-            self.table_model.setDataFrame(preview_df)
+            self.table_model.setDataFrame(self.result_df, self.result_row_count, head=preview_df)
             self.table_view.resizeColumnsToContents()
             
-            self.status_label.setText(f"Merged {len(self.csv_files)} files based on column '{merge_column}'")
+            status = f"Merged {file_count} files based on column '{merge_column}'"
+            if schema_report:
+                status += f" ({len(schema_report)} schema adjustments, hover for details)"
+            self.status_label.setText(status)
+            self.status_label.setToolTip("\n".join(schema_report))
             self.result_title.setText("Merged Data Preview")
-            self.row_count_label.setText(f"Rows: {merged_df.shape[0]} | Columns: {merged_df.shape[1]}")
+            self.row_count_label.setText(f"Rows: {self.result_row_count} | Columns: {preview_df.shape[1]}")
             self.download_button.setEnabled(True)
-            
-            progress_dialog.set_progress(100)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error merging files: {str(e)}")
-        finally:
-            progress_dialog.close()
+        
+        run_in_background(self, "Merging CSV files, please wait...", job, on_result, "Error merging files",
+                          on_cancelled=self.show_cancelled)
     
     def apply_subtract(self):
         """Apply subtraction operation (CSV1 - CSV2)"""
@@ -438,96 +519,91 @@ class BulkProcessorWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Please add at least two CSV files for subtraction")
             return
         
-        # Get selected files
+        # Get selected files, the combos hold full paths so equal file names stay apart
         file1 = self.file1_combo.currentText()
         file2 = self.file2_combo.currentText()
+        file1_path = self.file1_combo.currentData()
+        file2_path = self.file2_combo.currentData()
         
-        if not file1 or not file2:
+        if not file1_path or not file2_path:
             QMessageBox.warning(self, "Warning", "Please select both files for subtraction")
             return
         
-        if file1 == file2:
+        if file1_path == file2_path:
             QMessageBox.warning(self, "Warning", "Please select different files for subtraction")
             return
         
-        # Get full file paths
-        file1_path = None
-        file2_path = None
-        for path in self.csv_files:
-            if os.path.basename(path) == file1:
-                file1_path = path
-            elif os.path.basename(path) == file2:
-                file2_path = path
-        
-        if not file1_path or not file2_path:
-            QMessageBox.warning(self, "Warning", "Error finding selected files")
-            return
-        
-        # Get selected column
+        # Get selected columns, every one of them has to match
         subtract_column = self.subtract_column_combo.currentText()
         if not subtract_column:
             QMessageBox.warning(self, "Warning", "Please select a column for matching")
             return
-        
-        # Show processing dialog
-        progress_dialog = ProcessingDialog(self, "Subtracting CSV files, please wait...")
-        progress_dialog.set_progress(20)
-        progress_dialog.show()
-        QApplication.processEvents()
-        
-        try:
-            # Get dataframes
-            df1 = self.df_map[file1_path]
-            df2 = self.df_map[file2_path]
-            
-            # Ensure both dataframes have the selected column
-            if subtract_column not in df1.columns or subtract_column not in df2.columns:
-                raise ValueError(f"Both files must have the column: {subtract_column}")
-            
-            progress_dialog.set_progress(40)
-            progress_dialog.set_message("Performing subtraction operation...")
-            QApplication.processEvents()
-            
-            # Get unique values from the second dataframe
-            values_to_exclude = df2.select(pl.col(subtract_column)).unique().to_series()
-            
-            # Filter the first dataframe to exclude rows matching values from the second
-            result_df = df1.filter(~pl.col(subtract_column).is_in(values_to_exclude))
-            
+        key_columns = [subtract_column] + [
+            item.text() for item in self.subtract_key_list.selectedItems() if item.text() != subtract_column
+        ]
+        
+        false_positive_rate = self.bloom_rate_spin.value() / 100 if self.bloom_checkbox.isChecked() else None
+        
+        def job(progress_callback, cancel_token):
+            return main.with_relaxed_types([file1_path, file2_path],
+                                           lambda: subtract_job(progress_callback, cancel_token))
+        
+        def subtract_job(progress_callback, cancel_token):
+            progress_callback(20, "Loading files...")
+            df1 = main.load_or_scan_csv(file1_path)
+            if false_positive_rate is not None:
+                # Only keys the Bloom filter cannot rule out are looked up in the second file
+                result_df = main.bloom_subtract(df1, file2_path, key_columns, false_positive_rate,
+                                                progress_callback, cancel_token)
+            else:
+                # The second file is only read for its key columns, from its key index once built
+                excluded = main.exclusion_keys(file2_path, key_columns)
+                main.check_cancelled(cancel_token)
+                
+                # Anti-join the first file against the keys of the second
+                progress_callback(40, "Performing subtraction operation...")
+                result_df = main.subtract_frame(df1, excluded, key_columns)
+            result_path, result_df = self._spill_result(result_df)
+            try:
+                progress_callback(60, "Counting rows...")
+                row_count = main.frame_row_count(result_df)
+                removed_count = main.frame_row_count(df1) - row_count
+                
+                progress_callback(90, "Updating preview...")
+                preview_df = main.frame_head(result_df, DEFAULT_BLOCK_SIZE)
+                main.check_cancelled(cancel_token)
+            except BaseException:
+                main.WORKING_SET.release(result_path)
+                raise
+            return result_df, result_path, row_count, removed_count, preview_df
+        
+        def on_result(result):
             # Update result
-            self.result_df = result_df
-            
-            progress_dialog.set_progress(90)
-            progress_dialog.set_message("Updating preview...")
-            QApplication.processEvents()
+            result_df, result_path, row_count, removed_count, preview_df = result
+            self._set_result(result_df, result_path, row_count)
             
             # Update UI
-            preview_df = result_df.head(100)
-            self.table_model.setDataFrame(preview_df)
+            self.table_model.setDataFrame(self.result_df, self.result_row_count, head=preview_df)
             self.table_view.resizeColumnsToContents()
             
-            removed_count = df1.shape[0] - result_df.shape[0]
-            self.status_label.setText(f"Removed {removed_count} rows from '{file1}' with '{subtract_column}' matching '{file2}'")
+            self.status_label.setToolTip("")
+            self.status_label.setText(f"Removed {removed_count} rows from '{file1}' with '{', '.join(key_columns)}' matching '{file2}'")
             self.result_title.setText("Subtraction Result Preview")
-            self.row_count_label.setText(f"Rows: {result_df.shape[0]} | Columns: {result_df.shape[1]}")
+            self.row_count_label.setText(f"Rows: {self.result_row_count} | Columns: {preview_df.shape[1]}")
             self.download_button.setEnabled(True)
-            
-            progress_dialog.set_progress(100)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error subtracting files: {str(e)}")
-        finally:
-            progress_dialog.close()
+        
+        run_in_background(self, "Subtracting CSV files, please wait...", job, on_result, "Error subtracting files",
+                          on_cancelled=self.show_cancelled)
     
     def download_result(self):
-        """Download the result dataframe to a CSV file"""
+        """Export the result in a chosen file format"""
         if self.result_df is None:
             QMessageBox.warning(self, "Warning", "No results to download")
             return
         
         # Create ExportDialog for column selection
         from app.dialogs.ExportDialog import ExportDialog
-        export_dialog = ExportDialog(self, self.result_df.columns)
+        export_dialog = ExportDialog(self, main.frame_columns(self.result_df))
         
         # Show dialog
         if export_dialog.exec_() != export_dialog.Accepted:
@@ -540,45 +616,67 @@ class BulkProcessorWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Please select at least one column to export")
             return
         
-        # Get file path
-        save_path, _ = QFileDialog.getSaveFileName(self, "Save CSV File", "result.csv", "CSV Files (*.csv)")
+        # Get file path and format
+        name_filters = ";;".join(export.file_filter(fmt) for fmt in export.available_formats())
+        save_path, name_filter = QFileDialog.getSaveFileName(self, "Save Result", "result.csv", name_filters)
         if not save_path:
             return
-        
-        # Show processing dialog
-        progress_dialog = ProcessingDialog(self, "Saving CSV file, please wait...")
-        progress_dialog.set_progress(30)
-        progress_dialog.show()
-        QApplication.processEvents()
-        
-        try:
-            # Select only the columns user has chosen
-            export_df = self.result_df.select(selected_columns)
-            
-            # Save the dataframe to CSV
-            export_df.write_csv(save_path)
-            
-            progress_dialog.set_progress(100)
-            progress_dialog.close()
-            
+        fmt = export.format_for_filter(name_filter) or export.format_for_path(save_path)
+        save_path = export.with_extension(save_path, fmt)
+        partitioning = export_dialog.get_partitioning()
+        # Split exports go in a folder named after the chosen file
+        saved_to = export.partition_directory(save_path, fmt) if partitioning else save_path
+        
+        result_df = self.result_df
+        row_count = self.result_row_count
+        
+        def job(progress_callback, cancel_token):
+            # Written from the working set copy, streaming it out if it was never loaded
+            progress_callback(5, "Writing file...")
+            if partitioning:
+                parts, rows = export.export_partitioned(result_df, save_path, partitioning, fmt, selected_columns, "streaming",
+                                                        row_count, progress_callback, cancel_token)
+                progress_callback(100, "Done")
+                return rows, len(parts)
+            rows = export.export_frame(result_df, save_path, fmt, selected_columns, "streaming", row_count,
+                                       progress_callback, cancel_token)
+            progress_callback(100, "Done")
+            return rows, None
+        
+        def on_result(result):
+            rows, file_count = result
+            saved = f"{file_count} files saved to:" if file_count is not None else "File saved successfully to:"
             QMessageBox.information(
                 self, 
                 "Success", 
-                f"File saved successfully to:\n{save_path}\n\nRows: {export_df.shape[0]}\nColumns: {len(selected_columns)}"
+                f"{saved}\n{saved_to}\n\nRows: {rows}\nColumns: {len(selected_columns)}"
             )
-        except Exception as e:
-            progress_dialog.close()
-            QMessageBox.critical(self, "Error", f"Error saving file: {str(e)}")
+        
+        run_in_background(self, "Saving file, please wait...", job, on_result, "Error saving file",
+                          on_cancelled=self.show_cancelled)
+    
+    def _spill_result(self, result_df):
+        """Move a result to the working set, returning (path, frame read from it)
+        
+        Eager results are written and memory-mapped, lazy ones are run once
+        with the streaming engine so scrolling and export read the file
+        instead of running the plan again.
+        """
+        if isinstance(result_df, pl.DataFrame):
+            return main.WORKING_SET.spill(result_df)
+        result_path = main.WORKING_SET.sink(result_df)
+        return result_path, pl.scan_ipc(result_path)
+    
+    def _set_result(self, result_df, result_path, row_count):
+        """Replace the current result, deleting the file behind the previous one"""
+        main.WORKING_SET.release(self.result_path)
+        self.result_df = result_df
+        self.result_path = result_path
+        self.result_row_count = row_count
     
-    def _load_csv(self, file_path):
-        """Load a CSV file using polars"""
-        try:
-            # Load CSV using polars
-            df = pl.read_csv(file_path)
-            return df
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to load CSV file: {str(e)}")
-            return None
+    def show_cancelled(self):
+        """Results are only replaced when a job completes, so nothing to roll back"""
+        self.status_label.setText("Operation cancelled, previous result kept")
     
     def _update_ui_with_files(self):
         """Update UI elements based on loaded files"""
@@ -589,6 +687,7 @@ class BulkProcessorWindow(QMainWindow):
         # Update column dropdown for merge and subtract operations
         self.merge_column_combo.clear()
         self.subtract_column_combo.clear()
+        self.subtract_key_list.clear()
         
         if not self.csv_files:
             # Disable operation buttons
@@ -604,20 +703,21 @@ class BulkProcessorWindow(QMainWindow):
         common_columns = set()
         first = True
         
-        for file_path, df in self.df_map.items():
+        for file_path, schema in self.schema_map.items():
             if first:
-                common_columns = set(df.columns)
+                common_columns = set(schema.names())
                 first = False
             else:
-                common_columns &= set(df.columns)
+                common_columns &= set(schema.names())
         
         # Add file names to dropdown lists
-        for file_path in self.csv_files:
-            file_name = os.path.basename(file_path)
-            self.file1_combo.addItem(file_name)
-            self.file2_combo.addItem(file_name)
+        for file_name, file_path in zip(main.display_names(self.csv_files), self.csv_files):
+            self.file1_combo.addItem(file_name, file_path)
+            self.file2_combo.addItem(file_name, file_path)
         
-        # Add common columns to dropdown lists
-        for column in common_columns:
+        # Add common columns to dropdown lists, in the order the files list them
+        unified_schema, _ = main.unify_schemas([self.schema_map[file_path] for file_path in self.csv_files])
+        for column in (name for name in unified_schema.names() if name in common_columns):
             self.merge_column_combo.addItem(column)
-            self.subtract_column_combo.addItem(column)
\ No newline at end of file
+            self.subtract_column_combo.addItem(column)
+            self.subtract_key_list.addItem(column)
\ No newline at end of file
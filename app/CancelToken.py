@@ -0,0 +1,26 @@
+import threading
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once its cancel token has been triggered"""
+
+
+class CancelToken:
+    """Cooperative cancellation flag shared between the GUI and a running job.
+
+    Long-running functions check it between chunks of work and stop by
+    raising JobCancelled, before they change any state the caller keeps.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise JobCancelled("Operation cancelled")
@@ -0,0 +1,317 @@
+import os
+
+import polars as pl
+
+import app.main as main
+from app.OperationHistory import OperationHistory, DEFAULT_MEMORY_BUDGET
+
+# Position of each row in the source file, carried through the plan so
+# columns that were never loaded can be read back for the same rows
+ROW_INDEX = "__source_row"
+
+
+class LazyPipeline:
+    """Records operations as LazyFrame transforms over a scanned CSV file.
+
+    Nothing is materialized when a step is added. The preview only collects
+    the rows it shows, and the full optimized plan runs once on export.
+    Steps are kept as operation recipes in an OperationHistory, so undo and
+    redo replay them from the source file instead of restoring copies.
+    
+    Files above the streaming threshold run every query on the streaming
+    engine and never materialize more than the preview rows and row masks.
+    
+    Queries read the parsed Arrow IPC copy of the file from the parsed-file
+    cache when there is one, instead of parsing the CSV again. Checkpoints
+    are spilled to the working set, so neither the original data nor undo
+    states are held on the heap and resetting is a replan, not a copy.
+    
+    Without a parsed copy of the whole file, only the columns the steps use
+    are parsed, each into its own cache entry, and the plan runs over those
+    alone. The other columns are read from the CSV for the rows on screen
+    by view(), and for the whole result only when an export asks for them.
+    """
+    def __init__(self, file_path, memory_budget=DEFAULT_MEMORY_BUDGET, streaming=None):
+        self.file_path = file_path
+        self.history = OperationHistory(memory_budget, store=main.WORKING_SET)
+        self.streaming = main.use_streaming(file_path) if streaming is None else streaming
+        self.engine = "streaming" if self.streaming else "auto"
+        self.parse_spec = main.parse_spec(file_path)
+        self.cache_path = main.parsed_copy(file_path)
+        self.source_columns = main.read_csv_schema(file_path).names()
+        if self.cache_path is not None:
+            self.loaded_columns = list(self.source_columns)
+        else:
+            self.loaded_columns = []
+        self.column_paths = {}
+        # Why the columns of the last step could not be cached, they are read from the CSV instead
+        self.cache_error = None
+        self._source_row_count = None
+        self._columns = None
+
+    def load_columns(self, columns):
+        """Parse columns the plan does not have yet into the parsed-file cache"""
+        missing = [column for column in columns
+                   if column in self.source_columns and column not in self.loaded_columns]
+        self.cache_error = None
+        if not missing:
+            return
+        if main.PARSED_FILE_CACHE.enabled:
+            try:
+                self.column_paths.update(main.cached_columns(self.file_path, missing, self.streaming))
+            except Exception as e:
+                # Read straight from the CSV instead, the window reports it
+                self.cache_error = str(e)
+        loaded = set(self.loaded_columns) | set(missing)
+        self.loaded_columns = [column for column in self.source_columns if column in loaded]
+        self._columns = None
+
+    def scan(self):
+        """Return the LazyFrame of the loaded columns of the source file, with the row index"""
+        return self._scan_columns(self.loaded_columns)
+
+    def _scan_columns(self, columns):
+        # The cache entries may have been evicted by another load since
+        if self.cache_path is not None and os.path.exists(self.cache_path):
+            return pl.scan_ipc(self.cache_path, memory_map=True).with_row_index(ROW_INDEX).select([ROW_INDEX] + columns)
+        cached = [column for column in columns
+                  if column in self.column_paths and os.path.exists(self.column_paths[column])]
+        if not cached:
+            return main.parse_csv(self.file_path).with_row_index(ROW_INDEX).select([ROW_INDEX] + columns)
+        frames = [pl.scan_ipc(self.column_paths[column], memory_map=True) for column in cached]
+        rest = [column for column in columns if column not in cached]
+        if rest:
+            frames.append(main.parse_csv(self.file_path).select(rest))
+        return pl.concat(frames, how="horizontal").with_row_index(ROW_INDEX).select([ROW_INDEX] + columns)
+
+    @property
+    def operations(self):
+        return self.history.applied
+
+    @property
+    def descriptions(self):
+        return [operation.description for operation in self.history.applied]
+
+    def apply(self, operation, progress_callback=None, cancel_token=None):
+        """Apply an operation recipe and record it in the history
+        
+        The history is only changed once the step has been computed, so an
+        error or a cancelled job leaves the plan as it was.
+        """
+        self.load_columns(main.operation_columns(operation.op, operation.params))
+        frame, mask, row_count = self.with_relaxed_types(
+            lambda: self._compute_step(operation, progress_callback, cancel_token))
+        
+        main.check_cancelled(cancel_token)
+        operation.mask = mask
+        operation.row_count = row_count
+        self.history.push(operation, frame=frame)
+        self._columns = None
+
+    def _compute_step(self, operation, progress_callback, cancel_token):
+        """(checkpoint frame or None, mask or None, row count) of an operation applied to the plan"""
+        frame = None
+        if operation.op in main.MASK_OPERATIONS and self.streaming:
+            # Only the scored columns are collected, the mask filters the stream
+            columns = main.operation_input_columns(operation.op, operation.params)
+            df = self.plan().select(columns).collect(engine=self.engine)
+            mask = main.operation_mask(df, operation.op, operation.params, progress_callback, cancel_token)
+            row_count = int(mask.sum())
+        elif operation.op in main.MASK_OPERATIONS:
+            # Row-wise scoring needs the data, keep the mask and maybe a checkpoint
+            df = self.plan().collect()
+            mask = main.operation_mask(df, operation.op, operation.params, progress_callback, cancel_token)
+            frame = df.filter(mask)
+            row_count = frame.shape[0]
+        else:
+            # Count before pushing so a failing step leaves the history untouched
+            lf = self._apply_step(self.plan(), operation)
+            mask = None
+            row_count = lf.select(pl.len()).collect(engine=self.engine).item()
+        return frame, mask, row_count
+
+    def apply_recipe(self, operations, progress_callback=None, cancel_token=None):
+        """Append a recorded list of operations as one step of work
+        
+        Only row scoring steps run, to compute their masks. Everything else is
+        chained into the plan without counting rows in between, the count of
+        a step is taken the first time it is asked for.
+        """
+        for operation in operations:
+            self.load_columns(main.operation_columns(operation.op, operation.params))
+        self.with_relaxed_types(lambda: self._compute_recipe_masks(operations, progress_callback, cancel_token))
+        
+        # Push only once every step is ready, so a failed replay changes nothing
+        main.check_cancelled(cancel_token)
+        for operation in operations:
+            self.history.push(operation)
+        self._columns = None
+
+    def _compute_recipe_masks(self, operations, progress_callback, cancel_token):
+        lf = self.plan()
+        total = len(operations)
+        for i, operation in enumerate(operations):
+            main.check_cancelled(cancel_token)
+            if progress_callback:
+                progress_callback(int(i / total * 90), f"Applying {operation.description or operation.op}...")
+            if operation.op in main.MASK_OPERATIONS:
+                columns = main.operation_input_columns(operation.op, operation.params)
+                df = lf.select(columns).collect(engine=self.engine)
+                operation.mask = main.operation_mask(df, operation.op, operation.params, None, cancel_token)
+            lf = self._apply_step(lf, operation)
+
+    def with_relaxed_types(self, run):
+        """Return run(), which builds its frames from plan(), again with relaxed types if the sniffed ones did not fit
+        
+        See main.with_relaxed_types. Scans are lazy, so rows that do not fit
+        the sniffed types only show when run() collects or sinks them.
+        """
+        try:
+            return main.with_relaxed_types([self.file_path], run)
+        finally:
+            self.parse_spec = main.parse_spec(self.file_path)
+
+    def undo(self):
+        operation = self.history.undo()
+        self._columns = None
+        return operation
+
+    def redo(self):
+        operation = self.history.redo()
+        self._columns = None
+        return operation
+
+    def clear(self):
+        """Drop all recorded steps, going back to the source file"""
+        self.history.clear()
+        self._columns = None
+
+    def snapshot(self):
+        return self.history.snapshot()
+
+    def restore(self, state):
+        """Go back to a history snapshot, e.g. after a cancelled undo or reset"""
+        self.history.restore(state)
+        self._columns = None
+
+    def plan(self, applied=None):
+        """Build the LazyFrame for all applied steps, or for the given list of them"""
+        applied = self.history.applied if applied is None else applied
+        # Start from the latest checkpoint so eager work is never repeated
+        index, checkpoint = self.history.latest_checkpoint(applied)
+        if checkpoint is not None:
+            lf = checkpoint.frame.lazy()
+            # Columns loaded since the checkpoint are unchanged by the steps before it
+            missing = [column for column in self.loaded_columns if column not in checkpoint.frame.columns]
+            if missing:
+                lf = lf.join(self._scan_columns(missing), on=ROW_INDEX, how="left", maintain_order="left")
+        else:
+            lf = self.scan()
+
+        for operation in applied[index + 1:]:
+            lf = self._apply_step(lf, operation)
+        return lf
+
+    def _apply_step(self, lf, operation):
+        if operation.mask is not None:
+            return lf.filter(pl.lit(operation.mask))
+        return main.apply_operation(lf, operation.op, operation.params)
+
+    @property
+    def columns(self):
+        """Column names of the current result, resolved without reading rows"""
+        if self._columns is None:
+            names = self.plan().collect_schema().names()
+            added = [name for name in names if name not in self.source_columns and name != ROW_INDEX]
+            self._columns = self.source_columns + added
+        return self._columns
+
+    def view(self):
+        """Snapshot of the current result for the table, see ResultView"""
+        applied = list(self.history.applied)
+        return ResultView(lambda: self.plan(applied), self.columns, self.file_path)
+
+    def preview(self, n=100):
+        """Collect only the first n rows of the current result"""
+        return self.view().fetch_rows(0, n)
+
+    def export_plan(self, columns=None):
+        """LazyFrame of the whole result with all or the given columns
+        
+        Columns that were never loaded are read from the CSV in the same pass
+        and joined back on the row index, nothing is added to the cache.
+        """
+        columns = columns or self.columns
+        lf = self.plan()
+        others = [column for column in columns if column not in lf.collect_schema().names()]
+        if others:
+            extra = (
+                main.parse_csv(self.file_path).with_row_index(ROW_INDEX).select([ROW_INDEX] + others)
+                .join(lf.select(ROW_INDEX), on=ROW_INDEX, how="semi")
+            )
+            lf = lf.join(extra, on=ROW_INDEX, how="left", maintain_order="left")
+        return lf.select(columns)
+
+    def row_count(self):
+        """Row count of the current result, cached on each recorded step"""
+        if self.history.applied:
+            operation = self.history.applied[-1]
+            if operation.row_count is None:
+                operation.row_count = self.with_relaxed_types(
+                    lambda: self.plan().select(pl.len()).collect(engine=self.engine).item())
+            return operation.row_count
+        if self._source_row_count is None:
+            self._source_row_count = self.with_relaxed_types(
+                lambda: self.scan().select(pl.len()).collect(engine=self.engine).item())
+        return self._source_row_count
+
+    def collect(self):
+        """Run the full plan and return the materialized result"""
+        return self.with_relaxed_types(lambda: self.export_plan().collect(engine=self.engine))
+
+    def sink_csv(self, path, columns=None):
+        """Run the full plan once and write it straight to a CSV file"""
+        self.with_relaxed_types(lambda: self.export_plan(columns).sink_csv(path, engine=self.engine))
+
+
+class ResultView:
+    """Full rows of a pipeline result, read a block at a time for the table.
+
+    Only the loaded columns run through the plan. The other columns of a
+    block are read from the CSV between the block's first and last source
+    row. Blocks are collected with the streaming engine, which stops reading
+    a scan once the slice is full.
+    
+    build_plan returns the plan of the snapshot. It is built again once the
+    file's sniffed types have been relaxed, see main.with_relaxed_types.
+    """
+    def __init__(self, build_plan, columns, file_path):
+        self.build_plan = build_plan
+        self.columns = columns
+        self.file_path = file_path
+        self._spec = main.parse_spec(file_path)
+        self.plan = build_plan()
+
+    def fetch_rows(self, offset, length):
+        return main.with_relaxed_types([self.file_path], lambda: self._fetch_rows(offset, length))
+
+    def _fetch_rows(self, offset, length):
+        spec = main.parse_spec(self.file_path)
+        if spec is not self._spec:
+            # Scans built before the types were relaxed still use the sniffed ones
+            self._spec = spec
+            self.plan = self.build_plan()
+        frame = self.plan.slice(offset, length).collect(engine="streaming")
+        others = [column for column in self.columns if column not in frame.columns]
+        if others:
+            rows = frame.get_column(ROW_INDEX)
+            first = rows.min() or 0
+            last = rows.max() if rows.len() else -1
+            extra = (
+                main.parse_csv(self.file_path).with_row_index(ROW_INDEX).select([ROW_INDEX] + others)
+                .slice(first, last - first + 1)
+                .filter(pl.col(ROW_INDEX).is_in(rows))
+                .collect(engine="streaming")
+            )
+            frame = frame.join(extra, on=ROW_INDEX, how="left", maintain_order="left")
+        return frame.select(self.columns)
@@ -0,0 +1,131 @@
+# Default amount of memory materialized checkpoints may use (512 MB)
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+
+
+class Operation:
+    """Serializable recipe for a single processing step.
+
+    Filter steps that had to be computed eagerly also carry a row-selection
+    mask relative to their input, so replaying them never recomputes scores.
+    """
+    def __init__(self, op, params=None, description=""):
+        self.op = op
+        self.params = params or {}
+        self.description = description
+        self.mask = None  # Boolean Series, bit-packed by Arrow
+        self.frame = None  # Materialized checkpoint of the result, if kept
+        self.frame_path = None  # Working-set file backing the checkpoint, if spilled
+        self.row_count = None
+
+    def to_dict(self):
+        """Return the JSON-serializable part of the operation"""
+        return {"op": self.op, "params": dict(self.params), "description": self.description}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["op"], data.get("params"), data.get("description", ""))
+
+    def checkpoint_size(self):
+        return self.frame.estimated_size() if self.frame is not None else 0
+
+    def mask_size(self):
+        return self.mask.estimated_size() if self.mask is not None else 0
+
+
+class OperationHistory:
+    """Undo/redo stack of operation recipes with a memory budget for checkpoints
+
+    With a WorkingSetStore, checkpoints are spilled to Arrow IPC files and
+    kept memory-mapped, so the budget bounds their disk use instead of heap.
+    """
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, store=None):
+        self.memory_budget = memory_budget
+        self.store = store
+        self.applied = []
+        self.undone = []
+
+    def push(self, operation, frame=None):
+        """Record a newly applied operation, which invalidates the redo stack"""
+        self.applied.append(operation)
+        for discarded in self.undone:
+            self._drop_checkpoint(discarded)
+        self.undone = []
+        if frame is not None:
+            self._checkpoint(operation, frame)
+
+    def undo(self):
+        """Move the last applied operation to the redo stack"""
+        if not self.applied:
+            return None
+        operation = self.applied.pop()
+        self.undone.append(operation)
+        return operation
+
+    def redo(self):
+        """Re-apply the most recently undone operation"""
+        if not self.undone:
+            return None
+        operation = self.undone.pop()
+        self.applied.append(operation)
+        return operation
+
+    def clear(self):
+        # Spilled files go now, the mapped frames stay valid for restore()
+        for operation in self.applied + self.undone:
+            if self.store is not None:
+                self.store.release(operation.frame_path)
+            operation.frame_path = None
+        self.applied = []
+        self.undone = []
+
+    def snapshot(self):
+        """Return the current stacks so a cancelled change can be rolled back"""
+        return list(self.applied), list(self.undone)
+
+    def restore(self, state):
+        applied, undone = state
+        self.applied = list(applied)
+        self.undone = list(undone)
+
+    @property
+    def can_undo(self):
+        return bool(self.applied)
+
+    @property
+    def can_redo(self):
+        return bool(self.undone)
+
+    def checkpoint_usage(self):
+        """Bytes held by materialized checkpoints on both stacks"""
+        return sum(op.checkpoint_size() for op in self.applied + self.undone)
+
+    def latest_checkpoint(self, operations=None):
+        """Return (index, operation) of the newest applied step, or of operations, holding a frame"""
+        operations = self.applied if operations is None else operations
+        for i in range(len(operations) - 1, -1, -1):
+            if operations[i].frame is not None:
+                return i, operations[i]
+        return -1, None
+
+    def _checkpoint(self, operation, frame):
+        """Keep frame as a checkpoint if it fits in the budget, evicting older ones"""
+        size = frame.estimated_size()
+        if size > self.memory_budget:
+            print(f"Checkpoint of {size} bytes exceeds memory budget, keeping recipe only")
+            return
+
+        # Evict redo-only checkpoints first, then the oldest applied ones
+        candidates = [op for op in self.undone if op.frame is not None]
+        candidates += [op for op in self.applied if op.frame is not None]
+        while candidates and self.checkpoint_usage() + size > self.memory_budget:
+            self._drop_checkpoint(candidates.pop(0))
+
+        if self.store is not None:
+            operation.frame_path, frame = self.store.spill(frame)
+        operation.frame = frame
+
+    def _drop_checkpoint(self, operation):
+        if self.store is not None:
+            self.store.release(operation.frame_path)
+        operation.frame_path = None
+        operation.frame = None
@@ -0,0 +1,234 @@
+import codecs
+import csv
+import io
+import shutil
+
+import polars as pl
+
+# Bytes read from the start of a file to sniff its dialect, header and types
+SNIFF_SAMPLE_BYTES = 4 * 1024 ** 2
+# Characters of that sample handed to csv.Sniffer, which is slow on long text
+DIALECT_SAMPLE_CHARS = 64 * 1024
+CANDIDATE_SEPARATORS = ",;\t|"
+# Encodings Polars reads itself, it skips a UTF-8 byte order mark
+UTF8_ENCODINGS = ("utf-8", "utf-8-sig")
+# Longest marks first, the UTF-32 LE mark starts with the UTF-16 LE one
+BYTE_ORDER_MARKS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+TRANSCODE_CHUNK_CHARS = 4 * 1024 ** 2
+
+
+class ParseSpec:
+    """How to parse one CSV file: dialect, encoding, header row and column types.
+
+    A spec is sniffed once per file version and reused by every load of the
+    file, so the CSV is parsed in a single pass with explicit types instead
+    of Polars inferring them again from its first rows. Files in encodings
+    Polars cannot read are parsed from a UTF-8 copy, see needs_transcoding.
+    
+    Types sniffed from the sample may not fit later rows. The relaxed spec
+    of such a file holds the types Polars infers from every row instead,
+    with inferred set.
+    """
+    def __init__(self, separator=",", quote_char='"', encoding="utf-8", has_header=True, schema=None,
+                 sample_rows=0, inferred=False):
+        self.separator = separator
+        self.quote_char = quote_char
+        self.encoding = encoding
+        self.has_header = has_header
+        self.schema = schema
+        self.sample_rows = sample_rows
+        self.inferred = inferred
+
+    @property
+    def needs_transcoding(self):
+        return self.encoding not in UTF8_ENCODINGS
+
+    @property
+    def has_sniffed_types(self):
+        """Whether the types come from the sample and may not fit the whole file"""
+        return self.schema is not None and not self.inferred
+
+    @property
+    def is_default_dialect(self):
+        """Whether Polars' defaults would have read the file the same way, types aside"""
+        return (self.separator == "," and self.quote_char == '"' and not self.needs_transcoding
+                and self.has_header)
+
+    def dialect_options(self):
+        """Keyword arguments of the Polars CSV readers for the dialect and header"""
+        return {"separator": self.separator, "quote_char": self.quote_char, "has_header": self.has_header}
+
+    def csv_options(self):
+        """Keyword arguments of pl.scan_csv, with the sniffed types when there are any"""
+        options = self.dialect_options()
+        if self.schema is not None:
+            options["schema"] = self.schema
+        else:
+            # Without sniffed types, infer them from the whole file rather than its first rows
+            options["infer_schema_length"] = None
+        return options
+
+    def scan(self, source):
+        """Scan source, the file itself or its UTF-8 copy, with this spec"""
+        return pl.scan_csv(source, **self.csv_options())
+
+    def relaxed(self, schema=None):
+        """The same spec without the sniffed types, for files whose later rows do not fit them
+        
+        schema is the file's types as Polars inferred them from every row,
+        which spares later scans inferring them again.
+        """
+        return ParseSpec(self.separator, self.quote_char, self.encoding, self.has_header, schema,
+                         inferred=schema is not None)
+
+    def to_dict(self):
+        # Inferred types follow from the file itself, so they are keyed like no types at all
+        return {
+            "separator": self.separator,
+            "quote_char": self.quote_char,
+            "encoding": self.encoding,
+            "has_header": self.has_header,
+            "schema": {name: str(dtype) for name, dtype in self.schema.items()} if self.has_sniffed_types else None,
+        }
+
+    def describe(self):
+        """Short summary for status lines, e.g. "';' separated, cp1252, no header row" """
+        separator = "tab" if self.separator == "\t" else repr(self.separator)
+        parts = [f"{separator} separated", self.encoding]
+        if self.quote_char != '"':
+            parts.append(f"quoted with {self.quote_char!r}")
+        if not self.has_header:
+            parts.append("no header row")
+        if self.inferred:
+            parts.append("types from the whole file")
+        elif self.schema is not None:
+            parts.append(f"types from {self.sample_rows} rows")
+        return ", ".join(parts)
+
+
+def sniff(file_name, sample_bytes=SNIFF_SAMPLE_BYTES):
+    """Sniff the parse spec of a CSV file from its first sample_bytes"""
+    with open(file_name, "rb") as f:
+        raw = f.read(sample_bytes)
+    truncated = len(raw) == sample_bytes
+
+    encoding = detect_encoding(raw, truncated)
+    text = decode_sample(raw, encoding)
+    if truncated and "\n" in text:
+        # Drop the partial last line
+        text = text[:text.rindex("\n") + 1]
+
+    dialect_sample = text[:DIALECT_SAMPLE_CHARS]
+    if len(text) > DIALECT_SAMPLE_CHARS and "\n" in dialect_sample:
+        dialect_sample = dialect_sample[:dialect_sample.rindex("\n") + 1]
+    separator, quote_char = detect_dialect(dialect_sample)
+    spec = ParseSpec(separator, quote_char, encoding)
+    if not text.strip():
+        return spec
+
+    data = text.encode("utf-8")
+    try:
+        rows = pl.read_csv(io.BytesIO(data), separator=separator, quote_char=quote_char, has_header=False,
+                           infer_schema=False)
+        spec.has_header = detect_header(rows)
+        sample = pl.read_csv(io.BytesIO(data), infer_schema_length=None, **spec.dialect_options())
+    except pl.exceptions.PolarsError:
+        # A quoted field cut by the end of the sample or a ragged line, Polars infers the types later
+        return spec
+    spec.schema = dict(sample.schema)
+    spec.sample_rows = sample.shape[0]
+    return spec
+
+
+def detect_encoding(raw, truncated=False):
+    """Python codec name of a sample's encoding: from a byte order mark, else UTF-8, Windows-1252 or Latin-1"""
+    for mark, encoding in BYTE_ORDER_MARKS:
+        if raw.startswith(mark):
+            return encoding
+    try:
+        # A multi-byte character cut by the end of the sample is not an error
+        codecs.getincrementaldecoder("utf-8")().decode(raw, final=not truncated)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    try:
+        raw.decode("cp1252")
+        return "cp1252"
+    except UnicodeDecodeError:
+        # Latin-1 decodes any bytes
+        return "latin-1"
+
+
+def decode_sample(raw, encoding):
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    return decoder.decode(raw, final=False).lstrip("\ufeff")
+
+
+def detect_dialect(text):
+    """(separator, quote char) of a text sample, a comma and double quote when it is unclear
+
+    csv.Sniffer also guesses from fields that merely start with a quote,
+    such as '90s, so what it finds is only kept when the sample parses
+    consistently with it, and a double quote is preferred whenever that
+    parses consistently too.
+    """
+    try:
+        dialect = csv.Sniffer().sniff(text, delimiters=CANDIDATE_SEPARATORS)
+    except csv.Error:
+        # Single-column files have no separator to find
+        return ",", '"'
+    quote_char = dialect.quotechar if dialect.quotechar in ('"', "'") else '"'
+    for candidate in ((dialect.delimiter, '"'), (dialect.delimiter, quote_char)):
+        if parses_consistently(text, *candidate):
+            return candidate
+    return ",", '"'
+
+
+def parses_consistently(text, separator, quote_char):
+    """Whether Polars reads a sample with the dialect and every line has the same number of fields, above one"""
+    try:
+        rows = list(csv.reader(io.StringIO(text), delimiter=separator, quotechar=quote_char, strict=True))
+        pl.read_csv(io.BytesIO(text.encode("utf-8")), separator=separator, quote_char=quote_char, has_header=False,
+                    infer_schema=False)
+    except (csv.Error, pl.exceptions.PolarsError):
+        return False
+    field_counts = {len(row) for row in rows if row}
+    return len(field_counts) == 1 and field_counts.pop() > 1
+
+
+def detect_header(rows):
+    """Whether the first of the sample rows, all read as strings, is a header
+
+    Files almost always have one, so the first row only counts as data when
+    every column whose other values are numeric has a number there too.
+    """
+    if rows.shape[0] < 2:
+        return True
+    rest = rows.slice(1)
+    numeric_columns = []
+    for column in rows.columns:
+        values = rest.get_column(column)
+        numbers = values.str.strip_chars().cast(pl.Float64, strict=False)
+        if values.null_count() < values.len() and numbers.null_count() == values.null_count():
+            numeric_columns.append(column)
+    if not numeric_columns:
+        return True
+    first = rows.row(0, named=True)
+    for column in numeric_columns:
+        value = first[column]
+        if value is not None and pl.Series([value]).str.strip_chars().cast(pl.Float64, strict=False)[0] is None:
+            return True
+    return False
+
+
+def transcode_to_utf8(file_name, encoding, path):
+    """Copy a CSV file in another encoding to path as UTF-8, a chunk at a time"""
+    with open(file_name, encoding=encoding, newline="") as source, \
+            open(path, "w", encoding="utf-8", newline="") as target:
+        shutil.copyfileobj(source, target, TRANSCODE_CHUNK_CHARS)
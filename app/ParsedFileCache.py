@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+import polars as pl
+
+# Disk space parsed copies may use before the least recently used are deleted (20 GB)
+DEFAULT_CACHE_SIZE = 20 * 1024 ** 3
+ENTRY_SUFFIX = ".arrow"
+# Streamed entries are lz4 compressed and cannot be memory-mapped
+COMPRESSED_SUFFIX = ".lz4" + ENTRY_SUFFIX
+
+
+def default_cache_dir(name="parsed"):
+    """Per-user cache directory, kept across sessions unlike the temp directory"""
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME")
+    if not base:
+        base = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "csv-processor", name)
+
+
+class ParsedFileCache:
+    """On-disk cache of parsed CSV files stored as Arrow IPC.
+
+    Entries are keyed on the absolute path, size and modification time of the
+    CSV plus the parse options, so an edited file or different options never
+    hit a stale entry. Reads memory-map entries written from DataFrames and
+    decode the lz4 compressed streamed ones, skipping CSV parsing and schema
+    inference. Entry modification times track use, and the least
+    recently used entries are deleted once the cache grows past max_bytes.
+    """
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_CACHE_SIZE):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        # Keys whose entry came out larger than the cache, not parsed again by get_or_create
+        self._oversized = set()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def key(self, file_name, options=None):
+        """Cache key of a CSV file as it is on disk now, parsed with options"""
+        stat = os.stat(file_name)
+        raw = json.dumps(
+            [os.path.abspath(file_name), stat.st_size, stat.st_mtime_ns, options or {}, pl.__version__],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def entry_path(self, key, compressed=False):
+        return os.path.join(self.cache_dir, key + (COMPRESSED_SUFFIX if compressed else ENTRY_SUFFIX))
+
+    def existing_entry(self, key):
+        """Path of the entry for key, compressed or not, None when there is none"""
+        for compressed in (False, True):
+            path = self.entry_path(key, compressed)
+            if os.path.exists(path):
+                return path
+        return None
+
+    @staticmethod
+    def is_compressed(path):
+        """Whether an entry is lz4 compressed, reads then decode it instead of mapping it"""
+        return path.endswith(COMPRESSED_SUFFIX)
+
+    def get(self, file_name, options=None):
+        """Return the path of the cached copy of file_name, or None on a miss"""
+        path = self.existing_entry(self.key(file_name, options))
+        if path is None:
+            self.misses += 1
+            return None
+        # Touch the entry so eviction sees it as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return path
+
+    def put(self, file_name, frame, options=None):
+        """Write a parsed DataFrame or LazyFrame as the entry for file_name
+
+        LazyFrames are sunk with the streaming engine, so files larger than
+        memory can be cached too. Returns the entry path, or None when the
+        entry alone would exceed the cache size.
+        
+        DataFrames are written uncompressed so reads can map them without
+        copying. Sinking uncompressed IPC is not supported by the Polars
+        release this app pins, so streamed entries use lz4, which still
+        decodes far faster than CSV parses.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        key = self.key(file_name, options)
+        streamed = isinstance(frame, pl.LazyFrame)
+        path = self.entry_path(key, compressed=streamed)
+
+        # Write under a temporary name so readers never see a partial entry
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            if streamed:
+                frame.sink_ipc(temp_path, compression="lz4", engine="streaming")
+            else:
+                frame.write_ipc(temp_path, compression="uncompressed")
+            if os.path.getsize(temp_path) > self.max_bytes:
+                print(f"Parsed copy of {file_name} is larger than the cache, not caching it")
+                os.remove(temp_path)
+                self._oversized.add(key)
+                return None
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        # An entry written the other way for the same key is stale now
+        try:
+            os.remove(self.entry_path(key, compressed=not streamed))
+        except OSError:
+            pass
+
+        self.evict(keep=path)
+        return path
+
+    def get_or_create(self, file_name, options=None, streaming=False, scan=None):
+        """Return the entry path for file_name, parsing the CSV into the cache on a miss
+        
+        On a miss the CSV is parsed by scan(), a LazyFrame, or by pl.scan_csv
+        with options. With streaming the CSV is parsed and written out of
+        core, otherwise it is read into memory first. Different files are
+        parsed in parallel, callers asking for the same file wait for the
+        first parse. Returns None without parsing when an earlier parse of
+        the same file version came out larger than the cache.
+        """
+        path = self.get(file_name, options)
+        if path is None:
+            key = self.key(file_name, options)
+            if key in self._oversized:
+                return None
+            with self._lock:
+                key_lock = self._key_locks.setdefault(key, threading.Lock())
+            try:
+                with key_lock:
+                    # Another thread may have written the entry while this one waited
+                    path = self.existing_entry(key)
+                    if path is None:
+                        frame = scan() if scan is not None else pl.scan_csv(file_name, **(options or {}))
+                        if not streaming:
+                            frame = frame.collect()
+                        path = self.put(file_name, frame, options)
+            finally:
+                with self._lock:
+                    self._key_locks.pop(key, None)
+        return path
+
+    def entries(self):
+        """(path, size, last used) of every entry, least recently used first"""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                # Entries still memory-mapped cannot be deleted on Windows
+                pass
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counters and current disk usage"""
+        entries = self.entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "size": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
@@ -1,41 +1,210 @@
 import polars as pl
-from PyQt5.QtCore import Qt, QAbstractTableModel
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QThreadPool, pyqtSignal
 from PyQt5.QtGui import QColor
 
+from app.LRUCache import LRUCache
+from app.Worker import Worker
+
+# Rows converted to display strings at a time, and how many such blocks are kept
+DEFAULT_BLOCK_SIZE = 1000
+DEFAULT_CACHE_BLOCKS = 50
+# Blocks read per query from a LazyFrame, each query rescans up to its offset
+LAZY_READ_BLOCKS = 10
+# Shown in cells whose block is still being read
+LOADING_TEXT = "..."
+# Threads reading blocks, apart from the global pool so reads never hold up a job
+READ_THREADS = 2
+
+
 class PolarsTableModel(QAbstractTableModel):
-    def __init__(self, data=None):
+    """Virtual table over a DataFrame, a LazyFrame or a view.
+
+    A view is any object with a columns list and a fetch_rows(offset,
+    length) method returning a DataFrame, such as LazyPipeline's ResultView.
+
+    Rows are exposed to the view one block at a time through canFetchMore and
+    fetchMore, so scrolling can reach every row without converting the whole
+    frame. Each block is sliced from the frame and stringified once when a
+    cell in it is first painted, then kept in an LRU cache.
+
+    Blocks of a LazyFrame or a view are read on a thread pool, their cells
+    show LOADING_TEXT until dataChanged announces them. A read that fails
+    is reported through fetch_failed and its cells are left empty.
+    """
+    fetch_failed = pyqtSignal(str)
+
+    def __init__(self, data=None, block_size=DEFAULT_BLOCK_SIZE, cache_blocks=DEFAULT_CACHE_BLOCKS):
         super().__init__()
-        self._data = data if data is not None else pl.DataFrame()
-        
-    def setDataFrame(self, dataframe):
+        self.block_size = block_size
+        self._blocks = LRUCache(cache_blocks)
+        self._data = pl.DataFrame()
+        self._columns = []
+        self._total_rows = 0
+        self._loaded_rows = 0
+        # Blocks being read or whose read failed, and the workers reading them
+        self._pending = set()
+        self._failed = set()
+        self._workers = set()
+        self._pool = QThreadPool()
+        self._pool.setMaxThreadCount(READ_THREADS)
+        # Bumped by setDataFrame so reads of a replaced frame are dropped
+        self._generation = 0
+        self.setDataFrame(data if data is not None else pl.DataFrame())
+
+    def setDataFrame(self, dataframe, row_count=None, head=None):
+        """Show a new frame
+
+        For a LazyFrame, row_count should be passed so the model does not have
+        to run the query to count rows, for a view it is required. head may
+        hold the first rows already collected, they fill the first block
+        without another query.
+        """
         self.beginResetModel()
         self._data = dataframe
+        if isinstance(dataframe, pl.LazyFrame):
+            self._columns = dataframe.collect_schema().names()
+            if row_count is None:
+                row_count = dataframe.select(pl.len()).collect().item()
+        elif isinstance(dataframe, pl.DataFrame):
+            self._columns = dataframe.columns
+            if row_count is None:
+                row_count = dataframe.shape[0]
+        else:
+            self._columns = list(dataframe.columns)
+        self._total_rows = row_count
+        self._loaded_rows = min(self.block_size, row_count)
+        self._blocks.clear()
+        self._pending.clear()
+        self._failed.clear()
+        self._generation += 1
+        if head is not None and head.shape[0] >= self._loaded_rows:
+            self._blocks.put(0, self._stringify(head.head(self.block_size)))
         self.endResetModel()
-        
-    def rowCount(self, parent=None):
-        return self._data.shape[0]
-    
-    def columnCount(self, parent=None):
-        return self._data.shape[1]
-    
+
+    def totalRowCount(self):
+        """Rows in the whole frame, not only those fetched into the view"""
+        return self._total_rows
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._loaded_rows
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._columns)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self._loaded_rows < self._total_rows
+
+    def fetchMore(self, parent=QModelIndex()):
+        """Expose the next block of rows, their strings are built when painted"""
+        if parent.isValid():
+            return
+        count = min(self.block_size, self._total_rows - self._loaded_rows)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded_rows, self._loaded_rows + count - 1)
+        self._loaded_rows += count
+        self.endInsertRows()
+
+    def _stringify(self, block):
+        # Column-wise conversion is much cheaper than indexing cell by cell
+        return [[str(value) for value in block.get_column(name).to_list()] for name in block.columns]
+
+    def _block(self, block_index):
+        """Return the display strings of one block, or None while it is read in the background"""
+        block = self._blocks.get(block_index)
+        if block is not None:
+            return block
+
+        if not isinstance(self._data, pl.DataFrame):
+            if block_index not in self._pending and block_index not in self._failed:
+                self._read_blocks(block_index)
+            return None
+
+        block = self._stringify(self._data.slice(block_index * self.block_size, self.block_size))
+        self._blocks.put(block_index, block)
+        return block
+
+    def _read_blocks(self, block_index):
+        """Read up to LAZY_READ_BLOCKS blocks from block_index on the model's thread pool"""
+        # Read several blocks per query to spread the cost of reaching the offset
+        last_block = -(-self._total_rows // self.block_size)
+        indexes = [index for index in range(block_index, min(block_index + LAZY_READ_BLOCKS, last_block))
+                   if index not in self._pending and self._blocks.get(index) is None]
+        data, generation = self._data, self._generation
+
+        def job(progress_callback, cancel_token):
+            if generation != self._generation:
+                # The frame was replaced before the read started
+                return []
+            offset, length = indexes[0] * self.block_size, len(indexes) * self.block_size
+            if isinstance(data, pl.LazyFrame):
+                frame = data.slice(offset, length).collect()
+            else:
+                frame = data.fetch_rows(offset, length)
+            return [
+                (indexes[0] + i, self._stringify(frame.slice(start, self.block_size)))
+                for i, start in enumerate(range(0, frame.shape[0], self.block_size))
+            ]
+
+        worker = Worker(job)
+        worker.signals.result.connect(lambda blocks: self._blocks_read(generation, indexes, blocks))
+        worker.signals.error.connect(lambda error: self._blocks_failed(generation, indexes, error))
+        worker.signals.finished.connect(lambda: self._workers.discard(worker))
+        self._pending.update(indexes)
+        self._workers.add(worker)
+        self._pool.start(worker)
+
+    def _blocks_read(self, generation, indexes, blocks):
+        if generation != self._generation:
+            return
+        self._blocks.put_many(blocks)
+        self._pending.difference_update(indexes)
+        for block_index, _ in blocks:
+            self._block_changed(block_index)
+
+    def _blocks_failed(self, generation, indexes, error):
+        if generation != self._generation:
+            return
+        self._pending.difference_update(indexes)
+        self._failed.update(indexes)
+        for block_index in indexes:
+            self._block_changed(block_index)
+        self.fetch_failed.emit(error)
+
+    def _block_changed(self, block_index):
+        first = block_index * self.block_size
+        last = min(first + self.block_size, self._loaded_rows) - 1
+        if first <= last and self._columns:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, len(self._columns) - 1), [Qt.DisplayRole])
+
     def data(self, index, role=Qt.DisplayRole):
         if not index.isValid():
             return None
-        
+
         if role == Qt.DisplayRole:
-            return str(self._data[index.row(), index.column()])
-        
+            block_index, offset = divmod(index.row(), self.block_size)
+            block = self._block(block_index)
+            if block is None:
+                return "" if block_index in self._failed else LOADING_TEXT
+            return block[index.column()][offset]
+
         elif role == Qt.BackgroundRole:
             # Alternate row colors for better readability
             if index.row() % 2 == 0:
                 return QColor(245, 245, 245)
             return QColor(255, 255, 255)
-            
+
         return None
-    
+
     def headerData(self, section, orientation, role=Qt.DisplayRole):
         if role != Qt.DisplayRole:
             return None
         if orientation == Qt.Horizontal:
-            return str(self._data.columns[section])
-        return str(section + 1)
\ No newline at end of file
+            return str(self._columns[section])
+        return str(section + 1)
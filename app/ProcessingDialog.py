@@ -1,12 +1,15 @@
-from PyQt5.QtWidgets import (QVBoxLayout, QLabel, QProgressBar, QDialog)
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import (QVBoxLayout, QHBoxLayout, QLabel, QProgressBar, QDialog, QPushButton)
+from PyQt5.QtCore import Qt, pyqtSignal
 
 
 class ProcessingDialog(QDialog):
-    def __init__(self, parent=None, message="Processing..."):
+    cancel_requested = pyqtSignal()
+    
+    def __init__(self, parent=None, message="Processing...", cancellable=False):
         super().__init__(parent)
+        self.cancellable = cancellable
         self.setWindowTitle("Processing")
-        self.setFixedSize(400, 120)
+        self.setFixedSize(400, 160 if cancellable else 120)
         self.setWindowFlags(Qt.Dialog | Qt.CustomizeWindowHint | Qt.WindowTitleHint)
         self.setObjectName("processing_dialog")
         
@@ -27,9 +30,45 @@ class ProcessingDialog(QDialog):
         self.progress_bar = QProgressBar()
         self.progress_bar.setObjectName("progress_bar")
         layout.addWidget(self.progress_bar)
+        
+        # Cancel button, the running job stops at its next checkpoint
+        self.cancel_button = None
+        if cancellable:
+            button_layout = QHBoxLayout()
+            button_layout.addStretch()
+            self.cancel_button = QPushButton("Cancel")
+            self.cancel_button.setObjectName("cancel_button")
+            self.cancel_button.clicked.connect(self.request_cancel)
+            button_layout.addWidget(self.cancel_button)
+            layout.addLayout(button_layout)
     
     def set_progress(self, value):
         self.progress_bar.setValue(value)
     
     def set_message(self, message):
-        self.message_label.setText(message)
\ No newline at end of file
+        self.message_label.setText(message)
+    
+    def request_cancel(self):
+        """Ask the running job to stop, the dialog closes once it has"""
+        if self.cancel_button is not None:
+            self.cancel_button.setEnabled(False)
+        self.set_message("Cancelling...")
+        self.cancel_requested.emit()
+    
+    def reject(self):
+        # Escape must not hide the dialog while the job is still running
+        if self.cancellable:
+            self.request_cancel()
+        else:
+            super().reject()
+    
+    def finish(self):
+        """Close the dialog once its job has stopped"""
+        self.cancellable = False
+        self.close()
+    
+    def update_progress(self, value, message=""):
+        """Slot for worker progress signals"""
+        self.set_progress(value)
+        if message:
+            self.set_message(message)
\ No newline at end of file
@@ -0,0 +1,93 @@
+import json
+import os
+
+import app.main as main
+from app.OperationHistory import Operation
+
+try:
+    import yaml
+except ImportError:  # PyYAML is optional, recipes can always be saved as JSON
+    yaml = None
+
+RECIPE_VERSION = 1
+YAML_EXTENSIONS = (".yaml", ".yml")
+# Operations that combine files and only make sense in batch runs
+FILE_OPERATIONS = {"merge", "subtract"}
+KNOWN_OPERATIONS = {"word_match", "remove_duplicates", "find_replace", "email_validation", "domain_similarity"} | FILE_OPERATIONS
+
+
+class Recipe:
+    """Ordered list of operation recipes that can be saved and replayed.
+
+    Only the op name, parameters and description of each step are stored, so
+    a recipe recorded on one file can be replayed on another. Masks and
+    checkpoints are recomputed on replay.
+    """
+    def __init__(self, operations=None, source=None):
+        self.operations = list(operations or [])
+        self.source = source
+
+    def to_dict(self):
+        return {
+            "version": RECIPE_VERSION,
+            "source": self.source,
+            "operations": [operation.to_dict() for operation in self.operations],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict) or not isinstance(data.get("operations"), list):
+            raise ValueError("Recipe must contain a list of operations")
+        if data.get("version", RECIPE_VERSION) > RECIPE_VERSION:
+            raise ValueError(f"Recipe version {data['version']} is newer than this app supports")
+
+        operations = []
+        for step in data["operations"]:
+            if step.get("op") not in KNOWN_OPERATIONS:
+                raise ValueError(f"Unknown operation in recipe: {step.get('op')}")
+            operations.append(Operation.from_dict(step))
+        return cls(operations, data.get("source"))
+
+    @property
+    def uses_files(self):
+        """Whether the recipe merges or subtracts other files"""
+        return any(operation.op in FILE_OPERATIONS for operation in self.operations)
+
+    def fresh_operations(self):
+        """New Operation objects for a replay, so recorded runs never share masks"""
+        return [Operation.from_dict(operation.to_dict()) for operation in self.operations]
+
+    def compile(self, frame, engine="auto", progress_callback=None, cancel_token=None):
+        """Compile the recipe over a DataFrame or LazyFrame into one LazyFrame"""
+        if self.uses_files:
+            raise ValueError("Merge and subtract steps can only be replayed by the command-line runner")
+        return main.compile_operations(frame, self.fresh_operations(), engine, progress_callback, cancel_token)
+
+    def save(self, path):
+        """Write the recipe as YAML for .yaml/.yml paths, JSON otherwise"""
+        data = self.to_dict()
+        with open(path, "w", encoding="utf-8") as f:
+            if is_yaml_path(path):
+                if yaml is None:
+                    raise ValueError("PyYAML is required to save YAML recipes, save as .json instead")
+                yaml.safe_dump(data, f, sort_keys=False, allow_unicode=True)
+            else:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            if is_yaml_path(path):
+                if yaml is None:
+                    raise ValueError("PyYAML is required to load YAML recipes")
+                try:
+                    data = yaml.safe_load(f)
+                except yaml.YAMLError as e:
+                    raise ValueError(f"Invalid YAML recipe: {e}")
+            else:
+                data = json.load(f)
+        return cls.from_dict(data)
+
+
+def is_yaml_path(path):
+    return os.path.splitext(path)[1].lower() in YAML_EXTENSIONS
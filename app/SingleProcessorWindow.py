@@ -1,14 +1,19 @@
 import os
-import polars as pl
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QFrame,
+import re
+from PyQt5.QtWidgets import (QMainWindow, QVBoxLayout, QFrame,
                              QWidget, QTabWidget, QMessageBox, QFileDialog, QSplitter)
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QResizeEvent
 
 import app.main as main  # Import the original main.py functionality
+import app.export as export
 from app.css.styles import STYLESHEET
 
-from app.ProcessingDialog import ProcessingDialog
+from app.Worker import run_in_background
+from app.LazyPipeline import LazyPipeline
+from app.Recipe import Recipe
+from app.PolarsTableModel import DEFAULT_BLOCK_SIZE
+from app.OperationHistory import Operation, DEFAULT_MEMORY_BUDGET
 from app.components.HeaderFrame import HeaderFrame
 from app.components.WordMatchTab import WordMatchTab
 from app.components.DuplicateTab import DuplicateTab
@@ -34,13 +39,11 @@ class MainWindow(QMainWindow):
         
         # State variables
         self.csv_file = None
-        self.df = None
-        self.output_df = None
-        self.original_df = None  # Store the original dataframe
+        self.pipeline = None  # Lazy plan of the loaded file and applied operations
         self.output_file = None
         self.row_count = 0
         self.operations_history = []  # Track applied operations
-        self.operation_states = []  # Store dataframe states for undo
+        self.undo_memory_budget = DEFAULT_MEMORY_BUDGET  # Bytes of undo checkpoints kept in RAM
         
         # Initialize UI components
         self.header_frame = None
@@ -168,53 +171,138 @@ class MainWindow(QMainWindow):
     
     def load_csv_file(self, file_path):
         """Load CSV file and setup UI with data"""
-        self.csv_file = file_path
+        if not os.path.exists(file_path):
+            self.csv_file = file_path
+            self.pipeline = None
+            self.operations_history = []
+            self.results_frame.update_history(self.operations_history)
+            return
         
-        # Reset operations history and states
-        self.operations_history = []
-        self.operation_states = []
-        self.results_frame.update_history(self.operations_history)
+        undo_memory_budget = self.undo_memory_budget
         
-        # Create processing dialog
-        progress_dialog = ProcessingDialog(self, "Loading CSV file, please wait...")
-        progress_dialog.set_progress(10)
-        progress_dialog.show()
-        QApplication.processEvents()
+        def job(progress_callback, cancel_token):
+            # Scan the file lazily, only the schema, row count and first rows are read here
+            progress_callback(10, "Reading file schema...")
+            pipeline = LazyPipeline(file_path, undo_memory_budget)
+            columns = pipeline.columns
+            progress_callback(40, "Counting rows...")
+            row_count = pipeline.row_count()
+            progress_callback(80, "Updating UI...")
+            return pipeline, columns, row_count, pipeline.view(), pipeline.preview(DEFAULT_BLOCK_SIZE)
         
-        try:
-            # Load the file using the original function
-            self.df = main.load_csv(file_path)
-            self.original_df = self.df.clone()  # Store a copy of the original data
-            progress_dialog.set_progress(80)
-            progress_dialog.set_message("Updating UI...")
-            QApplication.processEvents()
+        def on_result(result):
+            # The previous file stays loaded until the new one is ready
+            self.csv_file = file_path
+            self.pipeline, columns, self.row_count, plan, head = result
             
-            if self.df is not None:
-                # Update column lists
-                self.word_match_tab.update_columns(self.df.columns)
-                self.duplicate_tab.update_columns(self.df.columns)
-                self.find_replace_tab.update_columns(self.df.columns)
-                self.email_validation_tab.update_columns(self.df.columns)
-                self.domain_similarity_tab.update_columns(self.df.columns)
-                
-                # Update results frame
-                self.results_frame.update_preview(self.df)
-                self.results_frame.update_status("File loaded successfully")
-                self.results_frame.update_title(f"Data Preview - {os.path.basename(file_path)}")
-                self.results_frame.enable_buttons(reset=False, download=False, undo=False)
+            # Reset operations history
+            self.operations_history = []
+            self.results_frame.update_history(self.operations_history)
             
-            progress_dialog.set_progress(100)
+            # Update column lists
+            self.word_match_tab.update_columns(columns)
+            self.duplicate_tab.update_columns(columns)
+            self.find_replace_tab.update_columns(columns)
+            self.email_validation_tab.update_columns(columns)
+            self.domain_similarity_tab.update_columns(columns)
             
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to load CSV file: {str(e)}")
-        finally:
-            progress_dialog.close()
-            # Reset splitter proportions
-            self.reset_splitter_sizes()
+            # Update results frame
+            self.results_frame.update_preview(plan, self.row_count, head)
+            if self.pipeline.streaming:
+                status = "Large file loaded in streaming mode, rows are read as you scroll"
+            else:
+                status = "File loaded successfully"
+            if not self.pipeline.parse_spec.is_default_dialect:
+                status += f" (read as {self.pipeline.parse_spec.describe()})"
+            self.results_frame.update_status(status)
+            self.results_frame.update_title(f"Data Preview - {os.path.basename(file_path)}")
+            self.results_frame.enable_buttons(reset=False, download=False, undo=False)
+        
+        def on_cancelled():
+            self.results_frame.update_status("Loading cancelled")
+        
+        run_in_background(self, "Loading CSV file, please wait...", job, on_result,
+                          "Failed to load CSV file", on_finished=self.reset_splitter_sizes,
+                          on_cancelled=on_cancelled)
+    
+    def run_operation(self, operation, message, error_message, on_applied):
+        """Apply an operation recipe on a worker thread, then refresh the results view.
+
+        on_applied runs on the GUI thread once self.row_count holds the new count,
+        it sets the operation description and the status line. A cancelled
+        operation is rolled back, also when it was cancelled after being applied.
+        """
+        pipeline = self.pipeline
+        previous_state = pipeline.snapshot()
+        
+        def job(progress_callback, cancel_token):
+            progress_callback(10, "Processing data...")
+            pipeline.apply(operation, progress_callback, cancel_token)
+            progress_callback(90, "Updating results view...")
+            return pipeline.row_count(), pipeline.view(), pipeline.preview(DEFAULT_BLOCK_SIZE)
+        
+        def on_result(result):
+            self.row_count, plan, head = result
+            on_applied()
+            
+            # Store operation in history
+            self.operations_history = self.pipeline.descriptions
+            
+            # Update results frame
+            self.results_frame.update_history(self.operations_history)
+            self.results_frame.update_preview(plan, self.row_count, head)
+            self.results_frame.enable_buttons(reset=True, download=True, undo=True)
+            self.report_cache_error()
+        
+        def on_cancelled():
+            pipeline.restore(previous_state)
+            self.results_frame.update_status("Operation cancelled, data unchanged")
+        
+        run_in_background(self, message, job, on_result, error_message,
+                          on_finished=self.reset_splitter_sizes, on_cancelled=on_cancelled)
     
-    def apply_word_match_filter(self, selected_column_names, search_text, include, case_insensitive):
+    def report_cache_error(self):
+        """Add to the status line when the columns of the last step could not be cached"""
+        if self.pipeline.cache_error:
+            self.results_frame.update_status(
+                f"{self.results_frame.status_label.text()} (columns are read from the file, "
+                f"caching them failed: {self.pipeline.cache_error})"
+            )
+    
+    def refresh_results(self, message, previous_state, on_refreshed=None):
+        """Recount and re-preview the current plan on a worker thread
+        
+        The history has already been moved by the caller, previous_state is
+        restored if the refresh is cancelled.
+        """
+        pipeline = self.pipeline
+        
+        def job(progress_callback, cancel_token):
+            progress_callback(20, "Counting rows...")
+            row_count = pipeline.row_count()
+            progress_callback(70, "Updating results view...")
+            head = pipeline.preview(DEFAULT_BLOCK_SIZE)
+            main.check_cancelled(cancel_token)
+            return row_count, pipeline.view(), head
+        
+        def on_result(result):
+            self.row_count, plan, head = result
+            self.operations_history = self.pipeline.descriptions
+            self.results_frame.update_history(self.operations_history)
+            self.results_frame.update_preview(plan, self.row_count, head)
+            if on_refreshed is not None:
+                on_refreshed()
+        
+        def on_cancelled():
+            self.pipeline.restore(previous_state)
+            self.results_frame.update_status("Operation cancelled, data unchanged")
+        
+        run_in_background(self, message, job, on_result, "Error updating results",
+                          on_finished=self.reset_splitter_sizes, on_cancelled=on_cancelled)
+    
+    def apply_word_match_filter(self, selected_column_names, search_text, include, case_insensitive, literal=True):
         """Apply word match filter to the data"""
-        if self.df is None:
+        if self.pipeline is None:
             QMessageBox.warning(self, "Warning", "Please load a CSV file first")
             return
         
@@ -226,60 +314,24 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Please enter search values")
             return
         
-        search_values = [value.strip() for value in search_text.split(',')]
-        
-        # Show processing dialog
-        progress_dialog = ProcessingDialog(self, "Applying word match filter, please wait...")
-        progress_dialog.set_progress(20)
-        progress_dialog.show()
-        QApplication.processEvents()
-        
-        try:
-            # Save the current state for undo
-            self.operation_states.append(self.df.clone())
-            
-            # Implement case-insensitive search with polars
-            progress_dialog.set_progress(30)
-            progress_dialog.set_message("Filtering data...")
-            QApplication.processEvents()
-            
-            # Create a search pattern for each value with case handling
-            if not case_insensitive:
-                # Case sensitive search using the original method
-                search_pattern = "|".join(search_values)
-                masks = [pl.col(col).cast(str).str.contains(search_pattern) for col in selected_column_names]
-            else:
-                # Case insensitive search - convert everything to lowercase
-                masks = []
-                for col in selected_column_names:
-                    col_masks = [pl.col(col).cast(str).str.to_lowercase().str.contains(val.lower()) 
-                                for val in search_values]
-                    # Combine masks for this column with OR
-                    masks.append(pl.any_horizontal(col_masks))
-            
-            # Combine all column masks with OR
-            mask = pl.any_horizontal(masks)
-            
-            # Apply filter
-            filtered_df = self.df.filter(mask if include else ~mask)
-            
-            # Update the current dataframe
-            self.df = filtered_df
-            self.row_count = filtered_df.shape[0]
-            
-            progress_dialog.set_progress(80)
-            progress_dialog.set_message("Updating results view...")
-            QApplication.processEvents()
-            
-            # Store operation in history
-            filter_type = "including" if include else "excluding"
-            case_str = "case insensitive" if case_insensitive else "case sensitive"
-            op_description = f"Word match {filter_type} '{search_text}' ({case_str})"
-            self.operations_history.append(op_description)
-            
-            # Update results frame
-            self.results_frame.update_history(self.operations_history)
-            self.results_frame.update_preview(self.df)
+        # Values may be separated by commas or pasted one per line
+        search_values = [value.strip() for value in re.split(r'[,\n]', search_text) if value.strip()]
+        
+        # Record the filter in the lazy plan
+        filter_type = "including" if include else "excluding"
+        case_str = "case insensitive" if case_insensitive else "case sensitive"
+        mode_str = "literal" if literal else "regex"
+        search_display = search_text if len(search_values) <= 3 else f"{len(search_values)} values"
+        operation = Operation("word_match", {
+            "selected_column_names": selected_column_names,
+            "search_values": search_values,
+            "include": include,
+            "case_insensitive": case_insensitive,
+            "literal": literal,
+        })
+        
+        def on_applied():
+            operation.description = f"Word match {filter_type} '{search_display}' ({case_str}, {mode_str})"
             
             # Update status information
             cols_display = ", ".join(selected_column_names[:3])
@@ -292,20 +344,13 @@ class MainWindow(QMainWindow):
             
             self.results_frame.update_status(f"Word match applied {filter_type} {values_display} in columns: {cols_display}")
             self.results_frame.update_title("Filtered Data Preview")
-            self.results_frame.enable_buttons(reset=True, download=True, undo=True)
-            
-            progress_dialog.set_progress(100)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error applying word match: {str(e)}")
-        finally:
-            progress_dialog.close()
-            # Reset splitter proportions
-            self.reset_splitter_sizes()
+        
+        self.run_operation(operation, "Applying word match filter, please wait...",
+                           "Error applying word match", on_applied)
     
     def apply_remove_duplicates_filter(self, selected_column_names):
         """Apply duplicate removal filter to the data"""
-        if self.df is None:
+        if self.pipeline is None:
             QMessageBox.warning(self, "Warning", "Please load a CSV file first")
             return
         
@@ -313,65 +358,28 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Please select at least one column")
             return
         
-        # Show processing dialog
-        progress_dialog = ProcessingDialog(self, "Removing duplicates, please wait...")
-        progress_dialog.set_progress(20)
-        progress_dialog.show()
-        QApplication.processEvents()
+        # Dedup runs on top of whatever has been applied so far
+        before_count = self.row_count
+        operation = Operation("remove_duplicates", {"selected_column_names": selected_column_names})
         
-        try:
-            # Save the current state for undo
-            self.operation_states.append(self.df.clone())
-            
-            # Process using the dataframe we currently have (could be filtered already)
-            progress_dialog.set_progress(30)
-            progress_dialog.set_message("Identifying and removing duplicates...")
-            QApplication.processEvents()
-            
-            # Store row count before deduplication
-            before_count = self.df.shape[0]
-            
-            # Remove duplicates
-            cleaned_df = self.df.unique(subset=selected_column_names)
-            
-            # Update the current dataframe
-            self.df = cleaned_df
-            self.row_count = cleaned_df.shape[0]
-            
+        def on_applied():
             # Calculate removed rows
             removed_count = before_count - self.row_count
             
-            progress_dialog.set_progress(80)
-            progress_dialog.set_message("Updating results view...")
-            QApplication.processEvents()
-            
-            # Store operation in history
             cols_display = ", ".join(selected_column_names[:3])
             if len(selected_column_names) > 3:
                 cols_display += f" and {len(selected_column_names) - 3} more"
             
-            op_description = f"Removed {removed_count} duplicates based on {cols_display}"
-            self.operations_history.append(op_description)
-            
-            # Update results frame
-            self.results_frame.update_history(self.operations_history)
-            self.results_frame.update_preview(self.df)
+            operation.description = f"Removed {removed_count} duplicates based on {cols_display}"
             self.results_frame.update_status(f"Removed {removed_count} duplicate rows based on columns: {cols_display}")
             self.results_frame.update_title("Processed Data Preview")
-            self.results_frame.enable_buttons(reset=True, download=True, undo=True)
-            
-            progress_dialog.set_progress(100)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error removing duplicates: {str(e)}")
-        finally:
-            progress_dialog.close()
-            # Reset splitter proportions
-            self.reset_splitter_sizes()
+        
+        self.run_operation(operation, "Removing duplicates, please wait...",
+                           "Error removing duplicates", on_applied)
     
     def apply_find_replace_filter(self, column_name, old_value, new_value):
         """Apply find and replace to the data"""
-        if self.df is None:
+        if self.pipeline is None:
             QMessageBox.warning(self, "Warning", "Please load a CSV file first")
             return
         
@@ -383,82 +391,29 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Please enter a replacement value")
             return
         
-        # Show processing dialog
-        progress_dialog = ProcessingDialog(self, "Applying find and replace, please wait...")
-        progress_dialog.set_progress(20)
-        progress_dialog.show()
-        QApplication.processEvents()
+        # Record the replacement in the lazy plan
+        operation = Operation("find_replace", {
+            "column_name": column_name,
+            "old_value": old_value,
+            "new_value": new_value,
+        })
         
-        try:
-            # Save the current state for undo
-            self.operation_states.append(self.df.clone())
-            
-            progress_dialog.set_progress(50)
-            progress_dialog.set_message("Updating data...")
-            QApplication.processEvents()
-            
-            # Create a copy of the dataframe to work with
-            result_df = self.df.clone()
-            
-            # Determine column data type
-            col_dtype = result_df.schema[column_name]
-            print(f"Column data type: {col_dtype}")
-            
-            # Handle null values first if needed
-            if not old_value:
-                result_df = result_df.with_columns(
-                    pl.col(column_name).fill_null(new_value)
-                )
-            else:
-                # Convert both sides to strings for comparison
-                expr = (
-                    pl.when(pl.col(column_name).is_not_null())
-                    .then(
-                        pl.when(pl.col(column_name).cast(pl.Utf8).eq(old_value))
-                        .then(pl.lit(new_value))
-                        .otherwise(pl.col(column_name))
-                    )
-                    .otherwise(pl.col(column_name))
-                )
-                
-                result_df = result_df.with_columns([
-                    expr.alias(column_name)
-                ])
-            
-            # Update the current dataframe
-            self.df = result_df
-            
-            progress_dialog.set_progress(80)
-            progress_dialog.set_message("Updating results view...")
-            QApplication.processEvents()
-            
-            # Store operation in history
+        def on_applied():
             if old_value:
                 op_description = f"Replaced '{old_value}' with '{new_value}' in column '{column_name}'"
             else:
                 op_description = f"Replaced NULL values with '{new_value}' in column '{column_name}'"
             
-            self.operations_history.append(op_description)
-            
-            # Update results frame
-            self.results_frame.update_history(self.operations_history)
-            self.results_frame.update_preview(self.df)
+            operation.description = op_description
             self.results_frame.update_status(op_description)
             self.results_frame.update_title("Processed Data Preview")
-            self.results_frame.enable_buttons(reset=True, download=True, undo=True)
-            
-            progress_dialog.set_progress(100)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error applying find and replace: {str(e)}")
-        finally:
-            progress_dialog.close()
-            # Reset splitter proportions
-            self.reset_splitter_sizes()
+        
+        self.run_operation(operation, "Applying find and replace, please wait...",
+                           "Error applying find and replace", on_applied)
     
     def apply_email_validation_filter(self, column_name):
         """Remove rows with invalid email formats"""
-        if self.df is None:
+        if self.pipeline is None:
             QMessageBox.warning(self, "Warning", "Please load a CSV file first")
             return
         
@@ -466,60 +421,25 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Please select a column")
             return
         
-        # Show processing dialog
-        progress_dialog = ProcessingDialog(self, "Validating emails, please wait...")
-        progress_dialog.set_progress(20)
-        progress_dialog.show()
-        QApplication.processEvents()
+        # Store row count before filtering
+        before_count = self.row_count
+        operation = Operation("email_validation", {"column_name": column_name})
         
-        try:
-            # Save the current state for undo
-            self.operation_states.append(self.df.clone())
-            
-            progress_dialog.set_progress(30)
-            progress_dialog.set_message("Validating emails...")
-            QApplication.processEvents()
-            
-            # Store row count before filtering
-            before_count = self.df.shape[0]
-            
-            # Use the main.py function to filter valid emails
-            valid_emails = main.filter_valid_emails(self.df, column_name)
-            
-            # Update the current dataframe
-            self.df = valid_emails
-            self.row_count = valid_emails.shape[0]
-            
+        def on_applied():
             # Calculate removed rows
             removed_count = before_count - self.row_count
             
-            progress_dialog.set_progress(80)
-            progress_dialog.set_message("Updating results view...")
-            QApplication.processEvents()
-            
-            # Store operation in history
             op_description = f"Removed {removed_count} rows with invalid emails in column '{column_name}'"
-            self.operations_history.append(op_description)
-            
-            # Update results frame
-            self.results_frame.update_history(self.operations_history)
-            self.results_frame.update_preview(self.df)
+            operation.description = op_description
             self.results_frame.update_status(op_description)
             self.results_frame.update_title("Processed Data Preview")
-            self.results_frame.enable_buttons(reset=True, download=True, undo=True)
-            
-            progress_dialog.set_progress(100)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error validating emails: {str(e)}")
-        finally:
-            progress_dialog.close()
-            # Reset splitter proportions
-            self.reset_splitter_sizes()
+        
+        self.run_operation(operation, "Validating emails, please wait...",
+                           "Error validating emails", on_applied)
             
-    def apply_domain_similarity_filter(self, email_column, domain_column, threshold=0.75, check_username=True):
+    def apply_domain_similarity_filter(self, email_column, domain_column, threshold=0.75, check_username=True, workers=1):
         """Apply domain similarity filter to the data"""
-        if self.df is None:
+        if self.pipeline is None:
             QMessageBox.warning(self, "Warning", "Please load a CSV file first")
             return
         
@@ -527,84 +447,46 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Please select both email and domain columns")
             return
         
-        # Show processing dialog
-        progress_dialog = ProcessingDialog(self, "Analyzing domain similarity, please wait...")
-        progress_dialog.set_progress(0)
-        progress_dialog.show()
-        QApplication.processEvents()
+        # Scoring reports its own progress through the worker signals
+        operation = Operation("domain_similarity", {
+            "email_column": email_column,
+            "domain_column": domain_column,
+            "threshold": threshold,
+            "check_username": check_username,
+            "workers": workers,
+        })
         
-        try:
-            # Save the current state for undo
-            self.operation_states.append(self.df.clone())
-            
-            # Define progress callback
-            def update_progress(percent, message):
-                progress_dialog.set_progress(percent)
-                progress_dialog.set_message(message)
-                QApplication.processEvents()
-                
-            # Apply domain similarity filter with progress updates
-            filtered_df = main.domain_similarity_filter(
-                self.df, 
-                email_column, 
-                domain_column, 
-                threshold,
-                check_username,
-                update_progress
-            )
-            
-            # Update the current dataframe
-            self.df = filtered_df
-            self.row_count = filtered_df.shape[0]
-            
-            # Store operation in history
+        def on_applied():
             check_username_str = "checked email usernames" if check_username else "checked domains only"
-            op_description = f"Found {self.row_count} emails with {int(threshold*100)}% domain similarity ({check_username_str})"
-            self.operations_history.append(op_description)
-            
-            # Update results frame
-            self.results_frame.update_history(self.operations_history)
-            self.results_frame.update_preview(self.df)
+            operation.description = f"Found {self.row_count} emails with {int(threshold*100)}% domain similarity ({check_username_str})"
             self.results_frame.update_status(f"Found {self.row_count} emails with domain similarity >= {int(threshold*100)}%")
             self.results_frame.update_title("Domain Similarity Results")
-            self.results_frame.enable_buttons(reset=True, download=True, undo=True)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error analyzing domain similarity: {str(e)}")
-        finally:
-            progress_dialog.close()
-            # Reset splitter proportions
-            self.reset_splitter_sizes()
+        
+        self.run_operation(operation, "Analyzing domain similarity, please wait...",
+                           "Error analyzing domain similarity", on_applied)
     
     def reset_to_original_data(self):
         """Reset to original data"""
-        if self.original_df is not None:
-            # Reset to original data
-            self.df = self.original_df.clone()
-            self.row_count = self.df.shape[0]
-            
-            # Clear operations history and states
-            self.operations_history = []
-            self.operation_states = []
-            
-            # Update results frame
-            self.results_frame.update_history(self.operations_history)
-            self.results_frame.update_preview(self.df)
-            self.results_frame.update_status("Reset to original data")
-            self.results_frame.update_title("Original Data Preview")
-            self.results_frame.enable_buttons(reset=False, download=False, undo=False)
+        if self.pipeline is not None:
+            # Reset to original data by dropping every recorded step
+            previous_state = self.pipeline.snapshot()
+            self.pipeline.clear()
+            
+            def on_refreshed():
+                self.results_frame.update_status("Reset to original data")
+                self.results_frame.update_title("Original Data Preview")
+                self.results_frame.enable_buttons(reset=False, download=False, undo=False)
             
-            # Reset splitter proportions
-            self.reset_splitter_sizes()
+            self.refresh_results("Resetting to original data, please wait...", previous_state, on_refreshed)
     
     def download_result_data(self):
-        """Export filtered data to CSV file"""
-        if self.df is None:
+        """Export filtered data in a chosen file format"""
+        if self.pipeline is None:
             QMessageBox.warning(self, "Warning", "No results to download")
             return
         
         # Create column selection dialog
-        export_dialog = ExportDialog(self, self.df.columns)
+        export_dialog = ExportDialog(self, self.pipeline.columns)
         
         # Show dialog
         if export_dialog.exec_() != export_dialog.Accepted:
@@ -617,65 +499,172 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Please select at least one column to export")
             return
         
-        # Get file path
+        # Get file path and format
         suggested_name = os.path.splitext(os.path.basename(self.csv_file))[0] + "_processed.csv"
-        save_path, _ = QFileDialog.getSaveFileName(self, "Save CSV File", suggested_name, "CSV Files (*.csv)")
+        name_filters = ";;".join(export.file_filter(fmt) for fmt in export.available_formats())
+        save_path, name_filter = QFileDialog.getSaveFileName(self, "Save Result", suggested_name, name_filters)
         if not save_path:
             return
-            
-        # Show processing dialog
-        progress_dialog = ProcessingDialog(self, "Saving CSV file, please wait...")
-        progress_dialog.set_progress(30)
-        progress_dialog.show()
-        QApplication.processEvents()
-        
-        try:
-            # Export only selected columns
-            export_df = self.df.select(selected_columns)
-            export_df.write_csv(save_path)
-            
-            progress_dialog.set_progress(100)
-            progress_dialog.close()
-            
+        fmt = export.format_for_filter(name_filter) or export.format_for_path(save_path)
+        save_path = export.with_extension(save_path, fmt)
+        partitioning = export_dialog.get_partitioning()
+        # Split exports go in a folder named after the chosen file
+        saved_to = export.partition_directory(save_path, fmt) if partitioning else save_path
+        
+        pipeline = self.pipeline
+        engine = pipeline.engine
+        row_count = self.row_count
+        # A split column left out of the export is still read, export_partitioned splits on it and drops it
+        plan_columns = list(selected_columns)
+        if partitioning and partitioning["by"] == "column" and partitioning["column"] not in plan_columns:
+            plan_columns.append(partitioning["column"])
+        
+        def job(progress_callback, cancel_token):
+            # Run the full plan once, writing only the selected columns
+            progress_callback(5, "Writing file...")
+            result = pipeline.with_relaxed_types(lambda: write(progress_callback, cancel_token))
+            progress_callback(100, "Done")
+            return result
+        
+        def write(progress_callback, cancel_token):
+            # Columns the steps never used are read from the file for the export only
+            plan = pipeline.export_plan(plan_columns)
+            if partitioning:
+                parts, rows = export.export_partitioned(plan, save_path, partitioning, fmt, selected_columns, engine,
+                                                        row_count, progress_callback, cancel_token)
+                return rows, len(parts)
+            rows = export.export_frame(plan, save_path, fmt, selected_columns, engine, row_count,
+                                       progress_callback, cancel_token)
+            return rows, None
+        
+        def on_result(result):
+            rows, file_count = result
+            saved = f"{file_count} files saved to:" if file_count is not None else "File saved successfully to:"
             QMessageBox.information(
                 self, 
                 "Success", 
-                f"File saved successfully to:\n{save_path}\n\nRows: {export_df.shape[0]}\nColumns: {len(selected_columns)}"
+                f"{saved}\n{saved_to}\n\nRows: {rows}\nColumns: {len(selected_columns)}"
             )
-        except Exception as e:
-            progress_dialog.close()
-            QMessageBox.critical(self, "Error", f"Error saving file: {str(e)}")
+        
+        run_in_background(self, "Saving file, please wait...", job, on_result, "Error saving file")
             
     def undo_last_operation(self):
         """Undo the last operation"""
-        if not self.operations_history:
+        if self.pipeline is None or not self.pipeline.history.can_undo:
             QMessageBox.information(self, "Info", "No operations to undo")
             return
             
-        # Get the last operation
-        last_op = self.operations_history.pop()
-        
-        # If we have operations history but no saved states, create one for original
-        if self.operation_states and len(self.operations_history) >= len(self.operation_states):
-            # This shouldn't normally happen, but just in case
-            self.operation_states.insert(0, self.original_df.clone())
-        
-        # If there are no operations left, restore original dataframe
-        if not self.operations_history:
-            self.df = self.original_df.clone()
-            self.results_frame.update_status(f"Undid operation: {last_op}")
-            self.results_frame.update_title("Original Data Preview")
-            self.results_frame.enable_buttons(reset=False, download=False, undo=False)
-        else:
-            # Get the previous dataframe state
-            self.df = self.operation_states.pop()
-            self.results_frame.update_status(f"Undid operation: {last_op}")
+        # Move the last operation to the redo stack, the plan replays the rest
+        previous_state = self.pipeline.snapshot()
+        last_op = self.pipeline.undo()
+        self.refresh_after_history_change(previous_state, f"Undid operation: {last_op.description}")
+    
+    def redo_last_operation(self):
+        """Redo the last undone operation"""
+        if self.pipeline is None or not self.pipeline.history.can_redo:
+            QMessageBox.information(self, "Info", "No operations to redo")
+            return
+        
+        # Recorded masks and checkpoints make redo a replay, not a recompute
+        previous_state = self.pipeline.snapshot()
+        operation = self.pipeline.redo()
+        self.refresh_after_history_change(previous_state, f"Redid operation: {operation.description}")
+    
+    def refresh_after_history_change(self, previous_state, status):
+        """Update the results view after undo or redo moved through the history"""
+        def on_refreshed():
+            has_operations = self.pipeline.history.can_undo
+            
+            # With no operations left, the plan is back to the original file
+            if has_operations:
+                self.results_frame.update_title("Processed Data Preview")
+            else:
+                self.results_frame.update_title("Original Data Preview")
+            self.results_frame.enable_buttons(
+                reset=has_operations,
+                download=has_operations,
+                undo=has_operations,
+                redo=self.pipeline.history.can_redo
+            )
+            self.results_frame.update_status(status)
+        
+        # Update the UI
+        self.refresh_results("Updating results, please wait...", previous_state, on_refreshed)
+
+    def save_recipe(self):
+        """Save the applied operations as a recipe file"""
+        if self.pipeline is None or not self.pipeline.operations:
+            QMessageBox.information(self, "Info", "No operations to save")
+            return
+        
+        suggested_name = os.path.splitext(os.path.basename(self.csv_file))[0] + "_recipe.json"
+        save_path, _ = QFileDialog.getSaveFileName(
+            self, "Save Recipe", suggested_name, "Recipe Files (*.json *.yaml *.yml)"
+        )
+        if not save_path:
+            return
+        
+        try:
+            Recipe(self.pipeline.operations, source=os.path.basename(self.csv_file)).save(save_path)
+            self.results_frame.update_status(f"Recipe saved to {os.path.basename(save_path)}")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Error saving recipe: {str(e)}")
+    
+    def apply_recipe(self):
+        """Replay the operations of a recipe file on the loaded data"""
+        if self.pipeline is None:
+            QMessageBox.warning(self, "Warning", "Please load a CSV file first")
+            return
+        
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Open Recipe", "", "Recipe Files (*.json *.yaml *.yml);;All Files (*)"
+        )
+        if not file_path:
+            return
+        
+        try:
+            recipe = Recipe.load(file_path)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Error reading recipe: {str(e)}")
+            return
+        
+        if recipe.uses_files:
+            QMessageBox.warning(
+                self, "Warning",
+                "This recipe merges or subtracts other files, run it with the command-line tool instead"
+            )
+            return
+        if not recipe.operations:
+            QMessageBox.information(self, "Info", "The recipe has no operations")
+            return
+        
+        pipeline = self.pipeline
+        operations = recipe.fresh_operations()
+        previous_state = pipeline.snapshot()
+        
+        def job(progress_callback, cancel_token):
+            # All steps are chained into one plan, rows are counted once at the end
+            pipeline.apply_recipe(operations, progress_callback, cancel_token)
+            progress_callback(90, "Updating results view...")
+            return pipeline.row_count(), pipeline.view(), pipeline.preview(DEFAULT_BLOCK_SIZE)
+        
+        def on_result(result):
+            self.row_count, plan, head = result
+            self.operations_history = self.pipeline.descriptions
+            
+            self.results_frame.update_history(self.operations_history)
+            self.results_frame.update_preview(plan, self.row_count, head)
             self.results_frame.update_title("Processed Data Preview")
             self.results_frame.enable_buttons(reset=True, download=True, undo=True)
+            self.results_frame.update_status(
+                f"Applied {len(operations)} operation(s) from {os.path.basename(file_path)}. "
+                f"Remaining rows: {self.row_count}"
+            )
+            self.report_cache_error()
         
-        # Update the UI
-        self.results_frame.update_history(self.operations_history)
-        self.results_frame.update_preview(self.df)
+        def on_cancelled():
+            pipeline.restore(previous_state)
+            self.results_frame.update_status("Operation cancelled, data unchanged")
         
-        # Reset splitter proportions
-        self.reset_splitter_sizes()
\ No newline at end of file
+        run_in_background(self, "Applying recipe, please wait...", job, on_result, "Error applying recipe",
+                          on_finished=self.reset_splitter_sizes, on_cancelled=on_cancelled)
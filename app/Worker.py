@@ -0,0 +1,93 @@
+import traceback
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+from PyQt5.QtWidgets import QMessageBox
+
+from app.CancelToken import CancelToken, JobCancelled
+from app.ProcessingDialog import ProcessingDialog
+
+
+class WorkerSignals(QObject):
+    """Signals a Worker emits, delivered on the GUI thread"""
+    progress = pyqtSignal(int, str)
+    result = pyqtSignal(object)
+    partial_result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    finished = pyqtSignal()
+
+
+class Worker(QRunnable):
+    """Runs fn on a QThreadPool thread and reports back through signals.
+
+    fn is called as fn(*args, progress_callback=callback, cancel_token=token,
+    **kwargs) and must not touch any widget. Its return value is emitted as
+    the result, report_partial() sends results of finished pieces of work
+    before that. Once cancel() is called, the next progress report or token
+    check raises JobCancelled and the worker emits cancelled instead.
+    """
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self.cancel_token = CancelToken()
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def report_progress(self, percent, message=""):
+        # Every progress report doubles as a cancellation point
+        self.cancel_token.raise_if_cancelled()
+        self.signals.progress.emit(int(percent), message)
+
+    def report_partial(self, value):
+        self.signals.partial_result.emit(value)
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            result = self.fn(*self.args, progress_callback=self.report_progress,
+                             cancel_token=self.cancel_token, **self.kwargs)
+        except JobCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.error.emit(str(e))
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+def run_in_background(parent, message, fn, on_result, error_message, on_finished=None, on_cancelled=None,
+                      on_partial=None):
+    """Run fn on the thread pool while a modal ProcessingDialog shows its progress
+
+    With on_partial, fn also receives partial_callback, each value passed to it
+    is delivered to on_partial on the GUI thread while the job still runs.
+    """
+    progress_dialog = ProcessingDialog(parent, message, cancellable=True)
+    progress_dialog.setModal(True)
+    progress_dialog.set_progress(0)
+
+    worker = Worker(fn)
+    worker.signals.progress.connect(progress_dialog.update_progress)
+    worker.signals.result.connect(on_result)
+    if on_partial is not None:
+        worker.kwargs["partial_callback"] = worker.report_partial
+        worker.signals.partial_result.connect(on_partial)
+    worker.signals.error.connect(lambda error: QMessageBox.critical(parent, "Error", f"{error_message}: {error}"))
+    progress_dialog.cancel_requested.connect(worker.cancel)
+    if on_cancelled is not None:
+        worker.signals.cancelled.connect(on_cancelled)
+    worker.signals.finished.connect(progress_dialog.finish)
+    if on_finished is not None:
+        worker.signals.finished.connect(on_finished)
+
+    # Keep a reference on the parent so the worker outlives this call
+    parent.current_job = worker
+    progress_dialog.show()
+    QThreadPool.globalInstance().start(worker)
+    return worker
@@ -0,0 +1,76 @@
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+
+import polars as pl
+
+
+class WorkingSetStore:
+    """Spills DataFrames to Arrow IPC files in a temporary directory.
+
+    A spilled frame is read back memory-mapped, so keeping it around costs
+    page cache the OS can reclaim rather than Python heap. Files are deleted
+    when released and the whole directory is removed at exit.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._owns_directory = directory is None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _ensure_directory(self):
+        with self._lock:
+            if self.directory is None:
+                self.directory = tempfile.mkdtemp(prefix="csv-processor-")
+            else:
+                os.makedirs(self.directory, exist_ok=True)
+        return self.directory
+
+    def new_path(self, suffix=".arrow"):
+        """Unused path in the store, for callers writing their own files"""
+        return os.path.join(self._ensure_directory(), uuid.uuid4().hex + suffix)
+
+    def spill(self, frame):
+        """Write frame to the store, returning (path, memory-mapped copy of frame)"""
+        path = self.new_path()
+        # Uncompressed so the mapped copy shares the file pages without decoding
+        frame.write_ipc(path, compression="uncompressed")
+        return path, pl.read_ipc(path, memory_map=True, rechunk=False)
+
+    def sink(self, lazy_frame):
+        """Stream a LazyFrame into the store without collecting it, returning the path
+        
+        Sinking uncompressed IPC is not supported by the pinned Polars, so
+        sunk files are lz4 compressed and decoded when read.
+        """
+        path = self.new_path()
+        try:
+            lazy_frame.sink_ipc(path, compression="lz4", engine="streaming")
+        except Exception:
+            self.release(path)
+            raise
+        return path
+
+    def release(self, path):
+        """Delete a spilled file once nothing needs it"""
+        if path is None:
+            return
+        try:
+            os.remove(path)
+        except OSError:
+            # Still mapped on Windows, the directory is removed at exit instead
+            pass
+
+    def usage(self):
+        """Bytes currently held on disk by spilled frames"""
+        if self.directory is None or not os.path.isdir(self.directory):
+            return 0
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+    def close(self):
+        if self.directory is not None and self._owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
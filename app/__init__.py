@@ -1,6 +1,24 @@
-from app.SingleProcessorWindow import MainWindow
-from app.PolarsTableModel import PolarsTableModel
-from app.ProcessingDialog import ProcessingDialog
+import importlib
 
-# Export the classes so they can be imported directly from UI
-__all__ = ['MainWindow', 'PolarsTableModel', 'ProcessingDialog', 'BulkProcessorWindow', 'LauncherWindow']
\ No newline at end of file
+# Export the classes so they can be imported directly from UI. They are
+# resolved lazily so that process pool workers and headless callers can
+# import app.main without pulling in PyQt.
+__all__ = ['MainWindow', 'PolarsTableModel', 'ProcessingDialog', 'BulkProcessorWindow', 'LauncherWindow', 'Worker']
+
+_CLASS_MODULES = {
+    'MainWindow': 'app.SingleProcessorWindow',
+    'PolarsTableModel': 'app.PolarsTableModel',
+    'ProcessingDialog': 'app.ProcessingDialog',
+    'BulkProcessorWindow': 'app.BulkProcessorWindow',
+    'LauncherWindow': 'app.LauncherWindow',
+    'Worker': 'app.Worker',
+}
+
+
+def __getattr__(name):
+    if name not in _CLASS_MODULES:
+        raise AttributeError(f"module 'app' has no attribute {name!r}")
+    cls = getattr(importlib.import_module(_CLASS_MODULES[name]), name)
+    # Importing the submodule binds its name on the package, replace it with the class
+    globals()[name] = cls
+    return cls
@@ -0,0 +1,487 @@
+"""Headless batch runner for the CSV processing operations.
+
+Runs an ordered list of operations over one or more CSV files without Qt,
+for example:
+
+    python cli.py "vendors/*.csv" -o cleaned/ \
+        --word-match columns=email values=acme,globex \
+        --dedup columns=email \
+        --domain-similarity email=email website=website threshold=0.8
+
+Operations run in the order they are given. Without --merge every input is
+processed on its own, in parallel across --jobs processes, and written to
+the output directory. --merge combines all inputs into one output file,
+operations before it apply to each input and those after it to the merged
+data.
+
+--recipe runs the operations of a recipe saved from the GUI, or by an
+earlier run with --save-recipe, and can be mixed with other operations.
+
+--incremental processes only the rows appended to each input since the
+last run of the same operations into the same output, and appends what
+they leave to the output, see app.incremental.
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import polars as pl
+
+import app.main as main
+import app.export as export
+import app.incremental as incremental
+from app.OperationHistory import Operation
+from app.Recipe import Recipe
+
+STREAMING_MODES = ("auto", "always", "never")
+
+
+class OperationAction(argparse.Action):
+    """Append (operation name, key=value tokens) to one shared, ordered list"""
+    def __call__(self, parser, namespace, values, option_string=None):
+        operations = list(getattr(namespace, self.dest, None) or [])
+        operations.append((self.const, values, option_string))
+        setattr(namespace, self.dest, operations)
+
+
+def parse_params(tokens, option_string):
+    """Turn key=value tokens into a dict"""
+    params = {}
+    for token in tokens:
+        key, sep, value = token.partition("=")
+        if not sep or not key:
+            raise ValueError(f"{option_string}: expected key=value, got '{token}'")
+        params[key.strip().lower()] = value
+    return params
+
+
+def _require(params, key, option_string):
+    if not params.get(key):
+        raise ValueError(f"{option_string}: missing {key}=...")
+    return params[key]
+
+
+def _list(params, key, option_string):
+    return [value.strip() for value in _require(params, key, option_string).split(",") if value.strip()]
+
+
+def _bool(params, key, default):
+    if key not in params:
+        return default
+    return params[key].strip().lower() in ("1", "true", "yes", "y", "on")
+
+
+def build_operation(name, tokens, option_string):
+    """Build the Operation recipe for one command-line operation"""
+    params = parse_params(tokens, option_string)
+
+    if name == "word_match":
+        if "values_file" in params:
+            # One value per line, for lists too long or too comma-heavy for the command line
+            with open(params["values_file"], encoding="utf-8") as f:
+                search_values = [line.strip() for line in f if line.strip()]
+        else:
+            search_values = _list(params, "values", option_string)
+        return Operation("word_match", {
+            "selected_column_names": _list(params, "columns", option_string),
+            "search_values": search_values,
+            "include": _bool(params, "include", True),
+            "case_insensitive": _bool(params, "case_insensitive", True),
+            "literal": not _bool(params, "regex", False),
+        })
+    elif name == "remove_duplicates":
+        return Operation("remove_duplicates", {"selected_column_names": _list(params, "columns", option_string)})
+    elif name == "find_replace":
+        return Operation("find_replace", {
+            "column_name": _require(params, "column", option_string),
+            "old_value": params.get("old", ""),
+            "new_value": _require(params, "new", option_string),
+        })
+    elif name == "email_validation":
+        return Operation("email_validation", {"column_name": _require(params, "column", option_string)})
+    elif name == "domain_similarity":
+        return Operation("domain_similarity", {
+            "email_column": _require(params, "email", option_string),
+            "domain_column": _require(params, "website", option_string),
+            "threshold": float(params.get("threshold", 0.75)),
+            "check_username": _bool(params, "check_username", True),
+            "workers": int(params.get("workers", 1)),
+        })
+    elif name == "merge":
+        return Operation("merge", {"merge_column": _require(params, "column", option_string)})
+    elif name == "subtract":
+        operation = Operation("subtract", {
+            "file_name": _require(params, "file", option_string),
+            "subtract_column": _list(params, "column", option_string),
+        })
+        if "bloom" in params:
+            operation.params["false_positive_rate"] = float(params["bloom"])
+        return operation
+    raise ValueError(f"Unknown operation: {name}")
+
+
+def build_operations(operation_args):
+    """Build the ordered Operation list, expanding --recipe files in place"""
+    operations = []
+    for name, tokens, option_string in operation_args:
+        if name == "recipe":
+            for path in tokens:
+                operations.extend(Recipe.load(path).fresh_operations())
+        else:
+            operations.append(build_operation(name, tokens, option_string))
+    return operations
+
+
+def expand_inputs(patterns):
+    """Resolve input globs to a sorted list of distinct files"""
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        files.extend(path for path in matches if os.path.isfile(path))
+    return list(dict.fromkeys(files))
+
+
+def source_files(inputs, operations):
+    """Every CSV file a run parses, the inputs and the files subtracted from them"""
+    subtracted = [operation.params["file_name"] for operation in operations if operation.op == "subtract"]
+    return list(dict.fromkeys(list(inputs) + subtracted))
+
+
+def use_streaming(file_name, streaming):
+    if streaming == "always":
+        return True
+    if streaming == "never":
+        return False
+    return main.use_streaming(file_name)
+
+
+def run_operations(frames, operations, engine="auto", merge_partitions=1):
+    """Apply operations in order to a list of frames, a merge turns them into one
+    
+    With more than one merge partition the merge is deduplicated in hash
+    partitioned passes into the working set, see main.streaming_merge.
+    """
+    for operation in operations:
+        if operation.op == "merge" and merge_partitions > 1:
+            path = main.streaming_merge(frames, operation.params["merge_column"], merge_partitions)
+            frames = [pl.scan_ipc(path)]
+        elif operation.op == "merge":
+            frames = [main.merge_frames(frames, operation.params["merge_column"])]
+        elif operation.op == "subtract" and operation.params.get("false_positive_rate"):
+            frames = [
+                main.bloom_subtract(frame, operation.params["file_name"], operation.params["subtract_column"],
+                                    operation.params["false_positive_rate"])
+                for frame in frames
+            ]
+        elif operation.op == "subtract":
+            # Distinct keys come from the key index, built on the first run against this file
+            exclude_frame = main.exclusion_keys(operation.params["file_name"], operation.params["subtract_column"])
+            frames = [
+                main.subtract_frame(frame, exclude_frame, operation.params["subtract_column"])
+                for frame in frames
+            ]
+        else:
+            frames = [main.compile_operations(frame, [operation], engine) for frame in frames]
+    return frames
+
+
+def write_output(frame, output_path, columns=None, engine="auto", fmt=None, partitioning=None):
+    """Write the compiled query in fmt, by default the output path's format, and return (path, rows written)
+    
+    With a partitioning the parts go in a directory named after output_path,
+    which is the path returned.
+    """
+    if partitioning:
+        _, row_count = export.export_partitioned(frame, output_path, partitioning, fmt, columns, engine)
+        return export.partition_directory(output_path, fmt), row_count
+    return output_path, export.export_frame(frame, output_path, fmt, columns, engine)
+
+
+def run_incremental_operations(frame, operations, seen_keys, engine="auto"):
+    """run_operations over one frame of new rows, returning (frame, keys, working set paths)
+
+    Duplicate removal also drops the keys earlier runs let through,
+    seen_keys maps the index of each remove_duplicates step to the path of
+    those keys. keys maps the same indexes to LazyFrames of every key let
+    through so far, for incremental.save_state. Each step's result is sunk
+    to the working set so its keys and the rows after it come from one pass,
+    the caller releases the paths.
+    """
+    keys = {}
+    paths = []
+    pending = []
+    try:
+        for step, operation in enumerate(operations):
+            if operation.op != "remove_duplicates":
+                pending.append(operation)
+                continue
+            frame = run_operations([frame], pending, engine)[0]
+            pending = []
+            columns = operation.params["selected_column_names"]
+            paths.append(main.WORKING_SET.sink(incremental.drop_seen_duplicates(frame, columns, seen_keys.get(step))))
+            frame = pl.scan_ipc(paths[-1])
+            keys[step] = incremental.merge_keys(frame, columns, seen_keys.get(step))
+        frame = run_operations([frame], pending, engine)[0]
+    except BaseException:
+        for path in paths:
+            main.WORKING_SET.release(path)
+        raise
+    return frame, keys, paths
+
+
+def process_appended(input_path, operations, output_path, engine="auto", columns=None, fmt=None):
+    """Run operations over the rows appended since the last incremental run, returning (output rows, new rows)
+
+    Without a usable state from an earlier run the whole file is processed
+    and the output rewritten, see incremental.resume_problem.
+    """
+    fmt = fmt or export.format_for_path(output_path)
+    name = os.path.basename(input_path)
+    spec = main.parse_spec(input_path)
+    key = incremental.state_key(input_path, output_path, operations, columns, fmt)
+    state = incremental.load_state(key)
+    problem = incremental.resume_problem(state, input_path, output_path, spec)
+    end = incremental.complete_end(input_path)
+
+    if problem is None and state["byte_offset"] == end:
+        print(f"Incremental: {name}: no new rows")
+        return state["output_rows"], 0
+    if problem is None:
+        start = state["byte_offset"]
+        seen_keys = {step: incremental.key_path(key, step) for step in state["dedup_steps"]}
+        print(f"Incremental: {name}: reading from byte {start} after {state['source_rows']} rows")
+    else:
+        start = 0
+        seen_keys = {}
+        state = {"source_rows": 0, "output_rows": 0}
+        incremental.clear_state(key)
+        print(f"Incremental: {name}: {problem}, processing the whole file")
+
+    def run():
+        # Relaxing the file's types replaces its spec, so it is looked up again on each call
+        frame, paths = incremental.scan_range(input_path, main.parse_spec(input_path), start, end)
+        try:
+            source_rows = frame.select(pl.len()).collect(engine=engine).item()
+            frame, keys, step_paths = run_incremental_operations(frame, operations, seen_keys, engine)
+            paths.extend(step_paths)
+            if start == 0:
+                _, row_count = write_output(frame, output_path, columns, engine, fmt)
+            else:
+                row_count = export.append_csv(frame, output_path, fmt, columns, engine)
+            incremental.save_state(key, {
+                "byte_offset": end,
+                "source_rows": state["source_rows"] + source_rows,
+                "output_rows": state["output_rows"] + row_count,
+                "output_size": os.path.getsize(output_path),
+                "head_hash": incremental.head_hash(input_path, end),
+            }, keys)
+        finally:
+            for path in paths:
+                main.WORKING_SET.release(path)
+        return source_rows, row_count
+
+    source_rows, row_count = main.with_relaxed_types(source_files([input_path], operations), run)
+    print(f"Incremental: {name}: {source_rows} rows read, {row_count} written")
+    return state["output_rows"] + row_count, row_count
+
+
+def process_file(input_path, operation_dicts, output_path, streaming="auto", columns=None, use_cache=True,
+                 fmt=None, partitioning=None, incremental_run=False):
+    """Run the full operation list over one file, in a worker process when parallel"""
+    if not use_cache:
+        # Read the CSV itself even when a parsed copy is cached
+        main.PARSED_FILE_CACHE.max_bytes = 0
+    operations = [Operation.from_dict(data) for data in operation_dicts]
+    engine = "streaming" if use_streaming(input_path, streaming) else "auto"
+
+    start = time.time()
+    spec = main.parse_spec(input_path)
+    if not spec.is_default_dialect:
+        print(f"Parse: {os.path.basename(input_path)}: {spec.describe()}")
+    if incremental_run:
+        row_count, _ = process_appended(input_path, operations, output_path, engine, columns, fmt)
+        return input_path, output_path, row_count, time.time() - start
+
+    def run():
+        frame = run_operations([main.scan_csv(input_path)], operations, engine)[0]
+        return write_output(frame, output_path, columns, engine, fmt, partitioning)
+
+    output_path, row_count = main.with_relaxed_types(source_files([input_path], operations), run)
+    return input_path, output_path, row_count, time.time() - start
+
+
+def output_path_for(input_path, output_dir, suffix="_processed", fmt="csv"):
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_dir, f"{stem}{suffix}{export.EXPORT_FORMATS[fmt][1]}")
+
+
+def run_batch(inputs, operations, output, streaming="auto", columns=None, jobs=None, use_cache=True, fmt=None,
+              partitioning=None, incremental_run=False):
+    """Run a batch and return a list of (input, output, rows, seconds)
+    
+    fmt is an export format key, by default taken from the output file's
+    extension, or CSV when writing to a directory. partitioning splits each
+    output over several files, see export.export_partitioned. An
+    incremental run only processes rows appended since the last one, see
+    process_appended.
+    """
+    if fmt is None and not os.path.isdir(output):
+        fmt = export.format_for_path(output)
+    fmt = fmt or "csv"
+    if not use_cache:
+        main.PARSED_FILE_CACHE.max_bytes = 0
+    if incremental_run:
+        if any(operation.op == "merge" for operation in operations):
+            raise ValueError("Incremental runs cannot merge files")
+        if partitioning:
+            raise ValueError("Incremental runs cannot split the output")
+        if fmt not in ("csv", "csv.gz", "csv.zst"):
+            raise ValueError("Incremental runs append to CSV output only")
+
+    if any(operation.op == "merge" for operation in operations):
+        # All inputs end up in one query, Polars parallelizes inside it
+        if streaming == "auto":
+            streaming_mode = main.use_streaming_merge(inputs)
+        else:
+            streaming_mode = streaming == "always"
+        engine = "streaming" if streaming_mode else "auto"
+        partitions = main.merge_partitions(inputs) if streaming_mode else 1
+        start = time.time()
+        output_path = output_path_for("merged", output, fmt=fmt) if os.path.isdir(output) else output
+
+        def run():
+            # A streamed merge outlasts cached copies that other runs may evict, so it reads the CSVs
+            scan = main.parse_csv if streaming_mode else main.scan_csv
+            frame = run_operations([scan(path) for path in inputs], operations, engine, partitions)[0]
+            return write_output(frame, output_path, columns, engine, fmt, partitioning)
+
+        # Operations keep the columns of their input, so the merge sees these schemas
+        _, changes = main.unify_schemas([main.frame_schema(main.scan_csv(path)) for path in inputs])
+        for line in main.describe_schema_changes([os.path.basename(path) for path in inputs], changes):
+            print(f"Schema: {line}")
+        output_path, row_count = main.with_relaxed_types(source_files(inputs, operations), run)
+        return [(", ".join(inputs), output_path, row_count, time.time() - start)]
+
+    if len(inputs) == 1 and not os.path.isdir(output):
+        output_paths = [output]
+    else:
+        os.makedirs(output, exist_ok=True)
+        output_paths = [output_path_for(path, output, fmt=fmt) for path in inputs]
+
+    operation_dicts = [operation.to_dict() for operation in operations]
+    jobs = min(jobs or os.cpu_count() or 1, len(inputs))
+    if jobs <= 1:
+        return [
+            process_file(path, operation_dicts, output_path, streaming, columns, use_cache, fmt, partitioning,
+                         incremental_run)
+            for path, output_path in zip(inputs, output_paths)
+        ]
+
+    # Independent files run in separate processes, spawned since Polars' thread pool does not survive a fork
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [
+            executor.submit(process_file, path, operation_dicts, output_path, streaming, columns, use_cache, fmt,
+                            partitioning, incremental_run)
+            for path, output_path in zip(inputs, output_paths)
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+            print(f"Finished {len(results)} of {len(futures)} files")
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="csv-processor",
+        description="Run CSV processing operations without the GUI. "
+                    "Operations take key=value arguments and run in the order given.",
+    )
+    parser.add_argument("inputs", nargs="+", help="Input CSV files or glob patterns")
+    parser.add_argument("-o", "--output", required=True,
+                        help="Output CSV file, or directory when there are several outputs")
+    parser.add_argument("--columns", help="Comma-separated columns to write (default: all)")
+    parser.add_argument("--streaming", choices=STREAMING_MODES, default="auto",
+                        help="Use the streaming engine: auto decides per file by size (default: auto)")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Files processed in parallel when not merging (default: CPU count)")
+    parser.add_argument("--format", choices=list(export.EXPORT_FORMATS), default=None,
+                        help="Output format (default: from the output file extension, csv for directories)")
+    split = parser.add_mutually_exclusive_group()
+    split.add_argument("--split-by", metavar="COLUMN",
+                       help="Write one file per value of COLUMN, in COLUMN=value folders named after the output")
+    split.add_argument("--split-rows", type=int, metavar="N",
+                       help="Write files of at most N rows, in a folder named after the output")
+    split.add_argument("--split-size", type=float, metavar="MB",
+                       help="Write files of about MB megabytes, in a folder named after the output")
+    parser.add_argument("--no-cache", action="store_true", help="Parse the CSV files even when the parsed-file cache has a copy")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only process rows appended since the last run of the same command and append the "
+                             "results to the CSV output, processing the whole file again if its start changed")
+    parser.add_argument("--save-recipe", metavar="PATH",
+                        help="Also save the operations as a JSON or YAML recipe (.yaml/.yml)")
+
+    operations = parser.add_argument_group("operations")
+    operation_flags = [
+        ("--word-match", "word_match", "columns=A,B values=X,Y|values_file=PATH [include=no] [case_insensitive=no] [regex=yes]"),
+        ("--dedup", "remove_duplicates", "columns=A,B"),
+        ("--find-replace", "find_replace", "column=A [old=X] new=Y (no old replaces empty values)"),
+        ("--email-validation", "email_validation", "column=A"),
+        ("--domain-similarity", "domain_similarity", "email=A website=B [threshold=0.75] [check_username=no] [workers=N]"),
+        ("--merge", "merge", "column=A, combine all inputs keeping one row per value"),
+        ("--subtract", "subtract", "file=PATH column=A[,B] [bloom=0.01], drop rows whose key appears in that file, "
+                                   "bloom pre-filters huge files at that false-positive rate"),
+        ("--recipe", "recipe", "PATH, run the operations saved in a recipe file at this point"),
+    ]
+    for flag, name, help_text in operation_flags:
+        operations.add_argument(flag, dest="operations", action=OperationAction, const=name,
+                                nargs="+", metavar="PATH" if name == "recipe" else "KEY=VALUE", help=help_text)
+    return parser
+
+
+def main_cli(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    inputs = expand_inputs(args.inputs)
+    if not inputs:
+        parser.error("no input files matched")
+
+    try:
+        operations = build_operations(args.operations or [])
+        if args.save_recipe:
+            Recipe(operations, source=", ".join(inputs)).save(args.save_recipe)
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+
+    columns = [column.strip() for column in args.columns.split(",")] if args.columns else None
+    if any(size is not None and size <= 0 for size in (args.split_rows, args.split_size)):
+        parser.error("split sizes must be positive")
+    partitioning = None
+    if args.split_by:
+        partitioning = {"by": "column", "column": args.split_by}
+    elif args.split_rows is not None:
+        partitioning = {"by": "rows", "max_rows": args.split_rows}
+    elif args.split_size is not None:
+        partitioning = {"by": "bytes", "max_bytes": int(args.split_size * 1024 ** 2)}
+
+    print(f"Processing {len(inputs)} file(s) with {len(operations)} operation(s)")
+    try:
+        results = run_batch(inputs, operations, args.output, args.streaming, columns, args.jobs, not args.no_cache,
+                            args.format, partitioning, args.incremental)
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+
+    for input_path, output_path, row_count, seconds in results:
+        print(f"✅ {input_path} -> {output_path} ({row_count} rows, {seconds:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main_cli())
@@ -1,5 +1,6 @@
+import os
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
-                            QComboBox, QPushButton, QSlider,
+                            QComboBox, QPushButton, QSlider, QSpinBox,
                             QCheckBox, QGridLayout, QGroupBox)
 from PyQt5.QtCore import Qt
 
@@ -71,6 +72,18 @@ class DomainSimilarityTab(QWidget):
         self.check_username.setChecked(True)
         similarity_layout.addWidget(self.check_username)
         
+        # Parallel scoring across processes
+        workers_layout = QHBoxLayout()
+        workers_label = QLabel("Worker processes:")
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, os.cpu_count() or 1)
+        self.workers_spin.setValue(os.cpu_count() or 1)
+        self.workers_spin.setToolTip("Number of processes used to score domain pairs (1 = no parallelism)")
+        workers_layout.addWidget(workers_label)
+        workers_layout.addWidget(self.workers_spin)
+        workers_layout.addStretch()
+        similarity_layout.addLayout(workers_layout)
+        
         similarity_group.setLayout(similarity_layout)
         main_layout.addWidget(similarity_group)
         
@@ -148,11 +161,13 @@ class DomainSimilarityTab(QWidget):
         
         # Get checkbox value
         check_username = self.check_username.isChecked()
+        workers = self.workers_spin.value()
         
         # Call the main function to apply the filter
         self.parent.apply_domain_similarity_filter(
             email_column, 
             domain_column, 
             threshold,
-            check_username
+            check_username,
+            workers
         )
\ No newline at end of file
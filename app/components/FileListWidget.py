@@ -42,7 +42,13 @@ class FileItem(QFrame):
         size_label.setObjectName("file_size")
         size_label.setStyleSheet("color: #666;")
         
+        # Load state, empty once the file is ready
+        self.status_label = QLabel("")
+        self.status_label.setObjectName("file_status")
+        self.status_label.setStyleSheet("color: #666;")
+        
         layout.addWidget(name_label, stretch=1)
+        layout.addWidget(self.status_label)
         layout.addWidget(size_label)
         
         # Remove button
@@ -67,6 +73,11 @@ class FileItem(QFrame):
         
         layout.addWidget(remove_button)
     
+    def set_status(self, text, error=False):
+        """Show the load state of the file next to its size"""
+        self.status_label.setText(text)
+        self.status_label.setStyleSheet("color: #d93025;" if error else "color: #666;")
+    
     def _format_size(self, size_bytes):
         """Format file size in human-readable format"""
         for unit in ['B', 'KB', 'MB', 'GB']:
@@ -115,9 +126,10 @@ class FileListWidget(QWidget):
         self.scroll_area.setWidget(self.files_container)
         layout.addWidget(self.scroll_area)
     
-    def add_file(self, file_path):
+    def add_file(self, file_path, status=""):
         """Add a new file to the list"""
         if file_path in self.files:
+            self.set_file_status(file_path, status)
             return
         
         # Remove empty state if this is the first file
@@ -129,26 +141,43 @@ class FileListWidget(QWidget):
         # Create file item widget
         file_item = FileItem(file_path)
         file_item.removed.connect(self._handle_file_removed)
+        file_item.set_status(status)
         
         self.files_layout.addWidget(file_item)
     
+    def _file_item(self, file_path):
+        for i in range(self.files_layout.count()):
+            widget = self.files_layout.itemAt(i).widget()
+            if isinstance(widget, FileItem) and widget.file_path == file_path:
+                return widget
+        return None
+    
+    def set_file_status(self, file_path, text, error=False):
+        """Update the load state shown for a file"""
+        file_item = self._file_item(file_path)
+        if file_item is not None:
+            file_item.set_status(text, error)
+    
+    def remove_file(self, file_path):
+        """Remove a file from the list without notifying listeners"""
+        if file_path not in self.files:
+            return False
+        self.files.remove(file_path)
+        
+        # Find and remove the widget
+        file_item = self._file_item(file_path)
+        if file_item is not None:
+            self.files_layout.removeWidget(file_item)
+            file_item.deleteLater()
+        
+        # Show empty state if no files left
+        if not self.files:
+            self.empty_label.setVisible(True)
+        return True
+    
     def _handle_file_removed(self, file_path):
         """Handle file removed by the user"""
-        if file_path in self.files:
-            self.files.remove(file_path)
-            
-            # Find and remove the widget
-            for i in range(self.files_layout.count()):
-                widget = self.files_layout.itemAt(i).widget()
-                if isinstance(widget, FileItem) and widget.file_path == file_path:
-                    widget.deleteLater()
-                    break
-            
-            # Show empty state if no files left
-            if not self.files:
-                self.empty_label.setVisible(True)
-            
-            # Emit signal
+        if self.remove_file(file_path):
             self.fileRemoved.emit(file_path)
     
     def clear(self):
@@ -48,6 +48,22 @@ class ResultsFrame(QFrame):
         self.undo_button.clicked.connect(self.undo_last_operation)
         self.undo_button.setEnabled(False)
         
+        self.redo_button = QPushButton("Redo")
+        self.redo_button.setObjectName("redo_button")
+        self.redo_button.clicked.connect(self.redo_last_operation)
+        self.redo_button.setEnabled(False)
+        
+        self.apply_recipe_button = QPushButton("Apply Recipe")
+        self.apply_recipe_button.setObjectName("apply_recipe_button")
+        self.apply_recipe_button.setToolTip("Replay operations saved in a recipe file on the loaded data")
+        self.apply_recipe_button.clicked.connect(self.apply_recipe)
+        
+        self.save_recipe_button = QPushButton("Save Recipe")
+        self.save_recipe_button.setObjectName("save_recipe_button")
+        self.save_recipe_button.setToolTip("Save the applied operations as a JSON or YAML recipe")
+        self.save_recipe_button.clicked.connect(self.save_recipe)
+        self.save_recipe_button.setEnabled(False)
+        
         self.download_button = QPushButton("Download Result")
         self.download_button.setObjectName("download_button")
         self.download_button.clicked.connect(self.download_result)
@@ -58,6 +74,9 @@ class ResultsFrame(QFrame):
         
         button_layout.addWidget(self.reset_button)
         button_layout.addWidget(self.undo_button)
+        button_layout.addWidget(self.redo_button)
+        button_layout.addWidget(self.apply_recipe_button)
+        button_layout.addWidget(self.save_recipe_button)
         button_layout.addStretch()
         button_layout.addWidget(self.status_label)
         button_layout.addWidget(self.download_button)
@@ -69,6 +88,7 @@ class ResultsFrame(QFrame):
         self.table_view.setAlternatingRowColors(True)
         self.table_view.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.table_view.setModel(self.table_model)
+        self.table_model.fetch_failed.connect(lambda error: self.update_status(f"Could not read rows: {error}"))
         self.table_view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
         self.table_view.horizontalHeader().setStretchLastSection(True)
         
@@ -81,15 +101,19 @@ class ResultsFrame(QFrame):
         status_layout.addStretch()
         result_layout.addLayout(status_layout)
     
-    def update_preview(self, df):
-        """Update the data preview with the current DataFrame"""
+    def update_preview(self, df, row_count=None, head=None):
+        """Show the current DataFrame, LazyFrame or result view in the virtual table
+        
+        Rows are fetched block by block as the table scrolls. For a LazyFrame,
+        row_count carries the result size and head the rows already collected.
+        """
         if df is not None:
-            preview_df = df.head(100)
-            self.table_model.setDataFrame(preview_df)
+            self.table_model.setDataFrame(df, row_count, head)
             self.table_view.resizeColumnsToContents()
             
             # Update row count
-            self.row_count_label.setText(f"Rows: {df.shape[0]} | Columns: {df.shape[1]}")
+            row_count = self.table_model.totalRowCount()
+            self.row_count_label.setText(f"Rows: {row_count} | Columns: {self.table_model.columnCount()}")
     
     def update_history(self, operations_history):
         """Update the operations history label"""
@@ -107,11 +131,14 @@ class ResultsFrame(QFrame):
         """Update the results title"""
         self.results_title.setText(title_text)
     
-    def enable_buttons(self, reset=True, download=True, undo=False):
+    def enable_buttons(self, reset=True, download=True, undo=False, redo=False):
         """Enable or disable action buttons"""
         self.reset_button.setEnabled(reset)
         self.download_button.setEnabled(download)
         self.undo_button.setEnabled(undo)
+        self.redo_button.setEnabled(redo)
+        # A recipe can be saved whenever there are operations to undo
+        self.save_recipe_button.setEnabled(undo)
     
     def reset_to_original(self):
         """Call parent's reset method"""
@@ -126,4 +153,19 @@ class ResultsFrame(QFrame):
     def undo_last_operation(self):
         """Call parent's undo method"""
         if hasattr(self.parent, 'undo_last_operation') and callable(self.parent.undo_last_operation):
-            self.parent.undo_last_operation()
\ No newline at end of file
+            self.parent.undo_last_operation()
+    
+    def redo_last_operation(self):
+        """Call parent's redo method"""
+        if hasattr(self.parent, 'redo_last_operation') and callable(self.parent.redo_last_operation):
+            self.parent.redo_last_operation()
+    
+    def save_recipe(self):
+        """Call parent's save recipe method"""
+        if hasattr(self.parent, 'save_recipe') and callable(self.parent.save_recipe):
+            self.parent.save_recipe()
+    
+    def apply_recipe(self):
+        """Call parent's apply recipe method"""
+        if hasattr(self.parent, 'apply_recipe') and callable(self.parent.apply_recipe):
+            self.parent.apply_recipe()
\ No newline at end of file
@@ -63,6 +63,11 @@ class WordMatchTab(QWidget):
         self.case_insensitive_checkbox.setChecked(True)  # Default to case insensitive
         search_layout.addWidget(self.case_insensitive_checkbox)
         
+        # Literal values use a single multi-pattern matcher, regex is opt-in
+        self.regex_checkbox = QCheckBox("Treat values as regular expressions")
+        self.regex_checkbox.setChecked(False)
+        search_layout.addWidget(self.regex_checkbox)
+        
         search_group.setLayout(search_layout)
         word_match_layout.addWidget(search_group)
         
@@ -118,6 +123,7 @@ class WordMatchTab(QWidget):
         # Get other settings
         include = self.include_radio.isChecked()
         case_insensitive = self.case_insensitive_checkbox.isChecked()
+        literal = not self.regex_checkbox.isChecked()
         
         # Call parent's method
         if hasattr(self.parent, 'apply_word_match_filter') and callable(self.parent.apply_word_match_filter):
@@ -125,5 +131,6 @@ class WordMatchTab(QWidget):
                 selected_column_names, 
                 search_text,
                 include,
-                case_insensitive
+                case_insensitive,
+                literal
             )
\ No newline at end of file
@@ -1,7 +1,16 @@
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, 
-                           QPushButton, QCheckBox, QScrollArea, QWidget, QFrame)
+                           QPushButton, QCheckBox, QScrollArea, QWidget, QFrame,
+                           QComboBox, QSpinBox)
 from PyQt5.QtCore import Qt
 
+# Split mode label -> partitioning "by" key, None writes a single file
+SPLIT_MODES = [
+    ("Single file", None),
+    ("One file per value of a column", "column"),
+    ("Files of at most N rows", "rows"),
+    ("Files of about N MB", "bytes"),
+]
+
 class ExportDialog(QDialog):
     def __init__(self, parent=None, columns=None):
         super().__init__(parent)
@@ -59,6 +68,30 @@ class ExportDialog(QDialog):
         check_layout.addWidget(deselect_all_btn)
         dialog_layout.addLayout(check_layout)
         
+        # Split the output over several files in a directory
+        split_layout = QHBoxLayout()
+        split_label = QLabel("Split output:")
+        self.split_combo = QComboBox()
+        for label, _ in SPLIT_MODES:
+            self.split_combo.addItem(label)
+        self.split_combo.setToolTip("Several files are written to a folder named after the file you save")
+        
+        self.split_column_combo = QComboBox()
+        self.split_column_combo.addItems(self.columns)
+        
+        self.split_size_spin = QSpinBox()
+        self.split_size_spin.setRange(1, 1000000000)
+        self.split_size_spin.setGroupSeparatorShown(True)
+        
+        split_layout.addWidget(split_label)
+        split_layout.addWidget(self.split_combo)
+        split_layout.addWidget(self.split_column_combo)
+        split_layout.addWidget(self.split_size_spin)
+        dialog_layout.addLayout(split_layout)
+        
+        self.split_combo.currentIndexChanged.connect(self.update_split_options)
+        self.update_split_options()
+        
         # Buttons
         button_box = QHBoxLayout()
         button_box.setSpacing(10)
@@ -76,6 +109,29 @@ class ExportDialog(QDialog):
         button_box.addWidget(export_btn)
         dialog_layout.addLayout(button_box)
     
+    def update_split_options(self):
+        """Show the column or size input of the chosen split mode"""
+        by = SPLIT_MODES[self.split_combo.currentIndex()][1]
+        self.split_column_combo.setVisible(by == "column")
+        self.split_size_spin.setVisible(by in ("rows", "bytes"))
+        if by == "rows":
+            self.split_size_spin.setSuffix(" rows")
+            self.split_size_spin.setValue(500000)
+        elif by == "bytes":
+            self.split_size_spin.setSuffix(" MB")
+            self.split_size_spin.setValue(100)
+    
+    def get_partitioning(self):
+        """Return the partitioning for export.export_partitioned, or None for a single file"""
+        by = SPLIT_MODES[self.split_combo.currentIndex()][1]
+        if by == "column":
+            return {"by": "column", "column": self.split_column_combo.currentText()}
+        elif by == "rows":
+            return {"by": "rows", "max_rows": self.split_size_spin.value()}
+        elif by == "bytes":
+            return {"by": "bytes", "max_bytes": self.split_size_spin.value() * 1024 ** 2}
+        return None
+    
     def get_selected_columns(self):
         """Return the list of selected column names"""
         return [cb.text() for cb in self.column_checkboxes if cb.isChecked()]
\ No newline at end of file
@@ -0,0 +1,499 @@
+"""Streaming export of results to CSV, compressed CSV, Parquet, Arrow IPC and XLSX.
+
+Every writer runs from a lazy plan or a DataFrame without building another
+copy of the result in memory: CSV, Parquet and Arrow IPC are sunk by the
+streaming engine, compressed CSV is sunk as plain CSV to the working set and
+compressed from there, and XLSX is written in row batches read back from
+such a CSV.
+
+A partitioned export writes a directory of files in the same single pass,
+one per value of a column in hive-style column=value directories, or one
+per block of rows.
+"""
+import gzip
+import io
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+import polars as pl
+
+import app.main as main
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, zstd CSV is only offered when it is installed
+    zstandard = None
+
+try:
+    import xlsxwriter
+except ImportError:  # XlsxWriter ships with the app, but headless installs may lack it
+    xlsxwriter = None
+
+# Format key -> (label, file extension)
+EXPORT_FORMATS = {
+    "csv": ("CSV", ".csv"),
+    "csv.gz": ("CSV, gzip compressed", ".csv.gz"),
+    "csv.zst": ("CSV, zstd compressed", ".csv.zst"),
+    "parquet": ("Parquet", ".parquet"),
+    "arrow": ("Arrow IPC", ".arrow"),
+    "xlsx": ("Excel workbook", ".xlsx"),
+}
+# Data rows per worksheet, Excel's limit of 1,048,576 rows less the header
+XLSX_MAX_ROWS = 1048575
+# Rows written per batch by the batched writers
+EXPORT_BATCH_ROWS = 100000
+# Seconds between file size checks while a sink runs
+PROGRESS_INTERVAL = 0.5
+# Bytes compressed at a time when writing compressed CSV
+COPY_CHUNK_SIZE = 4 * 1024 * 1024
+# Directory name Hive readers take as a null partition value
+HIVE_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def available_formats():
+    """Format keys whose writer can run in this install"""
+    formats = list(EXPORT_FORMATS)
+    if zstandard is None:
+        formats.remove("csv.zst")
+    if xlsxwriter is None:
+        formats.remove("xlsx")
+    return formats
+
+
+def file_filter(fmt):
+    """File dialog filter for one format, e.g. "Parquet (*.parquet)" """
+    label, extension = EXPORT_FORMATS[fmt]
+    return f"{label} (*{extension})"
+
+
+def format_for_filter(name_filter):
+    """Format key of a file dialog filter built by file_filter, or None"""
+    for fmt in EXPORT_FORMATS:
+        if file_filter(fmt) == name_filter:
+            return fmt
+    return None
+
+
+def format_for_path(path):
+    """Format key from a file extension, CSV for anything unknown"""
+    name = path.lower()
+    # Longest extensions first so .csv.gz is not taken for .gz or .csv
+    for fmt, (_, extension) in sorted(EXPORT_FORMATS.items(), key=lambda item: -len(item[1][1])):
+        if name.endswith(extension):
+            return fmt
+    return "csv"
+
+
+def with_extension(path, fmt):
+    """path with the extension of fmt, unless it already has it"""
+    extension = EXPORT_FORMATS[fmt][1]
+    if path.lower().endswith(extension):
+        return path
+    return os.path.splitext(path)[0] + extension
+
+
+def format_size(size_bytes):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.1f} TB"
+
+
+def estimate_export_bytes(frame, row_count, fmt, sample_rows=1000):
+    """Rough size of the exported file, from writing a sample of rows in the format"""
+    sample = main.frame_head(frame, sample_rows)
+    if sample.shape[0] == 0:
+        return 0
+    buffer = io.BytesIO()
+    if fmt == "parquet":
+        sample.write_parquet(buffer)
+    elif fmt == "arrow":
+        sample.write_ipc(buffer, compression="lz4")
+    else:
+        sample.write_csv(buffer)
+        if fmt == "csv.gz":
+            buffer = io.BytesIO(gzip.compress(buffer.getvalue()))
+        elif fmt == "csv.zst" and zstandard is not None:
+            buffer = io.BytesIO(zstandard.ZstdCompressor().compress(buffer.getvalue()))
+    return int(len(buffer.getvalue()) / sample.shape[0] * row_count)
+
+
+def export_frame(frame, path, fmt=None, columns=None, engine="streaming", row_count=None,
+                 progress_callback=None, cancel_token=None):
+    """Write a DataFrame or LazyFrame to path, returning the number of rows written
+
+    fmt defaults to the format of the path's extension. With row_count the
+    progress is reported as a share of the estimated output size, otherwise
+    only the bytes written are shown. A cancelled export removes the
+    partial file and raises JobCancelled.
+    """
+    fmt = fmt or format_for_path(path)
+    if fmt not in available_formats():
+        raise ValueError(f"{EXPORT_FORMATS[fmt][0]} export needs an optional package that is not installed")
+    if columns:
+        frame = frame.select(columns)
+
+    expected_bytes = None
+    if row_count is not None and fmt != "xlsx":
+        expected_bytes = estimate_export_bytes(frame, row_count, fmt)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    try:
+        if fmt in ("csv", "parquet", "arrow"):
+            return _sink(frame.lazy(), path, fmt, engine, expected_bytes, progress_callback, cancel_token)
+        elif fmt == "xlsx":
+            return _write_xlsx(frame, path, row_count, progress_callback, cancel_token)
+        return _write_compressed_csv(frame, path, fmt, expected_bytes, progress_callback, cancel_token)
+    except BaseException:
+        # Never leave a partial export behind
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+def _report_bytes(progress_callback, written, expected_bytes):
+    if not progress_callback:
+        return
+    message = f"Written {format_size(written)}"
+    if expected_bytes:
+        progress_callback(min(95, int(written / expected_bytes * 100)), f"{message} of about {format_size(expected_bytes)}")
+    else:
+        progress_callback(50, message)
+
+
+def _sink(lf, path, fmt, engine, expected_bytes, progress_callback, cancel_token):
+    """Run a sink on a helper thread and report the growing file size"""
+    def written():
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    rows = _run_sink(lf, path, fmt, engine, written, expected_bytes, progress_callback)
+    # A sink cannot stop halfway, the caller drops the file if it was cancelled meanwhile
+    main.check_cancelled(cancel_token)
+    return rows
+
+
+def _run_sink(lf, target, fmt, engine, written, expected_bytes, progress_callback, mkdir=False):
+    """Sink lf to a path or partitioning scheme, polling written() for progress, returning the rows written"""
+    counter = _RowCounter()
+    lf = counter.wrap(lf)
+
+    def run_sink():
+        if fmt == "csv":
+            lf.sink_csv(target, engine=engine, mkdir=mkdir)
+        elif fmt == "parquet":
+            lf.sink_parquet(target, engine=engine, mkdir=mkdir)
+        else:
+            # The pinned Polars cannot sink uncompressed IPC
+            lf.sink_ipc(target, compression="lz4", engine=engine, mkdir=mkdir)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(run_sink)
+        while not wait([future], timeout=PROGRESS_INTERVAL).done:
+            _report_bytes(progress_callback, written(), expected_bytes)
+        future.result()
+    return counter.rows
+
+
+class _RowCounter:
+    """Counts the rows of a plan as a sink writes them, instead of reading the output back"""
+    def __init__(self):
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def wrap(self, lf):
+        # The streaming engine may hand batches over from several threads
+        return lf.map_batches(self._count, schema=lf.collect_schema(), streamable=True)
+
+    def _count(self, df):
+        with self._lock:
+            self.rows += df.height
+        return df
+
+
+def _write_compressed_csv(frame, path, fmt, expected_bytes, progress_callback, cancel_token):
+    """Sink plain CSV to the working set, then compress it into path chunk by chunk"""
+    temp_path = main.WORKING_SET.new_path(".csv")
+    try:
+        rows = _sink(frame.lazy(), temp_path, "csv", "streaming", None, None, cancel_token)
+        _compress_file(temp_path, path, fmt, progress_callback, cancel_token)
+    finally:
+        main.WORKING_SET.release(temp_path)
+    return rows
+
+
+def _compress_file(source_path, path, fmt, progress_callback=None, cancel_token=None, mode="wb"):
+    """Compress a file into path, with mode "ab" as a new gzip member or zstd frame after its content"""
+    total = os.path.getsize(source_path)
+    with open(source_path, "rb") as source, open(path, mode) as raw:
+        if fmt == "csv.gz":
+            stream = gzip.GzipFile(fileobj=raw, mode="wb")
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(raw)
+        with stream:
+            while True:
+                main.check_cancelled(cancel_token)
+                chunk = source.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                stream.write(chunk)
+                if progress_callback:
+                    progress_callback(min(95, int(source.tell() / max(total, 1) * 100)),
+                                      f"Written {format_size(raw.tell())}")
+
+
+def append_csv(frame, path, fmt=None, columns=None, engine="streaming"):
+    """Append the rows of a DataFrame or LazyFrame, without a header, to a CSV export at path
+
+    Compressed CSV gets a new gzip member or zstd frame, which readers
+    decompress as one stream with the ones already there. Returns the
+    number of rows appended.
+    """
+    fmt = fmt or format_for_path(path)
+    if fmt not in ("csv", "csv.gz", "csv.zst"):
+        raise ValueError(f"Cannot append rows to {EXPORT_FORMATS[fmt][0]} files")
+    if fmt not in available_formats():
+        raise ValueError(f"{EXPORT_FORMATS[fmt][0]} export needs an optional package that is not installed")
+    if columns:
+        frame = frame.select(columns)
+
+    temp_path = main.WORKING_SET.new_path(".csv")
+    try:
+        counter = _RowCounter()
+        counter.wrap(frame.lazy()).sink_csv(temp_path, include_header=False, engine=engine)
+        rows = counter.rows
+        if rows == 0:
+            return 0
+        if fmt == "csv":
+            with open(temp_path, "rb") as source, open(path, "ab") as target:
+                shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+        else:
+            _compress_file(temp_path, path, fmt, mode="ab")
+    finally:
+        main.WORKING_SET.release(temp_path)
+    return rows
+
+
+def _batches(frame, batch_rows=EXPORT_BATCH_ROWS):
+    """Yield a frame as DataFrame batches in order
+
+    A LazyFrame is sunk to a CSV file in the working set first and read
+    back in batches, so neither the plan is rerun per batch nor the whole
+    result held in memory.
+    """
+    if isinstance(frame, pl.DataFrame):
+        for offset in range(0, frame.shape[0], batch_rows):
+            yield frame.slice(offset, batch_rows)
+        return
+
+    temp_path = main.WORKING_SET.new_path(".csv")
+    try:
+        frame.sink_csv(temp_path, engine="streaming")
+        yield from _csv_batches(temp_path, main.frame_schema(frame), batch_rows)
+    finally:
+        main.WORKING_SET.release(temp_path)
+
+
+def _csv_batches(path, schema, batch_rows=EXPORT_BATCH_ROWS):
+    """Yield a CSV file written by a sink as DataFrame batches with its original schema"""
+    # CSV has no all-null type, such columns read back as empty strings
+    schema = {name: pl.String if dtype == pl.Null else dtype for name, dtype in schema.items()}
+    reader = pl.read_csv_batched(path, schema_overrides=schema, batch_size=batch_rows)
+    while True:
+        batches = reader.next_batches(1)
+        if not batches:
+            break
+        yield batches[0]
+
+
+def _xlsx_frame(frame):
+    """Dates and other types without a plain cell form are written as text"""
+    return frame.with_columns(
+        pl.col(name).cast(pl.String)
+        for name, dtype in main.frame_schema(frame).items()
+        if not (dtype.is_numeric() or dtype == pl.Boolean or dtype == pl.String)
+    )
+
+
+def _write_xlsx(frame, path, row_count, progress_callback, cancel_token):
+    frame = _xlsx_frame(frame)
+    return _write_xlsx_batches(_batches(frame), main.frame_columns(frame), path, row_count,
+                               progress_callback, cancel_token)
+
+
+def _write_xlsx_batches(batches, columns, path, row_count=None, progress_callback=None, cancel_token=None):
+    """Write worksheets of at most XLSX_MAX_ROWS rows, flushing each row to disk"""
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    try:
+        worksheet = None
+        sheet_row = XLSX_MAX_ROWS
+        rows = 0
+        for batch in batches:
+            main.check_cancelled(cancel_token)
+            for values in batch.iter_rows():
+                if sheet_row >= XLSX_MAX_ROWS:
+                    worksheet = workbook.add_worksheet(f"Sheet{len(workbook.worksheets()) + 1}")
+                    worksheet.write_row(0, 0, columns)
+                    sheet_row = 0
+                sheet_row += 1
+                worksheet.write_row(sheet_row, 0, values)
+            rows += batch.shape[0]
+            if progress_callback:
+                total = f" of {row_count}" if row_count else ""
+                percent = min(95, int(rows / row_count * 100)) if row_count else 50
+                progress_callback(percent, f"Written {rows}{total} rows")
+        if worksheet is None:
+            workbook.add_worksheet("Sheet1").write_row(0, 0, columns)
+    finally:
+        workbook.close()
+    return rows
+
+
+def export_partitioned(frame, path, partitioning, fmt=None, columns=None, engine="streaming", row_count=None,
+                       progress_callback=None, cancel_token=None):
+    """Split a DataFrame or LazyFrame over several files in one pass, returning (paths, rows written)
+
+    The files go in a directory named after path without its extension.
+    partitioning is one of
+        {"by": "column", "column": name}  one file per value, hive style (column=value/part-0.csv)
+        {"by": "rows", "max_rows": n}     part-0.csv, part-1.csv, ... of at most n rows each
+        {"by": "bytes", "max_bytes": n}   the same, with the rows per file estimated from a sample
+    A partition column left out of columns is still used to split, but not written.
+    """
+    fmt = fmt or format_for_path(path)
+    if fmt not in available_formats():
+        raise ValueError(f"{EXPORT_FORMATS[fmt][0]} export needs an optional package that is not installed")
+    directory = partition_directory(path, fmt)
+    if os.path.exists(directory) and os.listdir(directory):
+        raise ValueError(f"Output directory is not empty: {directory}")
+
+    by = partitioning["by"]
+    include_key = True
+    if columns:
+        selection = list(columns)
+        if by == "column" and partitioning["column"] not in selection:
+            selection.append(partitioning["column"])
+            include_key = False
+        frame = frame.select(selection)
+    if fmt == "xlsx":
+        frame = _xlsx_frame(frame)
+
+    # Compressed CSV and XLSX are written from plain CSV parts in the working set
+    sink_fmt = fmt if fmt in ("csv", "parquet", "arrow") else "csv"
+    sink_directory = directory if sink_fmt == fmt else main.WORKING_SET.new_path("")
+    extension = EXPORT_FORMATS[sink_fmt][1]
+    if by == "column":
+        target = pl.PartitionByKey(os.path.join(sink_directory, "{key[0].name}={key[0].value}", "part-{part}" + extension),
+                                   by=partitioning["column"], include_key=include_key)
+    else:
+        max_rows = partitioning.get("max_rows")
+        if by == "bytes":
+            max_rows = _rows_per_bytes(frame, partitioning["max_bytes"], fmt)
+        target = pl.PartitionMaxSize(os.path.join(sink_directory, "part-{part}" + extension), max_size=max(1, max_rows))
+
+    expected_bytes = None
+    if row_count is not None and sink_fmt == fmt:
+        expected_bytes = estimate_export_bytes(frame, row_count, fmt)
+
+    try:
+        rows = _run_sink(frame.lazy(), target, sink_fmt, engine, lambda: _directory_size(sink_directory),
+                         expected_bytes, progress_callback, mkdir=True)
+        main.check_cancelled(cancel_token)
+        if by == "column":
+            _rename_hive_directories(sink_directory)
+        parts = _partition_files(sink_directory)
+        if sink_fmt != fmt:
+            # The parts hold the columns that were written, without a dropped partition column
+            schema = {name: dtype for name, dtype in main.frame_schema(frame).items()
+                      if include_key or name != partitioning["column"]}
+            parts = _convert_parts(parts, sink_directory, directory, fmt, schema, progress_callback, cancel_token)
+    except BaseException:
+        # Never leave a partial export behind
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    finally:
+        if sink_directory != directory:
+            shutil.rmtree(sink_directory, ignore_errors=True)
+    return parts, rows
+
+
+def partition_directory(path, fmt=None):
+    """Directory a partitioned export to path writes its files to"""
+    extension = EXPORT_FORMATS[fmt or format_for_path(path)][1]
+    if path.lower().endswith(extension):
+        return path[:-len(extension)]
+    return os.path.splitext(path)[0]
+
+
+def _rows_per_bytes(frame, max_bytes, fmt):
+    per_row = estimate_export_bytes(frame, 1000, fmt) / 1000
+    if per_row <= 0:
+        return max_bytes
+    return max(1, int(max_bytes / per_row))
+
+
+def _directory_size(directory):
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # Part file renamed or not flushed yet
+    return total
+
+
+def _rename_hive_directories(directory):
+    """Rename Polars' column="value" partition directories to the usual column=value
+
+    Polars quotes string values and writes null as plain null; Hive readers,
+    Polars' own included, expect bare values and __HIVE_DEFAULT_PARTITION__.
+    """
+    # Real nulls first, so a "null" string does not take their directory name
+    for name in sorted(os.listdir(directory), key=lambda name: not name.endswith("=null")):
+        column, separator, value = name.partition("=")
+        if not separator:
+            continue
+        if len(value) >= 2 and value.startswith('"') and value.endswith('"'):
+            value = value[1:-1]
+        elif value == "null":
+            value = HIVE_NULL_PARTITION
+        else:
+            continue
+        os.rename(os.path.join(directory, name), os.path.join(directory, f"{column}={value}"))
+
+
+def _partition_files(directory):
+    return sorted(os.path.join(root, name) for root, _, files in os.walk(directory) for name in files)
+
+
+def _convert_parts(parts, source_directory, directory, fmt, schema, progress_callback, cancel_token):
+    """Write each plain CSV part as fmt under directory, several at a time"""
+    def convert(source_path):
+        relative = os.path.relpath(source_path, source_directory)
+        path = with_extension(os.path.join(directory, relative), fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if fmt == "xlsx":
+            _write_xlsx_batches(_csv_batches(source_path, schema), list(schema), path, cancel_token=cancel_token)
+        else:
+            _compress_file(source_path, path, fmt, cancel_token=cancel_token)
+        return path
+
+    paths = []
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        futures = [executor.submit(convert, part) for part in parts]
+        try:
+            for future in as_completed(futures):
+                paths.append(future.result())
+                if progress_callback:
+                    progress_callback(min(95, int(len(paths) / len(parts) * 100)),
+                                      f"Written {len(paths)} of {len(parts)} files")
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return sorted(paths)
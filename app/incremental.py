@@ -0,0 +1,207 @@
+"""Incremental processing of CSV files that only grow by appended rows.
+
+A feed that appends rows to the same CSV every hour would otherwise be
+processed in full on every run. An incremental run records how far into the
+file it got: the byte offset after the last complete line, the source rows
+before it, a hash of the file's head and of the bytes just before the
+offset, and the keys each duplicate removal step has let through. The next
+run parses only the bytes after the offset, runs them through the same
+operations, with duplicate removal also dropping the recorded keys, and
+appends the result to the output.
+
+The file is processed in full again whenever the record cannot describe
+it: the hashed bytes changed or the file shrank, the operations, output or
+a subtracted file changed, or the output is not the size the last run left.
+"""
+import codecs
+import hashlib
+import json
+import os
+
+import polars as pl
+
+import app.main as main
+from app.ParsedFileCache import default_cache_dir
+
+DEFAULT_STATE_DIR = default_cache_dir("incremental")
+# Bytes at the start of the file and just before the offset that must not change between runs
+HEAD_HASH_BYTES = 1024 ** 2
+SEAM_HASH_BYTES = 64 * 1024
+# Bytes read at a time when looking for the last line break or copying a range
+READ_CHUNK_SIZE = 4 * 1024 ** 2
+# Encodings where a line break is the byte 0x0A, so a byte offset is a line boundary
+BYTE_LINE_ENCODINGS = ("utf-8", "utf-8-sig", "cp1252", "latin-1")
+
+
+def state_key(file_name, output_path, operations, columns=None, fmt="csv"):
+    """Key of the state of one input, output and operation list
+
+    Subtracted files are keyed on their version, so replacing a suppression
+    file starts over instead of leaving rows it now matches in the output.
+    """
+    files = [
+        main.file_version(operation.params["file_name"])
+        for operation in operations if operation.op == "subtract"
+    ]
+    raw = json.dumps(
+        [os.path.abspath(file_name), os.path.abspath(output_path), [operation.to_dict() for operation in operations],
+         columns, fmt, files, pl.__version__],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def state_path(key, state_dir=DEFAULT_STATE_DIR):
+    return os.path.join(state_dir, key + ".json")
+
+
+def key_path(key, step, state_dir=DEFAULT_STATE_DIR):
+    """Path of the keys let through by the duplicate removal at index step of the operations"""
+    return os.path.join(state_dir, f"{key}-{step}.arrow")
+
+
+def load_state(key, state_dir=DEFAULT_STATE_DIR):
+    """State saved by the last run, or None"""
+    try:
+        with open(state_path(key, state_dir), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(key, state, keys, state_dir=DEFAULT_STATE_DIR):
+    """Write the state of a finished run and the keys of its duplicate removal steps
+
+    keys maps step indexes to LazyFrames of every key let through so far.
+    The state file is written last, under a temporary name, so an
+    interrupted save is never read as a finished run.
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    for step, frame in keys.items():
+        path = key_path(key, step, state_dir)
+        temp_path = path + ".tmp"
+        frame.sink_ipc(temp_path, compression="lz4", engine="streaming")
+        os.replace(temp_path, path)
+    state = dict(state, dedup_steps=sorted(keys))
+    temp_path = state_path(key, state_dir) + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_path, state_path(key, state_dir))
+
+
+def clear_state(key, state_dir=DEFAULT_STATE_DIR):
+    if not os.path.isdir(state_dir):
+        return
+    for name in os.listdir(state_dir):
+        if name.startswith(key):
+            try:
+                os.remove(os.path.join(state_dir, name))
+            except OSError:
+                pass
+
+
+def complete_end(file_name):
+    """Byte offset after the last line break, rows past it may still be being written"""
+    with open(file_name, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - READ_CHUNK_SIZE)
+            f.seek(start)
+            chunk = f.read(end - start)
+            index = chunk.rfind(b"\n")
+            if index >= 0:
+                return start + index + 1
+            end = start
+    return 0
+
+
+def head_hash(file_name, offset):
+    """Hash of the first bytes of a file and the bytes just before offset"""
+    digest = hashlib.sha1()
+    with open(file_name, "rb") as f:
+        digest.update(f.read(min(offset, HEAD_HASH_BYTES)))
+        seam = max(0, offset - SEAM_HASH_BYTES)
+        f.seek(seam)
+        digest.update(f.read(offset - seam))
+    return digest.hexdigest()
+
+
+def resume_problem(state, file_name, output_path, spec):
+    """Why a run cannot continue from state, or None when it can"""
+    if state is None:
+        return "no earlier run"
+    if spec.encoding not in BYTE_LINE_ENCODINGS:
+        return f"{spec.encoding} files cannot be read from an offset"
+    offset = state["byte_offset"]
+    if os.path.getsize(file_name) < offset:
+        return "the file is shorter than at the last run"
+    if head_hash(file_name, offset) != state["head_hash"]:
+        return "the file changed before the end of the last run"
+    if not os.path.exists(output_path) or os.path.getsize(output_path) != state["output_size"]:
+        return "the output changed since the last run"
+    return None
+
+
+def scan_range(file_name, spec, start, end):
+    """Rows of a CSV file between two line boundaries, returning (LazyFrame, working set paths)
+
+    The whole file is scanned lazily with spec, without the parsed-file
+    cache, which would only cost a copy for a file read once per change.
+    Callers collect it under main.with_relaxed_types. A range is copied to
+    the working set as UTF-8 after the header row and parsed there, with
+    the sniffed types if its rows fit them. The caller releases the
+    returned paths once it is done with the frame.
+    """
+    if start == 0 and end == os.path.getsize(file_name):
+        return main.parse_csv(file_name, spec), []
+
+    copy_path = main.WORKING_SET.new_path(".csv")
+    paths = [copy_path]
+    try:
+        decoder = codecs.getincrementaldecoder(spec.encoding)()
+        with open(file_name, "rb") as source, open(copy_path, "w", encoding="utf-8", newline="") as target:
+            if start > 0 and spec.has_header:
+                target.write(decoder.decode(source.readline()))
+            source.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = source.read(min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                target.write(decoder.decode(chunk))
+                remaining -= len(chunk)
+        try:
+            path = main.WORKING_SET.sink(spec.scan(copy_path))
+        except pl.exceptions.ComputeError:
+            if not spec.has_sniffed_types:
+                raise
+            path = main.WORKING_SET.sink(spec.relaxed().scan(copy_path))
+        paths.append(path)
+        return pl.scan_ipc(path), paths
+    except BaseException:
+        for path in paths:
+            main.WORKING_SET.release(path)
+        raise
+
+
+def drop_seen_duplicates(frame, selected_column_names, seen_path=None):
+    """Duplicate removal over new rows that also drops keys an earlier run let through
+
+    Keys are kept and compared as strings, like BloomFilter.key_struct, so
+    a column typed differently by a later run's sniff still matches. Unlike
+    a subtract, null keys match, as they do in drop_duplicates.
+    """
+    lf = frame.lazy()
+    if seen_path is not None:
+        lf = lf.join(pl.scan_ipc(seen_path), left_on=[pl.col(column).cast(pl.String) for column in selected_column_names],
+                     right_on=selected_column_names, how="anti", nulls_equal=True, maintain_order="left")
+    return main.drop_duplicates(lf, selected_column_names)
+
+
+def merge_keys(frame, selected_column_names, seen_path=None):
+    """Keys let through so far as strings, the earlier runs' followed by those in frame"""
+    keys = frame.lazy().select([pl.col(column).cast(pl.String) for column in selected_column_names])
+    if seen_path is None:
+        return keys
+    return pl.concat([pl.scan_ipc(seen_path), keys], how="vertical")
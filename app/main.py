@@ -1,29 +1,421 @@
 import polars as pl
 import os
 import re
+import shutil
 from urllib.parse import urlparse
 import difflib
+import math
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+
+from app.BloomFilter import BloomFilter, key_struct
+from app.LRUCache import LRUCache
+from app.ParseSpec import sniff, transcode_to_utf8
+from app.ParsedFileCache import ParsedFileCache, default_cache_dir
+from app.WorkingSetStore import WorkingSetStore
+
+try:
+    import psutil
+except ImportError:  # psutil is optional, fall back to a fixed threshold
+    psutil = None
+
+# Files larger than this share of available memory are processed out of core
+STREAMING_MEMORY_FRACTION = 0.25
+DEFAULT_STREAMING_THRESHOLD = 2 * 1024 ** 3
+
+# Share of available memory files loaded side by side may take together, and
+# how much memory a parsed file takes relative to its size on disk
+LOAD_MEMORY_FRACTION = 0.5
+DEFAULT_LOAD_MEMORY_BUDGET = 4 * 1024 ** 3
+LOAD_MEMORY_FACTOR = 2
+
+# Disk space for the distinct keys of files subtracted from others (5 GB)
+DEFAULT_KEY_INDEX_SIZE = 5 * 1024 ** 3
+# Disk space for Bloom filters of suppression files (2 GB), and keys read per batch to build one
+DEFAULT_BLOOM_CACHE_SIZE = 2 * 1024 ** 3
+BLOOM_BUILD_BATCH_SIZE = 2000000
+
+# Lead lists repeat the same websites and domains, so parsing and scoring
+# results are memoized in bounded caches
+URL_DOMAIN_CACHE = LRUCache(maxsize=200000)
+BASE_DOMAIN_CACHE = LRUCache(maxsize=200000)
+DOMAIN_PAIR_CACHE = LRUCache(maxsize=500000)
+
+# Parsed copies of opened CSV files, reused until the file changes
+PARSED_FILE_CACHE = ParsedFileCache()
+
+# Distinct key values of suppression files, so a daily subtract reads them
+# instead of rebuilding them from the CSV
+KEY_INDEX_CACHE = ParsedFileCache(default_cache_dir("keys"), DEFAULT_KEY_INDEX_SIZE)
+
+# Bloom filters of suppression files too large to hold as a key set
+BLOOM_FILTER_CACHE = ParsedFileCache(default_cache_dir("bloom"), DEFAULT_BLOOM_CACHE_SIZE)
+
+# Temporary Arrow IPC files holding undo checkpoints and results outside the heap
+WORKING_SET = WorkingSetStore()
+
+# Sniffed parse specs and UTF-8 copies of files in other encodings, per file version
+PARSE_SPECS = LRUCache(maxsize=1000)
+UTF8_COPIES = {}
+_UTF8_COPY_LOCK = threading.Lock()
+
+def file_version(file_name):
+    stat = os.stat(file_name)
+    return os.path.abspath(file_name), stat.st_size, stat.st_mtime_ns
+
+def parse_spec(file_name):
+    """Dialect, encoding, header and column types of a CSV file, sniffed once per file version"""
+    version = file_version(file_name)
+    spec = PARSE_SPECS.get(version)
+    if spec is None:
+        spec = sniff(file_name)
+        PARSE_SPECS.put(version, spec)
+    return spec
+
+def relax_parse_spec(file_name):
+    """Drop the sniffed types of a file whose later rows do not fit them, returning the new spec
+    
+    The types are inferred from every row once here, so later lazy scans
+    of the file start without another inference pass.
+    """
+    print(f"Sniffed column types do not fit all of {file_name}, inferring them from the whole file")
+    spec = parse_spec(file_name).relaxed()
+    spec = spec.relaxed(dict(parse_csv(file_name, spec).collect_schema()))
+    PARSE_SPECS.put(file_version(file_name), spec)
+    return spec
+
+def with_relaxed_types(file_names, run):
+    """Return run(), calling it again with relaxed parse specs if sniffed types did not fit
+    
+    A lazy parse only fails once it is collected or sunk, so run() must
+    build its frames from scan_csv or parse_csv itself. On a ComputeError
+    every file in file_names that still has sniffed types is relaxed, see
+    relax_parse_spec, and run() is called once more.
+    """
+    try:
+        return run()
+    except pl.exceptions.ComputeError:
+        sniffed = [file_name for file_name in file_names if parse_spec(file_name).has_sniffed_types]
+        if not sniffed:
+            raise
+        for file_name in sniffed:
+            relax_parse_spec(file_name)
+        return run()
+
+def csv_source(file_name, spec):
+    """Path Polars can parse for file_name, a UTF-8 copy in the working set when it uses another encoding"""
+    if not spec.needs_transcoding:
+        return file_name
+    version = file_version(file_name)
+    with _UTF8_COPY_LOCK:
+        path = UTF8_COPIES.get(version)
+        if path is None or not os.path.exists(path):
+            path = WORKING_SET.new_path(".csv")
+            transcode_to_utf8(file_name, spec.encoding, path)
+            UTF8_COPIES[version] = path
+    return path
+
+def parse_csv(file_name, spec=None):
+    """Lazily parse the CSV file itself with its parse spec, bypassing the parsed-file cache"""
+    spec = spec or parse_spec(file_name)
+    return spec.scan(csv_source(file_name, spec))
+
+def cached_csv(file_name):
+    """Path of the Arrow IPC copy of a CSV file, parsing it into the cache on first use
+    
+    Only loads fill the cache, scans read a copy that is already there.
+    Returns None when caching is disabled or the copy cannot be written,
+    callers then read the CSV itself.
+    """
+    if not PARSED_FILE_CACHE.enabled:
+        return None
+    try:
+        path = parsed_copy(file_name)
+        if path is not None:
+            return path
+        if os.path.getsize(file_name) > PARSED_FILE_CACHE.max_bytes:
+            # The copy takes about as much space as the CSV, it would be deleted as soon as written
+            return None
+        spec = parse_spec(file_name)
+        try:
+            return _cache_csv(file_name, spec)
+        except pl.exceptions.ComputeError:
+            if not spec.has_sniffed_types:
+                raise
+            return _cache_csv(file_name, relax_parse_spec(file_name))
+    except Exception as e:
+        print(f"Could not cache {file_name}: {str(e)}")
+        return None
+
+def _cache_csv(file_name, spec):
+    return PARSED_FILE_CACHE.get_or_create(file_name, spec.to_dict(), streaming=use_streaming(file_name),
+                                           scan=lambda: parse_csv(file_name, spec))
+
+def parsed_copy(file_name):
+    """Path of an existing parsed copy of a whole CSV file, None without parsing anything on a miss"""
+    if not PARSED_FILE_CACHE.enabled:
+        return None
+    spec = parse_spec(file_name)
+    path = PARSED_FILE_CACHE.get(file_name, spec.to_dict())
+    if path is None and spec.has_sniffed_types:
+        # Cached with inferred types by an earlier session whose sniffed types did not fit
+        path = PARSED_FILE_CACHE.get(file_name, spec.relaxed().to_dict())
+    return path
+
+def cached_columns(file_name, columns, streaming=False):
+    """Paths of parsed copies of single columns of a CSV file, by column
+    
+    Missing columns are parsed together in one pass over the CSV that skips
+    every other column. Columns the cache cannot hold are left out, callers
+    read those from the CSV.
+    """
+    spec = parse_spec(file_name)
+    paths = {column: PARSED_FILE_CACHE.get(file_name, _column_options(spec, column)) for column in columns}
+    missing = [column for column, path in paths.items() if path is None]
+    if missing:
+        try:
+            paths.update(_cache_columns(file_name, missing, spec, streaming))
+        except pl.exceptions.ComputeError:
+            if not spec.has_sniffed_types:
+                raise
+            paths.update(_cache_columns(file_name, missing, relax_parse_spec(file_name), streaming))
+    return {column: path for column, path in paths.items() if path is not None}
+
+def _column_options(spec, column):
+    return {**spec.to_dict(), "column": column}
+
+def _cache_columns(file_name, columns, spec, streaming):
+    frame = parse_csv(file_name, spec).select(columns)
+    temp_path = None
+    if streaming:
+        # Parse once into the working set, then split the columns out of core
+        temp_path = WORKING_SET.sink(frame)
+        frame = pl.scan_ipc(temp_path)
+    else:
+        frame = frame.collect()
+    try:
+        return {
+            column: PARSED_FILE_CACHE.put(file_name, frame.select(column), _column_options(spec, column))
+            for column in columns
+        }
+    finally:
+        WORKING_SET.release(temp_path)
 
 def load_csv(file_name):
     if not os.path.exists(file_name):
         print("File not found!")
         return None
-    return pl.read_csv(file_name)
+    cache_path = cached_csv(file_name)
+    if cache_path is not None:
+        # Memory-mapped, the pages are only read as columns are used. Streamed
+        # entries are compressed and have to be decoded instead
+        return pl.read_ipc(cache_path, memory_map=not PARSED_FILE_CACHE.is_compressed(cache_path), rechunk=False)
+    try:
+        return parse_csv(file_name).collect()
+    except pl.exceptions.ComputeError:
+        if not parse_spec(file_name).has_sniffed_types:
+            raise
+        return parse_csv(file_name, relax_parse_spec(file_name)).collect()
+
+def scan_csv(file_name):
+    """Lazily scan a CSV file so operations can be planned before any data is read
+    
+    Reads the parsed copy an earlier load left in the cache, or else the
+    CSV itself. A scan never parses the file up front or fills the cache.
+    """
+    if not os.path.exists(file_name):
+        print("File not found!")
+        return None
+    cache_path = parsed_copy(file_name)
+    if cache_path is not None:
+        return pl.scan_ipc(cache_path, memory_map=True)
+    return parse_csv(file_name)
+
+def streaming_threshold():
+    """File size in bytes above which a file is processed with the streaming engine"""
+    if psutil is not None:
+        return int(psutil.virtual_memory().available * STREAMING_MEMORY_FRACTION)
+    return DEFAULT_STREAMING_THRESHOLD
+
+def use_streaming(file_name, threshold=None):
+    """Whether a file is too large to be loaded into memory"""
+    if threshold is None:
+        threshold = streaming_threshold()
+    return os.path.getsize(file_name) > threshold
 
-def word_match(file_name, selected_column_names, search_values, include=True, case_insensitive=True):
+def load_or_scan_csv(file_name):
+    """Read a CSV eagerly, or scan it lazily when it is above the streaming threshold"""
+    if not os.path.exists(file_name):
+        print("File not found!")
+        return None
+    if use_streaming(file_name):
+        print(f"Streaming {file_name} ({os.path.getsize(file_name)} bytes)")
+        return scan_csv(file_name)
+    return load_csv(file_name)
+
+def read_csv_schema(file_name):
+    """Column names and types of a CSV file, reading only the rows needed to infer them"""
+    if not os.path.exists(file_name):
+        raise FileNotFoundError(f"File not found: {file_name}")
+    cache_path = parsed_copy(file_name)
+    if cache_path is not None:
+        # The parsed copy stores its schema in the file footer
+        return pl.scan_ipc(cache_path).collect_schema()
+    spec = parse_spec(file_name)
+    if spec.schema is not None:
+        return pl.Schema(spec.schema)
+    return parse_csv(file_name, spec).collect_schema()
+
+def load_memory_budget():
+    """Bytes that files loaded in parallel may take together"""
+    if psutil is not None:
+        return int(psutil.virtual_memory().available * LOAD_MEMORY_FRACTION)
+    return DEFAULT_LOAD_MEMORY_BUDGET
+
+def estimate_load_memory(file_name):
+    """Rough peak memory of loading a file, streamed files are only scanned"""
+    if use_streaming(file_name):
+        return 0
+    return os.path.getsize(file_name) * LOAD_MEMORY_FACTOR
+
+def load_csv_files(file_paths, file_callback=None, workers=None, memory_budget=None, cancel_token=None,
+                   schema_only=False):
+    """Load several CSV files on a thread pool, returning (loaded, failed)
+    
+    loaded holds (file_path, frame) in the order files finished, failed holds
+    (file_path, error message). Polars parses outside the GIL, so threads load
+    files in parallel. A file only starts once its estimated memory fits in
+    memory_budget next to the files already loading, one file always runs so
+    a file larger than the budget still loads on its own.
+    
+    file_callback(file_path, state, value) is called from the calling thread
+    with state "loading", "loaded" (value is the frame) or "failed" (value is
+    the error message). A triggered cancel_token stops starting new files and
+    raises JobCancelled once the running ones are done.
+    
+    With schema_only, only the schema of each file is read and returned in
+    place of the frame, which takes no memory budget.
+    """
+    loader = read_csv_schema if schema_only else load_or_scan_csv
+    if memory_budget is None:
+        memory_budget = load_memory_budget()
+    workers = max(1, min(workers or os.cpu_count() or 1, len(file_paths)))
+    
+    def notify(file_path, state, value=None):
+        if file_callback:
+            file_callback(file_path, state, value)
+    
+    queue = list(file_paths)
+    running = {}
+    reserved = 0
+    loaded = []
+    failed = []
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while queue or running:
+            # Start files while there is a free thread and room in the budget
+            while queue and len(running) < workers and not (cancel_token is not None and cancel_token.cancelled):
+                file_path = queue[0]
+                try:
+                    estimate = 0 if schema_only else estimate_load_memory(file_path)
+                except OSError:
+                    estimate = 0
+                if running and reserved + estimate > memory_budget:
+                    break
+                queue.pop(0)
+                reserved += estimate
+                running[executor.submit(loader, file_path)] = (file_path, estimate)
+                notify(file_path, "loading")
+            
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path, estimate = running.pop(future)
+                reserved -= estimate
+                try:
+                    frame = future.result()
+                    if frame is None:
+                        raise FileNotFoundError("File not found")
+                except Exception as e:
+                    failed.append((file_path, str(e)))
+                    notify(file_path, "failed", str(e))
+                else:
+                    loaded.append((file_path, frame))
+                    notify(file_path, "loaded", frame)
+    
+    check_cancelled(cancel_token)
+    return loaded, failed
+
+def display_names(file_paths):
+    """Short names for files, with parent folders added where file names repeat"""
+    names = [os.path.basename(path) for path in file_paths]
+    depth = 1
+    while len(set(names)) < len(names) and depth < 10:
+        depth += 1
+        names = [
+            os.path.join(*os.path.normpath(path).split(os.sep)[-depth:]) if names.count(name) > 1 else name
+            for path, name in zip(file_paths, names)
+        ]
+    return names
+
+def frame_columns(frame):
+    """Column names of a DataFrame or LazyFrame"""
+    if isinstance(frame, pl.LazyFrame):
+        return frame.collect_schema().names()
+    return frame.columns
+
+def frame_row_count(frame):
+    """Row count of a DataFrame, or of a LazyFrame counted with the streaming engine"""
+    if isinstance(frame, pl.LazyFrame):
+        return frame.select(pl.len()).collect(engine="streaming").item()
+    return frame.shape[0]
+
+def frame_head(frame, n=100):
+    """First n rows as a DataFrame, only those rows are materialized for a LazyFrame"""
+    if isinstance(frame, pl.LazyFrame):
+        return frame.head(n).collect(engine="streaming")
+    return frame.head(n)
+
+def word_match_mask(selected_column_names, search_values, case_insensitive=True, literal=False):
+    """Build one match expression per column for all search values
+    
+    Literal values are compiled once into an Aho-Corasick automaton with
+    str.contains_any, lowercasing each column once when matching ignores case.
+    Otherwise the values are joined into a single regex, with the (?i) flag
+    instead of lowercasing so escapes like \\S keep their meaning.
+    """
+    if literal:
+        if case_insensitive:
+            search_values = [val.lower() for val in search_values]
+    else:
+        search_pattern = "|".join(f"(?:{val})" for val in search_values)
+        if case_insensitive:
+            search_pattern = f"(?i){search_pattern}"
+    
+    masks = []
+    for col in selected_column_names:
+        col_expr = pl.col(col).cast(str)
+        if literal:
+            if case_insensitive:
+                col_expr = col_expr.str.to_lowercase()
+            masks.append(col_expr.str.contains_any(search_values))
+        else:
+            masks.append(col_expr.str.contains(search_pattern))
+    
+    return pl.any_horizontal(masks)
+
+def filter_word_match(df, selected_column_names, search_values, include=True, case_insensitive=True, literal=False):
+    """Filter a DataFrame or LazyFrame on search values found in the selected columns"""
+    mask = word_match_mask(selected_column_names, search_values, case_insensitive, literal)
+    return df.filter(mask if include else ~mask)
+
+def word_match(file_name, selected_column_names, search_values, include=True, case_insensitive=True, literal=False):
     df = load_csv(file_name)
     if df is None:
         return None, 0, None
 
-    if case_insensitive:
-        masks = [pl.any_horizontal([pl.col(col).cast(str).str.to_lowercase().str.contains(val.lower()) for val in search_values]) for col in selected_column_names]
-        mask = pl.any_horizontal(masks)
-    else:
-        search_pattern = "|".join(search_values)
-        masks = [pl.col(col).cast(str).str.contains(search_pattern) for col in selected_column_names]
-        mask = pl.any_horizontal(masks)
-    
-    filtered_df = df.filter(mask if include else ~mask)
+    filtered_df = filter_word_match(df, selected_column_names, search_values, include, case_insensitive, literal)
     row_count = filtered_df.shape[0]
     print(f"Filtered rows count: {row_count}")
     return "filtered_output.csv", row_count, filtered_df
@@ -33,11 +425,15 @@ def remove_duplicates(file_name, selected_column_names):
     if df is None:
         return None, 0, None
 
-    cleaned_df = df.unique(subset=selected_column_names)
+    cleaned_df = drop_duplicates(df, selected_column_names)
     row_count = cleaned_df.shape[0]
     print(f"Cleaned rows count: {row_count}")
     return "cleaned_output.csv", row_count, cleaned_df
 
+def drop_duplicates(df, selected_column_names):
+    """Keep the first row for each key, preserving row order so results are reproducible"""
+    return df.unique(subset=selected_column_names, keep="first", maintain_order=True)
+
 def find_and_replace(df, column_name, old_value, new_value):
     if not old_value:  # If no old value is provided, replace null values
         df = df.with_columns(
@@ -45,8 +441,8 @@ def find_and_replace(df, column_name, old_value, new_value):
         )
     else:
         df = df.with_columns(
-            pl.when(pl.col(column_name).cast(str) == old_value)
-            .then(new_value)
+            pl.when(pl.col(column_name).cast(pl.Utf8) == old_value)
+            .then(pl.lit(new_value))
             .otherwise(pl.col(column_name))
             .alias(column_name)
         )
@@ -82,10 +478,17 @@ def extract_username_from_email(email):
 
 def extract_domain_from_url(url):
     """Extract domain from URL"""
+    if not url or not isinstance(url, str):
+        return None
+    
+    domain = URL_DOMAIN_CACHE.get(url, False)
+    if domain is False:
+        domain = _parse_domain_from_url(url)
+        URL_DOMAIN_CACHE.put(url, domain)
+    return domain
+
+def _parse_domain_from_url(url):
     try:
-        if not url or not isinstance(url, str):
-            return None
-            
         # Handle URLs without scheme
         if not re.match(r'^https?://', url):
             url = 'http://' + url
@@ -101,9 +504,13 @@ def extract_base_domain(domain):
     if not domain:
         return None
     
-    # Remove TLD (e.g., .com, .org)
-    base = domain.split('.')[0] if '.' in domain else domain
-    return base.lower()
+    base = BASE_DOMAIN_CACHE.get(domain)
+    if base is None:
+        # Remove TLD (e.g., .com, .org)
+        base = domain.split('.')[0] if '.' in domain else domain
+        base = base.lower()
+        BASE_DOMAIN_CACHE.put(domain, base)
+    return base
 
 def calculate_domain_similarity(email, website_domain, check_username=True):
     if not email or not website_domain:
@@ -115,7 +522,7 @@ def calculate_domain_similarity(email, website_domain, check_username=True):
     # Case 1: Direct domain match
     domain_similarity = 0.0
     if email_domain and website_domain:
-        domain_similarity = difflib.SequenceMatcher(None, email_domain, website_domain).ratio()
+        domain_similarity = domain_ratio(email_domain, website_domain)
     
     # If not checking username or already perfect match, return domain similarity
     if not check_username or domain_similarity == 1.0:
@@ -134,41 +541,242 @@ def calculate_domain_similarity(email, website_domain, check_username=True):
     # Return the higher of the two similarity scores
     return max(domain_similarity, username_contains_domain)
 
-def domain_similarity_filter(df, email_column, domain_column, threshold=0.75, check_username=True, progress_callback=None):
-    # We'll use a list comprehension to create a boolean mask
-    mask = []
+def email_domain_expr(column):
+    """Expression form of extract_domain_from_email"""
+    email = pl.col(column)
+    return pl.when(email.str.contains("@", literal=True)).then(
+        email.str.split_exact("@", 1).struct.field("field_1").str.to_lowercase()
+    )
+
+def email_username_expr(column):
+    """Expression form of extract_username_from_email"""
+    email = pl.col(column)
+    return pl.when(email.str.contains("@", literal=True)).then(
+        email.str.split_exact("@", 1).struct.field("field_0").str.to_lowercase()
+    )
+
+def url_domain_expr(column):
+    """Expression form of extract_domain_from_url
     
-    # Convert to Python list for easier processing
-    emails = df[email_column].to_list()
-    domains = df[domain_column].to_list()
-    total_rows = len(emails)
+    Mirrors urlparse for http(s) URLs: tabs and newlines are dropped and the
+    host is everything after '//' up to the first '/', '?' or '#'.
+    """
+    url = pl.col(column)
+    with_scheme = (
+        pl.when(url.str.contains(r"^https?://"))
+        .then(url)
+        .otherwise(pl.lit("http://") + url)
+        .str.replace_all(r"[\t\r\n]", "")
+    )
+    netloc = with_scheme.str.extract(r"^https?://([^/?#]*)", 1)
+    return pl.when(url != "").then(netloc.str.replace(r"^www\.", "").str.to_lowercase())
+
+def domain_ratio(email_domain, website_domain):
+    """SequenceMatcher ratio between an email domain and a website domain"""
+    pair = (email_domain, website_domain)
+    ratio = DOMAIN_PAIR_CACHE.get(pair)
+    if ratio is None:
+        ratio = difflib.SequenceMatcher(None, email_domain, website_domain).ratio()
+        DOMAIN_PAIR_CACHE.put(pair, ratio)
+    return ratio
+
+def domain_cache_stats():
+    """Hit/miss counters of the domain parsing and scoring caches"""
+    return {
+        "url_domain": URL_DOMAIN_CACHE.stats(),
+        "base_domain": BASE_DOMAIN_CACHE.stats(),
+        "domain_pair": DOMAIN_PAIR_CACHE.stats(),
+    }
+
+def clear_domain_caches():
+    URL_DOMAIN_CACHE.clear()
+    BASE_DOMAIN_CACHE.clear()
+    DOMAIN_PAIR_CACHE.clear()
+
+def check_cancelled(cancel_token):
+    """Raise JobCancelled if the optional cancel token has been triggered"""
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+
+def score_domain_pairs(pairs, progress_callback=None, chunk_size=10000, workers=1, cancel_token=None):
+    """Score unique (email_domain, website_domain) pairs, returning a list of ratios
     
-    # Check each row
-    for i in range(total_rows):
-        email = emails[i]
-        domain = domains[i]
-        
-        # Default to excluding rows with missing data
-        if not isinstance(email, str) or not isinstance(domain, str):
-            mask.append(False)
-            continue
-            
-        # Extract domain from website
-        website_domain = extract_domain_from_url(domain)
+    Pairs already in the pair cache are not scored again, so re-running with
+    another threshold only pays for pairs it has not seen.
+    """
+    scores = DOMAIN_PAIR_CACHE.get_many(pairs)
+    missing = [pair for pair, score in zip(pairs, scores) if score is None]
+    
+    if missing:
+        if workers > 1 and len(missing) > chunk_size:
+            computed = score_domain_pairs_parallel(missing, progress_callback, chunk_size, workers, cancel_token)
+        else:
+            computed = _ratio_kernel(missing, progress_callback, chunk_size, cancel_token)
         
-        # Calculate similarity
-        similarity = calculate_domain_similarity(email, website_domain, check_username)
+        # Fill the gaps in order and remember the new scores
+        DOMAIN_PAIR_CACHE.put_many(zip(missing, computed))
+        computed = iter(computed)
+        scores = [next(computed) if score is None else score for score in scores]
+    
+    return scores
+
+def _ratio_kernel(pairs, progress_callback=None, chunk_size=10000, cancel_token=None):
+    """Compute ratios for a list of pairs
+    
+    Pairs sorted by website domain share one SequenceMatcher, which caches
+    its analysis of the second sequence between calls.
+    """
+    scores = []
+    total_pairs = len(pairs)
+    matcher = difflib.SequenceMatcher(None)
+    current_website = None
+    for start in range(0, total_pairs, chunk_size):
+        check_cancelled(cancel_token)
+        for email_domain, website_domain in pairs[start:start + chunk_size]:
+            if website_domain != current_website:
+                matcher.set_seq2(website_domain)
+                current_website = website_domain
+            matcher.set_seq1(email_domain)
+            scores.append(matcher.ratio())
         
-        # Add to mask
-        mask.append(similarity >= threshold)
+        if progress_callback:
+            done = min(start + chunk_size, total_pairs)
+            progress_callback(20 + int(done / total_pairs * 70), f"Scored {done} of {total_pairs} unique domain pairs")
+    return scores
+
+def _score_pair_chunk(pairs):
+    """Process pool worker scoring one chunk of domain pairs"""
+    return _ratio_kernel(pairs)
+
+def score_domain_pairs_parallel(pairs, progress_callback=None, chunk_size=10000, workers=None, cancel_token=None):
+    """Score domain pairs in chunks on a process pool, merging results in input order"""
+    chunks = [pairs[start:start + chunk_size] for start in range(0, len(pairs), chunk_size)]
+    results = [None] * len(chunks)
+    total_pairs = len(pairs)
+    done = 0
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_score_pair_chunk, chunk): i for i, chunk in enumerate(chunks)}
         
-        # Update progress every 100 rows or at the end
-        if progress_callback and (i % 100 == 0 or i == total_rows - 1):
-            progress_percent = min(90, int((i + 1) / total_rows * 90))
-            progress_callback(progress_percent, f"Processed {i+1} of {total_rows} rows")
+        # Chunks finish out of order, report each one as it completes
+        for future in as_completed(futures):
+            if cancel_token is not None and cancel_token.cancelled:
+                # Drop the chunks that have not started, running ones finish on shutdown
+                for pending in futures:
+                    pending.cancel()
+                cancel_token.raise_if_cancelled()
+            i = futures[future]
+            results[i] = future.result()
+            done += len(chunks[i])
+            if progress_callback:
+                progress_callback(20 + int(done / total_pairs * 70), f"Scored {done} of {total_pairs} unique domain pairs")
+    
+    return [score for chunk_scores in results for score in chunk_scores]
+
+def domain_similarity_scores(df, email_column, domain_column, check_username=True, progress_callback=None, workers=1, cancel_token=None):
+    """Score every row like calculate_domain_similarity, working column by column
+    
+    Rows without string values in both columns score null. SequenceMatcher has
+    no columnar form, so it only runs once per distinct pair of domains, on a
+    process pool when workers > 1. A triggered cancel_token stops scoring
+    between chunks by raising JobCancelled.
+    """
+    total_rows = df.shape[0]
+    df = df.select(
+        pl.col(col).cast(pl.Utf8) if df.schema[col] == pl.Categorical else pl.col(col)
+        for col in dict.fromkeys([email_column, domain_column])
+    )
+    if df.schema[email_column] != pl.Utf8 or df.schema[domain_column] != pl.Utf8:
+        return pl.Series("similarity", [None] * total_rows, dtype=pl.Float64)
+    
+    if progress_callback:
+        progress_callback(5, "Extracting domains...")
+    
+    parts = df.select(
+        email_domain=email_domain_expr(email_column),
+        username=email_username_expr(email_column),
+        website_domain=url_domain_expr(domain_column),
+        valid=pl.col(email_column).is_not_null() & pl.col(domain_column).is_not_null(),
+        # Rows urlparse or str.lower could treat differently are scored in Python
+        needs_python=(
+            pl.col(email_column).str.contains(r"[^\x00-\x7F]")
+            | pl.col(domain_column).str.contains(r"[^\x00-\x7F]")
+            | pl.col(domain_column).str.contains(r"[\[\]]")
+        ).fill_null(False),
+    )
+    
+    # Score each distinct pair of differing non-empty domains once, identical ones score 1.0
+    pairs = (
+        parts.select("email_domain", "website_domain")
+        .filter(
+            (pl.col("email_domain") != "")
+            & (pl.col("website_domain") != "")
+            & (pl.col("email_domain") != pl.col("website_domain"))
+        )
+        .unique()
+        .sort("website_domain")
+    )
+    check_cancelled(cancel_token)
+    if progress_callback:
+        progress_callback(20, f"Scoring {pairs.shape[0]} unique domain pairs...")
+    pairs = pairs.with_columns(
+        ratio=pl.Series(
+            score_domain_pairs(pairs.rows(), progress_callback, workers=workers, cancel_token=cancel_token),
+            dtype=pl.Float64,
+        )
+    )
+    
+    scored = parts.join(pairs, on=["email_domain", "website_domain"], how="left", maintain_order="left")
+    ratio = (
+        pl.when((pl.col("email_domain") == pl.col("website_domain")) & (pl.col("email_domain") != ""))
+        .then(1.0)
+        .otherwise(pl.col("ratio"))
+        .fill_null(0.0)
+    )
+    
+    if check_username:
+        # Website name without TLD appearing in the email username
+        website_base = pl.col("website_domain").str.split(".").list.first()
+        username_score = (
+            pl.when(
+                (website_base != "")
+                & (pl.col("username") != "")
+                & pl.col("username").str.contains(website_base, literal=True)
+            )
+            .then(website_base.str.len_chars() / pl.col("username").str.len_chars())
+            .otherwise(0.0)
+            .fill_null(0.0)
+        )
+        score = pl.max_horizontal(ratio, username_score)
+    else:
+        score = ratio
+    
+    scores = scored.select(pl.when(pl.col("valid")).then(score).alias("similarity")).to_series()
     
-    # Convert mask to Polars expression
-    filter_mask = pl.Series(mask)
+    # Patch the rare rows that need Python's own URL parsing
+    fallback_rows = parts["needs_python"].arg_true()
+    if len(fallback_rows) > 0:
+        check_cancelled(cancel_token)
+        emails = df[email_column].gather(fallback_rows).to_list()
+        domains = df[domain_column].gather(fallback_rows).to_list()
+        fallback_scores = [
+            calculate_domain_similarity(email, extract_domain_from_url(domain), check_username)
+            if isinstance(email, str) and isinstance(domain, str) else None
+            for email, domain in zip(emails, domains)
+        ]
+        scores = scores.scatter(fallback_rows, pl.Series(fallback_scores, dtype=pl.Float64))
+    
+    return scores
+
+def domain_similarity_mask(df, email_column, domain_column, threshold=0.75, check_username=True, progress_callback=None, workers=1, cancel_token=None):
+    """Return a Boolean Series marking rows whose email matches the website domain"""
+    scores = domain_similarity_scores(df, email_column, domain_column, check_username, progress_callback, workers, cancel_token)
+    
+    # Rows with missing data are always excluded
+    return (scores >= threshold).fill_null(False).rename("")
+
+def domain_similarity_filter(df, email_column, domain_column, threshold=0.75, check_username=True, progress_callback=None, workers=1, cancel_token=None):
+    filter_mask = domain_similarity_mask(df, email_column, domain_column, threshold, check_username, progress_callback, workers, cancel_token)
     
     # Apply filter and update progress
     if progress_callback:
@@ -179,4 +787,354 @@ def domain_similarity_filter(df, email_column, domain_column, threshold=0.75, ch
     if progress_callback:
         progress_callback(100, "Completed")
     
-    return result
\ No newline at end of file
+    return result
+
+# Operations that score rows eagerly and are recorded as row-selection masks
+MASK_OPERATIONS = {"domain_similarity"}
+
+def operation_columns(op, params):
+    """Columns an operation reads or changes, the only ones it needs parsed"""
+    if op in ("word_match", "remove_duplicates"):
+        return list(params["selected_column_names"])
+    elif op in ("find_replace", "email_validation"):
+        return [params["column_name"]]
+    elif op in MASK_OPERATIONS:
+        return operation_input_columns(op, params)
+    raise ValueError(f"Unknown operation: {op}")
+
+def operation_input_columns(op, params):
+    """Columns an eager filter operation reads to compute its mask"""
+    if op == "domain_similarity":
+        return list(dict.fromkeys([params["email_column"], params["domain_column"]]))
+    raise ValueError(f"Operation '{op}' has no row mask")
+
+def operation_mask(df, op, params, progress_callback=None, cancel_token=None):
+    """Compute the row-selection mask of an eager filter operation"""
+    if op == "domain_similarity":
+        return domain_similarity_mask(df, progress_callback=progress_callback, cancel_token=cancel_token, **params)
+    raise ValueError(f"Operation '{op}' has no row mask")
+
+def apply_operation(df, op, params):
+    """Apply a recorded operation descriptor to a DataFrame or LazyFrame"""
+    if op == "word_match":
+        return filter_word_match(df, **params)
+    elif op == "remove_duplicates":
+        return drop_duplicates(df, **params)
+    elif op == "find_replace":
+        return find_and_replace(df, **params)
+    elif op == "email_validation":
+        return filter_valid_emails(df, **params)
+    elif op == "domain_similarity":
+        if isinstance(df, pl.LazyFrame):
+            return domain_similarity_filter(df.collect(), **params).lazy()
+        return domain_similarity_filter(df, **params)
+    raise ValueError(f"Unknown operation: {op}")
+
+def compile_operations(frame, operations, engine="auto", progress_callback=None, cancel_token=None):
+    """Compile operation recipes into a single LazyFrame
+    
+    Expression operations are chained into one query for the optimizer. Row
+    scoring operations collect only their input columns to compute a mask,
+    which then filters the query like any other predicate.
+    """
+    lf = frame.lazy()
+    for operation in operations:
+        check_cancelled(cancel_token)
+        if operation.op in MASK_OPERATIONS:
+            columns = operation_input_columns(operation.op, operation.params)
+            df = lf.select(columns).collect(engine=engine)
+            mask = operation_mask(df, operation.op, operation.params, progress_callback, cancel_token)
+            lf = lf.filter(pl.lit(mask))
+        else:
+            lf = apply_operation(lf, operation.op, operation.params)
+    return lf
+
+def frame_schema(frame):
+    """Schema of a DataFrame or LazyFrame, resolved without reading rows"""
+    if isinstance(frame, pl.LazyFrame):
+        return frame.collect_schema()
+    return frame.schema
+
+def unify_schemas(schemas):
+    """Schema every frame can be cast to, and what each frame needs to match it
+    
+    Columns keep the order they are first seen in and take the supertype of
+    their types across frames, Int64 and Float64 become Float64 and a number
+    next to a string becomes a string. Returns (schema, changes) where
+    changes holds one list per input of (column, from type, to type), with
+    a from type of None for columns the input lacks and gets as nulls.
+    """
+    # Concatenating empty frames resolves the supertypes without touching data
+    unified = pl.concat([pl.DataFrame(schema=schema) for schema in schemas], how="diagonal_relaxed").schema
+    changes = []
+    for schema in schemas:
+        changes.append([
+            (name, schema.get(name), dtype)
+            for name, dtype in unified.items()
+            if schema.get(name) != dtype
+        ])
+    return unified, changes
+
+def describe_schema_changes(names, changes):
+    """One readable line per cast or missing column, for reports"""
+    lines = []
+    for name, frame_changes in zip(names, changes):
+        for column, from_type, to_type in frame_changes:
+            if from_type is None:
+                lines.append(f"{name}: missing column '{column}' filled with nulls")
+            else:
+                lines.append(f"{name}: column '{column}' cast from {from_type} to {to_type}")
+    return lines
+
+def align_frame(frame, schema):
+    """Select the columns of schema from frame in order, casting and null-filling as needed"""
+    frame_types = frame_schema(frame)
+    return frame.select([
+        (pl.col(name) if frame_types[name] == dtype else pl.col(name).cast(dtype))
+        if name in frame_types else pl.lit(None, dtype=dtype).alias(name)
+        for name, dtype in schema.items()
+    ])
+
+def concat_frames(frames, merge_column):
+    """Concatenate frames that all have the merge column, lazily if any input is lazy
+    
+    Frames are aligned to their unified schema first, so extra columns and
+    differing types across files do not stop the concat.
+    """
+    for frame in frames:
+        if merge_column not in frame_columns(frame):
+            raise ValueError(f"Not all files have the column: {merge_column}")
+    if any(isinstance(frame, pl.LazyFrame) for frame in frames):
+        frames = [frame.lazy() for frame in frames]
+    schema, changes = unify_schemas([frame_schema(frame) for frame in frames])
+    if any(changes):
+        frames = [align_frame(frame, schema) for frame in frames]
+    return pl.concat(frames, how="vertical")
+
+def merge_frames(frames, merge_column):
+    """Concatenate frames and keep one row per merge column value
+    
+    If any input is a LazyFrame, everything is merged lazily.
+    """
+    return concat_frames(frames, merge_column).unique(subset=[merge_column])
+
+def use_streaming_merge(file_names, threshold=None):
+    """Whether files merged together are too large to be loaded into memory"""
+    if threshold is None:
+        threshold = streaming_threshold()
+    return sum(os.path.getsize(file_name) for file_name in file_names) > threshold
+
+def merge_partitions(file_names, memory_budget=None):
+    """Hash partitions a streaming merge of these files needs so each one's dedup fits in memory"""
+    if memory_budget is None:
+        memory_budget = load_memory_budget()
+    total = sum(os.path.getsize(file_name) for file_name in file_names) * LOAD_MEMORY_FACTOR
+    return max(1, math.ceil(total / max(memory_budget, 1)))
+
+def streaming_merge(frames, merge_column, partitions=1, store=None, progress_callback=None, cancel_token=None):
+    """Merge frames like merge_frames with the streaming engine, returning the path of the result
+    
+    The result is sunk to an Arrow IPC file in store (the working set by
+    default) and the inputs are never collected. With several partitions,
+    the inputs are read once and split by the hash of the merge column
+    into one file per partition, then each file is deduplicated on its own,
+    so a pass only holds the distinct keys of its share. Equal keys always
+    land in the same partition, so the parts never overlap and are joined
+    into the result without another dedup.
+    """
+    if store is None:
+        store = WORKING_SET
+    combined = concat_frames([frame.lazy() for frame in frames], merge_column)
+    if partitions <= 1:
+        if progress_callback:
+            progress_callback(30, "Merging files...")
+        return store.sink(combined.unique(subset=[merge_column]))
+    
+    split_directory = store.new_path("")
+    part_paths = []
+    try:
+        if progress_callback:
+            progress_callback(10, f"Splitting rows into {partitions} parts...")
+        target = pl.PartitionByKey(os.path.join(split_directory, "part-{key[0].value}.arrow"),
+                                   by=(pl.col(merge_column).hash(seed=0) % partitions).alias("partition"),
+                                   include_key=False)
+        combined.sink_ipc(target, compression="lz4", engine="streaming", mkdir=True)
+        split_paths = [os.path.join(split_directory, name) for name in sorted(os.listdir(split_directory))]
+        for index, split_path in enumerate(split_paths):
+            check_cancelled(cancel_token)
+            if progress_callback:
+                progress_callback(40 + int(index / len(split_paths) * 40),
+                                  f"Merging part {index + 1} of {len(split_paths)}...")
+            part_paths.append(store.sink(pl.scan_ipc(split_path, memory_map=False).unique(subset=[merge_column])))
+        check_cancelled(cancel_token)
+        if progress_callback:
+            progress_callback(80, "Joining merged parts...")
+        if not part_paths:
+            return store.sink(combined.head(0))
+        return store.sink(pl.scan_ipc(part_paths, memory_map=False))
+    finally:
+        for part_path in part_paths:
+            store.release(part_path)
+        shutil.rmtree(split_directory, ignore_errors=True)
+
+def key_columns(subtract_columns):
+    """A subtract key as a list of columns, a single column may be given as a string"""
+    if isinstance(subtract_columns, str):
+        return [subtract_columns]
+    return list(subtract_columns)
+
+def key_index(file_name, subtract_columns):
+    """Path of a file holding the distinct key values of a CSV file
+    
+    The index is built once per version of the file and key, with the
+    streaming engine, and reused until the file changes. Returns None when
+    the index cache is disabled or the index does not fit in it.
+    """
+    if not KEY_INDEX_CACHE.enabled:
+        return None
+    keys = key_columns(subtract_columns)
+    options = {"key_columns": keys}
+    path = KEY_INDEX_CACHE.get(file_name, options)
+    if path is None:
+        print(f"Building key index of {file_name} on {', '.join(keys)}")
+        path = with_relaxed_types([file_name], lambda: KEY_INDEX_CACHE.put(
+            file_name, scan_csv(file_name).select(keys).unique(), options))
+    return path
+
+def exclusion_keys(file_name, subtract_columns):
+    """LazyFrame of the keys to subtract, from the key index when there is one"""
+    keys = key_columns(subtract_columns)
+    try:
+        path = key_index(file_name, keys)
+    except Exception as e:
+        print(f"Could not index {file_name}: {str(e)}")
+        path = None
+    if path is not None:
+        return pl.scan_ipc(path)
+    return scan_csv(file_name).select(keys)
+
+def subtract_frame(frame, exclude_frame, subtract_columns):
+    """Drop rows of frame whose key appears in exclude_frame, with an anti-join
+    
+    subtract_columns is one column or a list of columns that must all match.
+    Rows with a null in the key never match, so they are always kept, where
+    the earlier is_in filter dropped them. Keys of exclude_frame are cast to
+    the types of frame with cast_keys, so a String column can be subtracted
+    from an Int64 one instead of raising, "007" matching 7. A LazyFrame
+    input gives a LazyFrame the streaming engine can run without collecting
+    either side.
+    """
+    keys = key_columns(subtract_columns)
+    for column in keys:
+        if column not in frame_columns(frame) or column not in frame_columns(exclude_frame):
+            raise ValueError(f"Both files must have the column: {column}")
+    
+    excluded = cast_keys(exclude_frame, keys, frame_schema(frame))
+    result = frame.lazy().join(excluded, on=keys, how="anti", maintain_order="left")
+    if isinstance(frame, pl.LazyFrame):
+        return result
+    return result.collect()
+
+def cast_keys(frame, keys, types):
+    """Key columns of frame as a LazyFrame cast to types
+    
+    The cast is not strict: a value that cannot convert, such as "AB12" for
+    an Int64 key, becomes null and so never matches anything.
+    """
+    frame_types = frame_schema(frame)
+    return frame.lazy().select([
+        pl.col(column) if frame_types[column] == types[column]
+        else pl.col(column).cast(types[column], strict=False)
+        for column in keys
+    ])
+
+def bloom_filter(file_name, subtract_columns, false_positive_rate, types, cancel_token=None):
+    """Bloom filter of the keys of a CSV file, built once per file version, key, types and rate
+    
+    types maps the key columns to those of the frame the filter is probed
+    with. Keys are read as text, then cast to the types the file is parsed
+    with and on to types, as the exact step of bloom_subtract compares
+    them, so "1.50" in the file and 1.5 in a Float64 frame, or "007" and 7,
+    land on the same bits. Keys that cannot convert are left out as they
+    can never match. The keys are read in batches, so building never holds
+    more than one batch next to the filter itself.
+    """
+    keys = key_columns(subtract_columns)
+    spec = parse_spec(file_name)
+    source = parse_csv(file_name, spec)
+    file_types = frame_schema(source)
+    options = {"key_columns": keys, "false_positive_rate": false_positive_rate,
+               "key_types": [[str(file_types[column]), str(types[column])] for column in keys]}
+    path = BLOOM_FILTER_CACHE.get(file_name, options) if BLOOM_FILTER_CACHE.enabled else None
+    if path is not None:
+        return BloomFilter.from_frame(pl.read_ipc(path, memory_map=True), false_positive_rate)
+    
+    print(f"Building Bloom filter of {file_name} on {', '.join(keys)}")
+    key_count = source.select(pl.len()).collect(engine="streaming").item()
+    bloom = BloomFilter.for_capacity(key_count, false_positive_rate)
+    reader = pl.read_csv_batched(
+        csv_source(file_name, spec), columns=keys, schema_overrides={column: pl.String for column in keys},
+        **spec.dialect_options(),
+    )
+    pending = []
+    pending_rows = 0
+    while True:
+        check_cancelled(cancel_token)
+        batches = reader.next_batches(16)
+        if batches:
+            pending.extend(batches)
+            pending_rows += sum(batch.shape[0] for batch in batches)
+        # Adding rewrites the bit array, so keys are added a few million at a time
+        if pending and (pending_rows >= BLOOM_BUILD_BATCH_SIZE or not batches):
+            batch = cast_keys(cast_keys(pl.concat(pending), keys, file_types).collect(), keys, types)
+            batch = batch.drop_nulls().collect()
+            bloom.add(key_struct(batch, keys))
+            pending = []
+            pending_rows = 0
+        if not batches:
+            break
+    
+    if BLOOM_FILTER_CACHE.enabled:
+        BLOOM_FILTER_CACHE.put(file_name, bloom.to_frame(), options)
+    return bloom
+
+def bloom_subtract(frame, file_name, subtract_columns, false_positive_rate, progress_callback=None, cancel_token=None):
+    """Subtract the keys of a CSV file from frame without holding all of them in memory
+    
+    A Bloom filter of the file's keys discards rows that certainly have no
+    match. Only the keys of the remaining candidates are looked up exactly
+    in the file, by a streamed semi-join whose hash table holds the
+    candidates rather than the whole file. The result equals subtract_frame.
+    """
+    keys = key_columns(subtract_columns)
+    for column in keys:
+        if column not in frame_columns(frame):
+            raise ValueError(f"Both files must have the column: {column}")
+    
+    if progress_callback:
+        progress_callback(25, "Loading Bloom filter...")
+    bloom = bloom_filter(file_name, keys, false_positive_rate, frame_schema(frame), cancel_token)
+    
+    if progress_callback:
+        progress_callback(40, "Finding candidate matches...")
+    # The frame's keys already have the types the filter was built with
+    candidate = pl.struct([pl.col(column).cast(pl.String) for column in keys]).map_batches(
+        bloom.contains, return_dtype=pl.Boolean, is_elementwise=True
+    )
+    candidate_keys = frame.lazy().filter(candidate).select(keys).unique().collect(engine="streaming")
+    check_cancelled(cancel_token)
+    
+    if progress_callback:
+        progress_callback(50, f"Checking {candidate_keys.shape[0]} candidate keys...")
+    exclude_frame = scan_csv(file_name)
+    for column in keys:
+        if column not in frame_columns(exclude_frame):
+            raise ValueError(f"Both files must have the column: {column}")
+    matched_keys = (
+        cast_keys(exclude_frame, keys, candidate_keys.schema)
+        .join(candidate_keys.lazy(), on=keys, how="semi")
+        .unique()
+        .collect(engine="streaming")
+    )
+    check_cancelled(cancel_token)
+    return subtract_frame(frame, matched_keys, keys)
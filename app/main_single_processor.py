@@ -1,4 +1,5 @@
 import sys
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from app.SingleProcessorWindow import MainWindow
 
@@ -9,4 +10,6 @@ def main():
     sys.exit(app.exec_())
     
 if __name__ == "__main__":
+    # Needed for process pool workers in the frozen executable
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,8 @@
+import sys
+import multiprocessing
+from app.cli import main_cli
+
+if __name__ == "__main__":
+    # Needed for process pool workers in the frozen executable
+    multiprocessing.freeze_support()
+    sys.exit(main_cli())
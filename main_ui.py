@@ -1,8 +1,11 @@
 import sys
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from app.LauncherWindow import LauncherWindow
 
 if __name__ == "__main__":
+    # Needed for process pool workers in the frozen executable
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = LauncherWindow()
     window.show()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+# Caches default to the user's cache directory when app modules are imported, keep them out of it
+os.environ.pop("LOCALAPPDATA", None)
+os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp(prefix="csv-processor-tests-")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import pytest
+
+import app.main as main
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    """Give every test empty caches of its own"""
+    for name in ("PARSED_FILE_CACHE", "KEY_INDEX_CACHE", "BLOOM_FILTER_CACHE"):
+        monkeypatch.setattr(getattr(main, name), "cache_dir", str(tmp_path / "cache" / name.lower()))
+    # Runs with --no-cache turn the parsed-file cache off for the rest of the process
+    monkeypatch.setattr(main.PARSED_FILE_CACHE, "max_bytes", main.PARSED_FILE_CACHE.max_bytes)
+    main.PARSE_SPECS.clear()
+    yield
+    main.PARSE_SPECS.clear()
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    """Write rows under tmp_path as a CSV file, returning its path"""
+    def write(name, header, rows):
+        path = tmp_path / name
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(",".join(header) + "\n")
+            for row in rows:
+                f.write(",".join("" if value is None else str(value) for value in row) + "\n")
+        return str(path)
+    return write
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def wait_for_jobs(qapp):
+    """Block until background jobs are done and their results delivered to the GUI thread"""
+    from PyQt5.QtCore import QThreadPool
+
+    def wait():
+        for _ in range(3):
+            QThreadPool.globalInstance().waitForDone()
+            qapp.processEvents()
+    return wait
+
+
+@pytest.fixture
+def leads_csv(write_csv):
+    rows = [(f"user{i % 40}@example.com", f"name{i % 25}", "US" if i % 2 else "DE") for i in range(200)]
+    return write_csv("leads.csv", ["email", "name", "country"], rows)
+
+
+@pytest.fixture
+def window(leads_csv, monkeypatch, wait_for_jobs):
+    """Single file window with leads_csv loaded, message boxes do nothing"""
+    QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+    for name in ("critical", "warning", "information"):
+        monkeypatch.setattr(QtWidgets.QMessageBox, name, lambda *args: None)
+    from app.SingleProcessorWindow import MainWindow
+    window = MainWindow()
+    window.load_csv_file(leads_csv)
+    wait_for_jobs()
+    yield window
+    window.close()
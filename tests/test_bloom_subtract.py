@@ -0,0 +1,77 @@
+import random
+
+import polars as pl
+import pytest
+
+import app.main as main
+from app.BloomFilter import BloomFilter, key_struct
+
+
+def exact_subtract(frame, file_name, keys):
+    return main.subtract_frame(frame, main.scan_csv(file_name), keys).collect()
+
+
+def test_filter_has_no_false_negatives():
+    keys = pl.DataFrame({"id": [str(i) for i in range(5000)]})
+    bloom = BloomFilter.for_capacity(keys.height, 0.01)
+    bloom.add(key_struct(keys, ["id"]))
+
+    assert bloom.contains(key_struct(keys, ["id"])).all()
+    others = pl.DataFrame({"id": [str(i) for i in range(5000, 15000)]})
+    # Well under the 1% rate would be luck, well over it a broken filter
+    assert bloom.contains(key_struct(others, ["id"])).mean() < 0.03
+
+
+def test_same_rows_as_the_exact_subtract(write_csv):
+    rng = random.Random(1)
+    rows = [(rng.randrange(2000), rng.choice("abc")) for _ in range(3000)]
+    excluded = [(rng.randrange(2000), rng.choice("abc")) for _ in range(1500)]
+    frame = pl.read_csv(write_csv("a.csv", ["id", "group"], rows)).lazy()
+    file_name = write_csv("b.csv", ["id", "group"], excluded)
+
+    for keys in (["id"], ["id", "group"]):
+        result = main.bloom_subtract(frame, file_name, keys, 0.01).collect()
+        assert result.equals(exact_subtract(frame, file_name, keys))
+
+
+def test_false_positives_are_not_removed(write_csv):
+    frame = pl.DataFrame({"id": list(range(2000))}).lazy()
+    file_name = write_csv("b.csv", ["id"], [(i,) for i in range(0, 2000, 2)])
+
+    # A rate this high lets many odd ids through the filter, the exact step must keep them
+    result = main.bloom_subtract(frame, file_name, "id", 0.5).collect()
+
+    assert result["id"].to_list() == list(range(1, 2000, 2))
+
+
+def test_keys_are_compared_as_the_frame_types(write_csv):
+    frame = pl.DataFrame({"id": [1.5, 7.0, 2.0, None], "value": ["a", "b", "c", "d"]}).lazy()
+    file_name = write_csv("b.csv", ["id"], [("1.50",), ("007",), ("AB12",), (None,)])
+
+    result = main.bloom_subtract(frame, file_name, "id", 0.01).collect()
+
+    assert result["value"].to_list() == ["c", "d"]
+    assert result.equals(main.subtract_frame(frame, pl.scan_csv(file_name, infer_schema=False), "id").collect())
+
+
+def test_filter_is_cached_per_key_types(write_csv):
+    file_name = write_csv("b.csv", ["id"], [("007",), ("8",)])
+    frame = pl.DataFrame({"id": [7, 8, 9]}).lazy()
+    string_frame = pl.DataFrame({"id": ["7", "007", "9"]}).lazy()
+
+    assert main.bloom_subtract(frame, file_name, "id", 0.01).collect()["id"].to_list() == [9]
+    assert len(main.BLOOM_FILTER_CACHE.entries()) == 1
+    assert main.bloom_subtract(frame, file_name, "id", 0.01).collect()["id"].to_list() == [9]
+    assert len(main.BLOOM_FILTER_CACHE.entries()) == 1
+    # The file's 007 is parsed as 7, which as a string matches "7" only
+    result = main.bloom_subtract(string_frame, file_name, "id", 0.01).collect()
+    assert result["id"].to_list() == ["007", "9"]
+    assert result.equals(exact_subtract(string_frame, file_name, "id"))
+    assert len(main.BLOOM_FILTER_CACHE.entries()) == 2
+
+
+def test_missing_column_raises(write_csv):
+    file_name = write_csv("b.csv", ["id"], [(1,)])
+
+    with pytest.raises(ValueError):
+        main.bloom_subtract(pl.DataFrame({"other": [1]}).lazy(), file_name, "id", 0.01)
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+
+from app.CancelToken import CancelToken, JobCancelled
+from app.LazyPipeline import LazyPipeline
+from app.OperationHistory import Operation
+
+
+def cancel_after(monkeypatch, window, name):
+    """Cancel the running job right after pipeline.name has recorded its steps"""
+    original = getattr(window.pipeline, name)
+
+    def run(*args, **kwargs):
+        result = original(*args, **kwargs)
+        window.current_job.cancel()
+        return result
+
+    monkeypatch.setattr(window.pipeline, name, run)
+
+
+def test_restore_puts_the_history_back(leads_csv):
+    pipeline = LazyPipeline(leads_csv)
+    pipeline.apply(Operation("remove_duplicates", {"selected_column_names": ["email"]}))
+    state = pipeline.snapshot()
+    count = pipeline.row_count()
+
+    pipeline.apply(Operation("remove_duplicates", {"selected_column_names": ["name"]}))
+    assert pipeline.row_count() < count
+    pipeline.restore(state)
+
+    assert len(pipeline.operations) == 1
+    assert pipeline.row_count() == count
+
+
+def test_cancel_before_apply_records_nothing(leads_csv):
+    pipeline = LazyPipeline(leads_csv)
+    token = CancelToken()
+    token.cancel()
+
+    with pytest.raises(JobCancelled):
+        pipeline.apply(Operation("remove_duplicates", {"selected_column_names": ["email"]}), cancel_token=token)
+    assert pipeline.operations == []
+
+
+def test_operation_cancelled_after_apply_is_rolled_back(window, monkeypatch, wait_for_jobs):
+    window.apply_remove_duplicates_filter(["email"])
+    wait_for_jobs()
+    row_count = window.row_count
+    cancel_after(monkeypatch, window, "apply")
+
+    window.apply_remove_duplicates_filter(["name"])
+    wait_for_jobs()
+
+    assert len(window.pipeline.operations) == 1
+    assert window.pipeline.row_count() == row_count == 40
+    assert window.row_count == row_count
+    assert window.results_frame.status_label.text() == "Operation cancelled, data unchanged"
+
+
+def test_recipe_cancelled_after_apply_is_rolled_back(window, monkeypatch, tmp_path, wait_for_jobs):
+    recipe_path = tmp_path / "recipe.json"
+    recipe_path.write_text(json.dumps({"operations": [
+        {"op": "remove_duplicates", "params": {"selected_column_names": ["email"]}},
+        {"op": "remove_duplicates", "params": {"selected_column_names": ["name"]}},
+    ]}))
+    monkeypatch.setattr(QtWidgets.QFileDialog, "getOpenFileName", lambda *args: (str(recipe_path), ""))
+    cancel_after(monkeypatch, window, "apply_recipe")
+
+    window.apply_recipe()
+    wait_for_jobs()
+
+    assert window.pipeline.operations == []
+    assert window.pipeline.row_count() == 200
+    assert window.results_frame.status_label.text() == "Operation cancelled, data unchanged"
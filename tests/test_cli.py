@@ -0,0 +1,137 @@
+import os
+
+import polars as pl
+import pytest
+
+import app.cli as cli
+
+
+@pytest.fixture
+def people(write_csv):
+    rows = [
+        ("ann@acme.com", "Ann", "acme.com", "US"),
+        ("ann@acme.com", "Ann", "acme.com", "US"),
+        ("bob@globex.io", "Bob", "https://www.globex.io", ""),
+        ("carol@gmail.com", "Carol", "initech.com", "DE"),
+        ("not an email", "Dave", "hooli.com", "DE"),
+        ("eve@hooli.com", "Eve Test", "hooli.com", "US"),
+    ]
+    return write_csv("people.csv", ["email", "name", "website", "country"], rows)
+
+
+def run(*argv):
+    return cli.main_cli(["--jobs", "1", *argv])
+
+
+def test_operations_run_in_the_order_given(people, tmp_path):
+    output = str(tmp_path / "out.csv")
+
+    assert run(people, "-o", output,
+               "--word-match", "columns=name", "values=test", "include=no",
+               "--dedup", "columns=email",
+               "--find-replace", "column=country", "new=unknown",
+               "--email-validation", "column=email") == 0
+
+    result = pl.read_csv(output)
+    assert result["email"].to_list() == ["ann@acme.com", "bob@globex.io", "carol@gmail.com"]
+    assert result["country"].to_list() == ["US", "unknown", "DE"]
+
+
+def test_domain_similarity_and_columns(people, tmp_path):
+    output = str(tmp_path / "out.csv")
+
+    assert run(people, "-o", output, "--columns", "email,name",
+               "--domain-similarity", "email=email", "website=website", "threshold=0.9") == 0
+
+    result = pl.read_csv(output)
+    assert result.columns == ["email", "name"]
+    assert result["name"].to_list() == ["Ann", "Ann", "Bob", "Eve Test"]
+
+
+def test_regex_word_match(people, tmp_path):
+    output = str(tmp_path / "out.csv")
+
+    assert run(people, "-o", output, "--word-match", "columns=name", r"values=^\S+$", "regex=yes") == 0
+
+    assert pl.read_csv(output)["name"].to_list() == ["Ann", "Ann", "Bob", "Carol", "Dave"]
+
+
+def test_each_input_gets_its_own_output(write_csv, tmp_path):
+    for i in range(3):
+        write_csv(f"part{i}.csv", ["id", "value"], [(j, j % 2) for j in range(10 * (i + 1))])
+    output = str(tmp_path / "out")
+
+    assert cli.main_cli([str(tmp_path / "part*.csv"), "-o", output, "--jobs", "2", "--no-cache",
+                         "--dedup", "columns=value"]) == 0
+
+    assert sorted(os.listdir(output)) == ["part0_processed.csv", "part1_processed.csv", "part2_processed.csv"]
+    assert all(pl.read_csv(os.path.join(output, name)).height == 2 for name in os.listdir(output))
+
+
+def test_merge_then_subtract(write_csv, tmp_path):
+    first = write_csv("a.csv", ["email", "n"], [(f"u{i}@x.com", i) for i in range(10)])
+    second = write_csv("b.csv", ["email", "n"], [(f"u{i}@x.com", i) for i in range(5, 15)])
+    exclude = write_csv("exclude.csv", ["email"], [("u0@x.com",), ("u14@x.com",), ("other@x.com",)])
+    output = str(tmp_path / "merged.parquet")
+
+    assert run(first, second, "-o", output, "--merge", "column=email",
+               "--subtract", f"file={exclude}", "column=email") == 0
+
+    result = pl.read_parquet(output)
+    assert sorted(result["n"].to_list()) == list(range(1, 14))
+
+
+def test_bloom_subtract_matches_exact_subtract(people, write_csv, tmp_path):
+    exclude = write_csv("exclude.csv", ["email"], [("ann@acme.com",), ("eve@hooli.com",)])
+
+    assert run(people, "-o", str(tmp_path / "exact.csv"), "--subtract", f"file={exclude}", "column=email") == 0
+    assert run(people, "-o", str(tmp_path / "bloom.csv"), "--subtract", f"file={exclude}", "column=email",
+               "bloom=0.01") == 0
+
+    exact = pl.read_csv(tmp_path / "exact.csv")
+    assert exact["name"].to_list() == ["Bob", "Carol", "Dave"]
+    assert pl.read_csv(tmp_path / "bloom.csv").equals(exact)
+
+
+def test_split_rows(people, tmp_path):
+    assert run(people, "-o", str(tmp_path / "out.csv"), "--split-rows", "4") == 0
+
+    parts = sorted(os.listdir(tmp_path / "out"))
+    assert [pl.read_csv(tmp_path / "out" / name).height for name in parts] == [4, 2]
+
+
+def test_saved_recipe_runs_the_same_operations(people, tmp_path):
+    recipe = str(tmp_path / "recipe.json")
+    assert run(people, "-o", str(tmp_path / "first.csv"), "--save-recipe", recipe,
+               "--dedup", "columns=email", "--find-replace", "column=country", "new=unknown") == 0
+
+    assert run(people, "-o", str(tmp_path / "second.csv"), "--recipe", recipe) == 0
+
+    assert pl.read_csv(tmp_path / "second.csv").equals(pl.read_csv(tmp_path / "first.csv"))
+
+
+@pytest.mark.parametrize("argv", [
+    ["--dedup", "email"],
+    ["--dedup", "columns="],
+    ["--find-replace", "column=country"],
+    ["--split-rows", "0"],
+])
+def test_bad_arguments_exit_with_usage(people, tmp_path, argv, capsys):
+    with pytest.raises(SystemExit) as exc:
+        run(people, "-o", str(tmp_path / "out.csv"), *argv)
+
+    assert exc.value.code == 2
+    assert "error:" in capsys.readouterr().err
+
+
+def test_no_matching_inputs(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        run(str(tmp_path / "missing*.csv"), "-o", str(tmp_path / "out.csv"))
+
+    assert "no input files matched" in capsys.readouterr().err
+
+
+def test_failed_run_returns_an_error(people, tmp_path, capsys):
+    assert run(people, "-o", str(tmp_path / "out.csv"), "--dedup", "columns=missing") == 1
+
+    assert capsys.readouterr().err.startswith("Error:")
@@ -0,0 +1,75 @@
+import os
+
+import polars as pl
+import pytest
+
+from app.LazyPipeline import LazyPipeline
+from app.OperationHistory import Operation
+
+
+def dedup(*columns):
+    return Operation("remove_duplicates", {"selected_column_names": list(columns)})
+
+
+def expected(leads_csv):
+    return pl.read_csv(leads_csv).unique(subset=["email"], keep="first", maintain_order=True)
+
+
+def test_only_used_columns_are_loaded(leads_csv):
+    pipeline = LazyPipeline(leads_csv)
+    pipeline.apply(dedup("email"))
+
+    assert pipeline.loaded_columns == ["email"]
+    assert pipeline.columns == ["email", "name", "country"]
+    assert pipeline.row_count() == 40
+    assert pipeline.preview(5).equals(expected(leads_csv).head(5))
+
+
+def test_export_plan_reads_unloaded_columns(leads_csv):
+    pipeline = LazyPipeline(leads_csv)
+    pipeline.apply(dedup("email"))
+
+    assert pipeline.export_plan(["name", "email"]).collect().equals(expected(leads_csv).select(["name", "email"]))
+    assert pipeline.export_plan().collect().equals(expected(leads_csv))
+
+
+class ExportDialogStub:
+    """Accepts at once with the given columns and partitioning"""
+    Accepted = 1
+
+    def __init__(self, columns, partitioning):
+        self.columns = columns
+        self.partitioning = partitioning
+
+    def __call__(self, parent, columns):
+        return self
+
+    def exec_(self):
+        return self.Accepted
+
+    def get_selected_columns(self):
+        return self.columns
+
+    def get_partitioning(self):
+        return self.partitioning
+
+
+def test_split_by_a_column_that_is_not_exported(window, monkeypatch, tmp_path, wait_for_jobs, leads_csv):
+    QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+    import app.SingleProcessorWindow as single_window
+    monkeypatch.setattr(single_window, "ExportDialog", ExportDialogStub(["name"], {"by": "column", "column": "country"}))
+    monkeypatch.setattr(QtWidgets.QFileDialog, "getSaveFileName", lambda *args: (str(tmp_path / "out.csv"), ""))
+    errors = []
+    monkeypatch.setattr(QtWidgets.QMessageBox, "critical", lambda *args: errors.append(args[2]))
+    window.apply_remove_duplicates_filter(["email"])
+    wait_for_jobs()
+
+    window.download_result_data()
+    wait_for_jobs()
+
+    assert errors == []
+    for country in ("DE", "US"):
+        directory = os.path.join(tmp_path, "out", f"country={country}")
+        part = pl.scan_csv([os.path.join(directory, name) for name in sorted(os.listdir(directory))]).collect()
+        assert part.columns == ["name"]
+        assert part.equals(expected(leads_csv).filter(pl.col("country") == country).select("name"))
@@ -0,0 +1,125 @@
+import random
+
+import polars as pl
+import pytest
+
+import app.main as main
+
+
+def scalar_scores(emails, urls, check_username=True):
+    """The per-row loop domain_similarity_scores replaced"""
+    return [
+        main.calculate_domain_similarity(email, main.extract_domain_from_url(url), check_username)
+        if isinstance(email, str) and isinstance(url, str) else None
+        for email, url in zip(emails, urls)
+    ]
+
+
+@pytest.fixture(autouse=True)
+def empty_pair_cache():
+    main.DOMAIN_PAIR_CACHE.clear()
+    yield
+    main.DOMAIN_PAIR_CACHE.clear()
+
+
+EDGE_CASES = [
+    ("john@acme.com", "https://www.acme.com/about"),
+    ("John@ACME.com", "ACME.COM"),
+    ("sales@acme.co.uk", "http://acme.com?ref=x"),
+    ("acmesales@gmail.com", "acme.io#top"),
+    ("jane@example.org", "www.examp1e.org/path/page"),
+    ("noatsign", "acme.com"),
+    ("@acme.com", "acme.com"),
+    ("bob@", "acme.com"),
+    ("a@b@acme.com", "acme.com"),
+    ("", "acme.com"),
+    ("joe@acme.com", ""),
+    ("joe@acme.com", "http://"),
+    ("joe@acme.com", "ftp://acme.com"),
+    ("joe@acme.com", "https://acme.com:8080/x"),
+    ("joe@acme.com", "https://user@acme.com"),
+    ("joe@acme.com", "acme.com\t/x"),
+    ("joe@müller.de", "müller.de"),
+    ("joe@MÜLLER.de", "https://www.Müller.de"),
+    ("joe@acme.com", "http://[::1]/"),
+    ("joe@acme.com", "http://[bad"),
+    (None, "acme.com"),
+    ("joe@acme.com", None),
+    (None, None),
+]
+
+
+@pytest.mark.parametrize("check_username", [True, False])
+def test_edge_cases_score_like_the_scalar_functions(check_username):
+    emails, urls = zip(*EDGE_CASES)
+    df = pl.DataFrame({"email": list(emails), "website": list(urls)}, schema={"email": pl.Utf8, "website": pl.Utf8})
+
+    scores = main.domain_similarity_scores(df, "email", "website", check_username)
+
+    assert scores.to_list() == scalar_scores(emails, urls, check_username)
+
+
+def random_rows(count, seed):
+    rng = random.Random(seed)
+    names = ["acme", "globex", "initech", "umbrella", "hooli", "acmecorp", "glob", "a", ""]
+    tlds = ["com", "io", "co.uk", "org", "COM"]
+    users = ["john", "sales", "acmesales", "info", "globexteam", "x", ""]
+    emails, urls = [], []
+    for _ in range(count):
+        emails.append(rng.choice([
+            f"{rng.choice(users)}@{rng.choice(names)}.{rng.choice(tlds)}",
+            f"{rng.choice(users)}@{rng.choice(names)}{rng.randint(0, 9)}.{rng.choice(tlds)}",
+            rng.choice(users),
+            None,
+        ]))
+        host = f"{rng.choice(['', 'www.', 'WWW.', 'shop.'])}{rng.choice(names)}.{rng.choice(tlds)}"
+        urls.append(rng.choice([
+            host,
+            f"https://{host}/{rng.choice(['', 'about', 'a?b=c'])}",
+            f"http://{host}#x",
+            "",
+            None,
+        ]))
+    return emails, urls
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_random_rows_score_like_the_scalar_functions(seed):
+    emails, urls = random_rows(5000, seed)
+    df = pl.DataFrame({"email": emails, "website": urls}, schema={"email": pl.Utf8, "website": pl.Utf8})
+
+    scores = main.domain_similarity_scores(df, "email", "website")
+
+    assert scores.to_list() == scalar_scores(emails, urls)
+
+
+def test_mask_keeps_the_rows_the_scalar_loop_kept():
+    emails, urls = random_rows(2000, 4)
+    df = pl.DataFrame({"email": emails, "website": urls}, schema={"email": pl.Utf8, "website": pl.Utf8})
+    expected = scalar_scores(emails, urls)
+
+    for threshold in (0.5, 0.75, 1.0):
+        mask = main.domain_similarity_mask(df, "email", "website", threshold)
+        assert mask.to_list() == [score is not None and score >= threshold for score in expected]
+
+
+def test_parallel_and_cached_scores_match():
+    emails, urls = random_rows(3000, 5)
+    df = pl.DataFrame({"email": emails, "website": urls}, schema={"email": pl.Utf8, "website": pl.Utf8})
+    expected = scalar_scores(emails, urls)
+
+    pairs = [(f"{i}.acme.com", f"{i % 97}.globex.io") for i in range(300)]
+    assert main.score_domain_pairs(pairs, chunk_size=50, workers=2) == main._ratio_kernel(pairs)
+
+    assert main.domain_similarity_scores(df, "email", "website").to_list() == expected
+    # Second run reads every pair from the pair cache
+    assert main.domain_similarity_scores(df, "email", "website").to_list() == expected
+
+
+def test_categorical_and_non_string_columns():
+    df = pl.DataFrame({"email": ["joe@acme.com", "ann@globex.io"], "website": ["acme.com", "acme.com"], "n": [1, 2]})
+
+    categorical = df.with_columns(pl.col("email", "website").cast(pl.Categorical))
+    assert main.domain_similarity_scores(categorical, "email", "website").to_list() == \
+        scalar_scores(df["email"].to_list(), df["website"].to_list())
+    assert main.domain_similarity_scores(df, "n", "website").to_list() == [None, None]
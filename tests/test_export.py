@@ -0,0 +1,181 @@
+import gzip
+import os
+
+import polars as pl
+import pytest
+
+import app.export as export
+from app.CancelToken import CancelToken, JobCancelled
+
+
+@pytest.fixture
+def frame():
+    return pl.DataFrame({
+        "email": [f"user{i}@example.com" for i in range(1000)],
+        "n": list(range(1000)),
+        "country": [["US", "DE", None][i % 3] for i in range(1000)],
+    })
+
+
+def read(path, fmt):
+    if fmt == "parquet":
+        return pl.read_parquet(path)
+    if fmt == "arrow":
+        return pl.read_ipc(path, memory_map=False)
+    if fmt == "csv.gz":
+        with gzip.open(path) as f:
+            return pl.read_csv(f.read())
+    return pl.read_csv(path)
+
+
+class FakeWorksheet:
+    def __init__(self):
+        self.rows = {}
+
+    def write_row(self, row, column, values):
+        self.rows[row] = list(values)
+
+
+class FakeXlsxWriter:
+    """Stands in for XlsxWriter and keeps what each workbook was given"""
+    def __init__(self):
+        self.workbooks = {}
+
+    def Workbook(self, path, options=None):
+        writer = self
+
+        class Workbook:
+            def __init__(self):
+                self.sheets = []
+                writer.workbooks[path] = self
+
+            def add_worksheet(self, name):
+                self.sheets.append(FakeWorksheet())
+                return self.sheets[-1]
+
+            def worksheets(self):
+                return self.sheets
+
+            def close(self):
+                with open(path, "wb"):
+                    pass
+
+        return Workbook()
+
+
+@pytest.mark.parametrize("fmt", ["csv", "csv.gz", "parquet", "arrow"])
+def test_round_trip_counts_rows_as_written(tmp_path, frame, fmt):
+    path = str(tmp_path / ("out" + export.EXPORT_FORMATS[fmt][1]))
+
+    rows = export.export_frame(frame.lazy().filter(pl.col("n") % 2 == 0), path, columns=["email", "n"])
+
+    assert rows == 500
+    assert read(path, fmt).equals(frame.filter(pl.col("n") % 2 == 0).select(["email", "n"]))
+
+
+def test_empty_result(tmp_path, frame):
+    path = str(tmp_path / "out.csv")
+
+    assert export.export_frame(frame.lazy().filter(pl.col("n") < 0), path) == 0
+    assert pl.read_csv(path).columns == frame.columns
+
+
+def test_cancelled_export_leaves_no_file(tmp_path, frame):
+    path = str(tmp_path / "out.parquet")
+    token = CancelToken()
+    token.cancel()
+
+    with pytest.raises(JobCancelled):
+        export.export_frame(frame.lazy(), path, cancel_token=token)
+    assert not os.path.exists(path)
+
+
+def test_unavailable_format_raises(tmp_path, frame, monkeypatch):
+    monkeypatch.setattr(export, "xlsxwriter", None)
+
+    with pytest.raises(ValueError):
+        export.export_frame(frame, str(tmp_path / "out.xlsx"))
+
+
+def test_xlsx_writes_a_header_and_the_rows(tmp_path, frame, monkeypatch):
+    writer = FakeXlsxWriter()
+    monkeypatch.setattr(export, "xlsxwriter", writer)
+    path = str(tmp_path / "out.xlsx")
+
+    assert export.export_frame(frame, path, columns=["n", "country"]) == 1000
+    sheet = writer.workbooks[path].sheets[0]
+    assert sheet.rows[0] == ["n", "country"]
+    assert sheet.rows[1] == [0, "US"]
+    assert len(sheet.rows) == 1001
+
+
+@pytest.mark.parametrize("fmt", ["csv", "csv.gz"])
+def test_append_adds_rows_without_a_header(tmp_path, frame, fmt):
+    path = str(tmp_path / ("out" + export.EXPORT_FORMATS[fmt][1]))
+    export.export_frame(frame.head(10), path)
+
+    assert export.append_csv(frame.slice(10, 5).lazy(), path) == 5
+    assert export.append_csv(frame.head(0).lazy(), path) == 0
+
+    assert read(path, fmt).equals(frame.head(15))
+
+
+def test_split_by_column(tmp_path, frame):
+    paths, rows = export.export_partitioned(frame.lazy(), str(tmp_path / "out.csv"), {"by": "column", "column": "country"})
+
+    assert rows == 1000
+    directories = sorted(os.path.basename(os.path.dirname(path)) for path in paths)
+    assert directories == sorted(["country=DE", "country=US", f"country={export.HIVE_NULL_PARTITION}"])
+    for path in paths:
+        part = pl.read_csv(path)
+        assert part.columns == ["email", "n", "country"]
+        value = os.path.basename(os.path.dirname(path)).split("=")[1]
+        assert part["country"].drop_nulls().unique().to_list() in ([value], [])
+
+
+def test_split_by_a_column_that_is_not_written(tmp_path, frame):
+    paths, rows = export.export_partitioned(frame, str(tmp_path / "out.parquet"), {"by": "column", "column": "country"},
+                                            columns=["email", "n"])
+
+    assert rows == 1000
+    assert all(pl.read_parquet(path).columns == ["email", "n"] for path in paths)
+    assert sum(pl.read_parquet(path).height for path in paths) == 1000
+
+
+def test_split_by_rows(tmp_path, frame):
+    paths, rows = export.export_partitioned(frame.lazy(), str(tmp_path / "out.arrow"), {"by": "rows", "max_rows": 300})
+
+    assert rows == 1000
+    assert [pl.read_ipc(path, memory_map=False).height for path in paths] == [300, 300, 300, 100]
+    assert pl.concat([pl.read_ipc(path, memory_map=False) for path in paths]).equals(frame)
+
+
+def test_split_by_bytes_and_compressed(tmp_path, frame):
+    paths, rows = export.export_partitioned(frame.lazy(), str(tmp_path / "out.csv.gz"),
+                                            {"by": "bytes", "max_bytes": 2000})
+
+    assert rows == 1000
+    assert len(paths) > 1
+    assert all(path.endswith(".csv.gz") for path in paths)
+    assert sum(read(path, "csv.gz").height for path in paths) == 1000
+
+
+def test_split_refuses_a_directory_with_files(tmp_path, frame):
+    export.export_partitioned(frame, str(tmp_path / "out.csv"), {"by": "rows", "max_rows": 500})
+
+    with pytest.raises(ValueError):
+        export.export_partitioned(frame, str(tmp_path / "out.csv"), {"by": "rows", "max_rows": 500})
+
+
+def test_xlsx_split_by_a_column_that_is_not_written(tmp_path, frame, monkeypatch):
+    writer = FakeXlsxWriter()
+    monkeypatch.setattr(export, "xlsxwriter", writer)
+
+    paths, rows = export.export_partitioned(frame, str(tmp_path / "out.xlsx"), {"by": "column", "column": "country"},
+                                            columns=["email", "n"])
+
+    assert rows == 1000
+    for path in paths:
+        sheet = writer.workbooks[path].sheets[0]
+        assert sheet.rows[0] == ["email", "n"]
+        assert all(len(values) == 2 for values in sheet.rows.values())
@@ -0,0 +1,160 @@
+import os
+import types
+
+import polars as pl
+
+import app.cli as cli
+import app.incremental as incremental
+import app.main as main
+from app.OperationHistory import Operation
+
+HEADER = ["id", "email", "country"]
+
+
+def rows(start, stop):
+    return [(i, f"user{i % 7}@example.com", "US" if i % 3 else "DE") for i in range(start, stop)]
+
+
+def append_lines(path, lines):
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        f.write(lines)
+
+
+def dedup(*columns):
+    return Operation("remove_duplicates", {"selected_column_names": list(columns)})
+
+
+def full_run(tmp_path, input_path, operations):
+    """Output of a plain run over the whole file, what every incremental run must match"""
+    reference = str(tmp_path / "reference.csv")
+    cli.process_file(input_path, [operation.to_dict() for operation in operations], reference)
+    return pl.read_csv(reference, infer_schema=False)
+
+
+def read_output(path):
+    return pl.read_csv(path, infer_schema=False)
+
+
+def test_complete_end_stops_before_a_partial_line(tmp_path):
+    path = tmp_path / "a.csv"
+    path.write_bytes(b"id,name\n1,a\n2,b\n3,c")
+
+    assert incremental.complete_end(str(path)) == len(b"id,name\n1,a\n2,b\n")
+    path.write_bytes(b"id,name")
+    assert incremental.complete_end(str(path)) == 0
+
+
+def test_head_hash_covers_only_bytes_before_the_offset(tmp_path):
+    path = tmp_path / "a.csv"
+    path.write_bytes(b"id,name\n1,a\n2,b\n")
+    offset = len(b"id,name\n1,a\n")
+    digest = incremental.head_hash(str(path), offset)
+
+    path.write_bytes(b"id,name\n1,a\n2,changed\n")
+    assert incremental.head_hash(str(path), offset) == digest
+    path.write_bytes(b"id,name\n1,z\n2,b\n")
+    assert incremental.head_hash(str(path), offset) != digest
+
+
+def test_resume_problems(tmp_path, write_csv):
+    input_path = write_csv("in.csv", HEADER, rows(0, 20))
+    output_path = tmp_path / "out.csv"
+    output_path.write_text("id\n1\n")
+    spec = main.parse_spec(input_path)
+    offset = incremental.complete_end(input_path)
+    state = {"byte_offset": offset, "head_hash": incremental.head_hash(input_path, offset),
+             "output_size": os.path.getsize(output_path)}
+
+    assert incremental.resume_problem(state, input_path, str(output_path), spec) is None
+    assert incremental.resume_problem(None, input_path, str(output_path), spec) == "no earlier run"
+    assert "cannot be read from an offset" in incremental.resume_problem(
+        state, input_path, str(output_path), types.SimpleNamespace(encoding="utf-16"))
+    assert incremental.resume_problem(dict(state, byte_offset=offset + 1), input_path, str(output_path), spec) == \
+        "the file is shorter than at the last run"
+    assert incremental.resume_problem(dict(state, head_hash="0"), input_path, str(output_path), spec) == \
+        "the file changed before the end of the last run"
+    output_path.write_text("id\n1\n2\n")
+    assert incremental.resume_problem(state, input_path, str(output_path), spec) == \
+        "the output changed since the last run"
+
+
+def test_state_key_changes_with_a_subtracted_file(tmp_path, write_csv):
+    input_path = write_csv("in.csv", HEADER, rows(0, 5))
+    exclude_path = write_csv("exclude.csv", ["email"], [("user1@example.com",)])
+    operations = [Operation("subtract", {"file_name": exclude_path, "subtract_column": ["email"]})]
+    key = incremental.state_key(input_path, str(tmp_path / "out.csv"), operations)
+
+    write_csv("exclude.csv", ["email"], [("user1@example.com",), ("user2@example.com",)])
+
+    assert incremental.state_key(input_path, str(tmp_path / "out.csv"), operations) != key
+
+
+def test_appended_rows_are_processed_alone(tmp_path, write_csv):
+    input_path = write_csv("in.csv", HEADER, rows(0, 50))
+    output_path = str(tmp_path / "out.csv")
+    operations = [dedup("email")]
+
+    assert cli.process_appended(input_path, operations, output_path) == (7, 7)
+
+    # New rows repeat emails the first run let through, and the last line is still being written
+    append_lines(input_path, "".join(f"{i},{email},{country}\n" for i, email, country in rows(50, 60)))
+    append_lines(input_path, "60,new@example.com,F")
+    assert cli.process_appended(input_path, operations, output_path) == (7, 0)
+    complete = write_csv("complete.csv", HEADER, rows(0, 60))
+    assert read_output(output_path).equals(full_run(tmp_path, complete, operations))
+
+    append_lines(input_path, "R\n61,other@example.com,US\n")
+    assert cli.process_appended(input_path, operations, output_path) == (9, 2)
+    assert read_output(output_path).equals(full_run(tmp_path, input_path, operations))
+
+    assert cli.process_appended(input_path, operations, output_path) == (9, 0)
+
+
+def test_changed_head_reprocesses_the_whole_file(tmp_path, write_csv, capsys):
+    input_path = write_csv("in.csv", HEADER, rows(0, 30))
+    output_path = str(tmp_path / "out.csv")
+    operations = [dedup("email", "country")]
+    cli.process_appended(input_path, operations, output_path)
+
+    # Same size, different first row
+    with open(input_path, "r+b") as f:
+        f.seek(len(",".join(HEADER)) + 1)
+        f.write(b"0,zzzz0@example.com,DE\n")
+    append_lines(input_path, "".join(f"{i},{email},{country}\n" for i, email, country in rows(30, 40)))
+    capsys.readouterr()
+    cli.process_appended(input_path, operations, output_path)
+
+    assert "the file changed before the end of the last run, processing the whole file" in capsys.readouterr().out
+    assert read_output(output_path).equals(full_run(tmp_path, input_path, operations))
+
+
+def test_edited_output_reprocesses_the_whole_file(tmp_path, write_csv, capsys):
+    input_path = write_csv("in.csv", HEADER, rows(0, 30))
+    output_path = str(tmp_path / "out.csv")
+    operations = [dedup("email")]
+    cli.process_appended(input_path, operations, output_path)
+
+    append_lines(output_path, "999,extra@example.com,US\n")
+    append_lines(input_path, "30,late@example.com,US\n")
+    capsys.readouterr()
+    assert cli.process_appended(input_path, operations, output_path) == (8, 8)
+
+    assert "the output changed since the last run" in capsys.readouterr().out
+    assert read_output(output_path).equals(full_run(tmp_path, input_path, operations))
+
+
+def test_rows_that_do_not_fit_the_sniffed_types_relax_them(tmp_path):
+    # Past the sniffed sample, a code that is not a number
+    input_path = str(tmp_path / "in.csv")
+    pl.DataFrame({"id": range(500000), "code": [i % 1000 for i in range(500000)]}).write_csv(input_path)
+    append_lines(input_path, "500000,AB12\n")
+    output_path = str(tmp_path / "out.csv")
+    operations = [dedup("code")]
+
+    assert main.parse_spec(input_path).has_sniffed_types
+    assert cli.process_appended(input_path, operations, output_path) == (1001, 1001)
+    assert read_output(output_path)["code"][-1] == "AB12"
+
+    append_lines(input_path, "500001,AB12\n500002,CD34\n")
+    assert cli.process_appended(input_path, operations, output_path) == (1002, 1)
+    assert read_output(output_path).equals(full_run(tmp_path, input_path, operations))
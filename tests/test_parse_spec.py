@@ -0,0 +1,91 @@
+import polars as pl
+
+import app.main as main
+from app.ParseSpec import detect_dialect, sniff
+
+
+def write(tmp_path, name, text, encoding="utf-8"):
+    path = tmp_path / name
+    path.write_bytes(text.encode(encoding))
+    return str(path)
+
+
+def test_leading_apostrophes_keep_the_default_dialect(tmp_path):
+    path = write(tmp_path, "q.csv", "id,title,notes\n1,'90s hits,ok\n2,'quoted',fine\n3,plain,x\n4,Rock 'n' roll,y\n")
+
+    spec = sniff(path)
+
+    assert (spec.separator, spec.quote_char) == (",", '"')
+    assert spec.is_default_dialect
+    assert main.scan_csv(path).collect().equals(pl.read_csv(path))
+    assert main.load_csv(path)["title"].to_list() == ["'90s hits", "'quoted'", "plain", "Rock 'n' roll"]
+
+
+def test_single_quoted_values_are_kept_as_they_are(tmp_path):
+    path = write(tmp_path, "urls.csv", "id,website,notes\n1,http://a.com/x?y=1|2,ok\n2,https://b.com,'quoted'\n")
+
+    assert (sniff(path).separator, sniff(path).quote_char) == (",", '"')
+    assert main.load_csv(path)["notes"].to_list() == ["ok", "'quoted'"]
+
+
+def test_single_quotes_are_used_when_only_they_parse(tmp_path):
+    path = write(tmp_path, "names.csv", "id,name\n1,'Smith, John'\n2,'Doe, Jane'\n3,'Roe, Ann'\n")
+
+    spec = sniff(path)
+
+    assert (spec.separator, spec.quote_char) == (",", "'")
+    assert main.load_csv(path)["name"].to_list() == ["Smith, John", "Doe, Jane", "Roe, Ann"]
+
+
+def test_other_separators_are_sniffed(tmp_path):
+    path = write(tmp_path, "semi.csv", "a;b;c\n1;2,5;x\n3;4,5;y\n")
+
+    spec = sniff(path)
+
+    assert spec.separator == ";"
+    assert spec.schema == {"a": pl.Int64, "b": pl.String, "c": pl.String}
+    assert main.load_csv(path).shape == (2, 3)
+
+
+def test_separators_inside_values_do_not_win(tmp_path):
+    pipes = write(tmp_path, "pipes.csv", "id,desc\n1,a|b|c\n2,d|e|f\n3,g|h|i\n")
+    tabs = write(tmp_path, "tabs.csv", "id,desc\n1,a\tb\n2,c\td\n")
+
+    assert sniff(pipes).separator == ","
+    assert sniff(tabs).separator == ","
+    assert main.load_csv(pipes)["desc"].to_list() == ["a|b|c", "d|e|f", "g|h|i"]
+
+
+def test_unclear_samples_fall_back_to_the_defaults():
+    assert detect_dialect("email\na@x.com\nb@y.com\n") == (",", '"')
+    # Ragged with either quote, nothing parses consistently
+    assert detect_dialect("a,b\n1,'x\n2,\"y,z\n3\n") == (",", '"')
+
+
+def test_encoding_and_header(tmp_path):
+    latin = write(tmp_path, "latin1.csv", "name,city\nJosé,München\n", encoding="latin-1")
+    no_header = write(tmp_path, "numbers.csv", "2020,2021,2022\n1,2,3\n4,5,6\n")
+    bom = write(tmp_path, "bom.csv", "﻿id,name\n1,a\n")
+
+    assert sniff(latin).encoding == "cp1252"
+    assert main.load_csv(latin)["city"].to_list() == ["München"]
+    assert not sniff(no_header).has_header
+    assert main.load_csv(no_header).shape == (3, 3)
+    assert sniff(bom).encoding == "utf-8-sig"
+    assert main.load_csv(bom).columns == ["id", "name"]
+
+
+def test_sniffed_types_are_relaxed_for_rows_past_the_sample(tmp_path):
+    path = str(tmp_path / "late.csv")
+    pl.DataFrame({"code": range(700000)}).write_csv(path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("AB12\n")
+
+    assert sniff(path).schema == {"code": pl.Int64}
+    frame = main.scan_csv(path)
+    result = main.with_relaxed_types([path], lambda: main.scan_csv(path).collect())
+
+    assert result.schema == {"code": pl.String}
+    assert result["code"][-1] == "AB12"
+    assert frame.collect_schema() == {"code": pl.Int64}
+    assert main.parse_spec(path).inferred
@@ -0,0 +1,140 @@
+import os
+
+import polars as pl
+
+import app.main as main
+from app.ParsedFileCache import ParsedFileCache
+
+
+def make_csv(tmp_path, name, rows=1000):
+    path = tmp_path / name
+    pl.DataFrame({"id": range(rows), "name": [f"{name}-{i}" for i in range(rows)]}).write_csv(path)
+    return str(path)
+
+
+def set_last_used(path, seconds_ago):
+    when = os.path.getmtime(path) - seconds_ago
+    os.utime(path, (when, when))
+
+
+def test_put_then_get_reads_the_copy(tmp_path):
+    cache = ParsedFileCache(str(tmp_path / "cache"))
+    csv_path = make_csv(tmp_path, "a.csv")
+
+    assert cache.get(csv_path) is None
+    path = cache.put(csv_path, pl.read_csv(csv_path))
+
+    assert cache.get(csv_path) == path
+    assert pl.read_ipc(path).equals(pl.read_csv(csv_path))
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_edited_file_misses(tmp_path):
+    cache = ParsedFileCache(str(tmp_path / "cache"))
+    csv_path = make_csv(tmp_path, "a.csv")
+    cache.put(csv_path, pl.read_csv(csv_path))
+
+    make_csv(tmp_path, "a.csv", rows=10)
+
+    assert cache.get(csv_path) is None
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    csv_paths = [make_csv(tmp_path, name) for name in ("a.csv", "b.csv", "c.csv")]
+    cache = ParsedFileCache(str(tmp_path / "cache"))
+    first = cache.put(csv_paths[0], pl.read_csv(csv_paths[0]))
+    # Room for two entries only
+    cache.max_bytes = int(os.path.getsize(first) * 2.5)
+    second = cache.put(csv_paths[1], pl.read_csv(csv_paths[1]))
+    set_last_used(first, 20)
+    set_last_used(second, 10)
+
+    # Reading the older entry makes the other one the least recently used
+    assert cache.get(csv_paths[0]) == first
+    third = cache.put(csv_paths[2], pl.read_csv(csv_paths[2]))
+
+    assert os.path.exists(first)
+    assert not os.path.exists(second)
+    assert os.path.exists(third)
+    assert cache.get(csv_paths[1]) is None
+    assert cache.size() <= cache.max_bytes
+
+
+def test_new_entry_is_kept_even_when_alone_near_the_limit(tmp_path):
+    csv_paths = [make_csv(tmp_path, name) for name in ("a.csv", "b.csv")]
+    cache = ParsedFileCache(str(tmp_path / "cache"))
+    first = cache.put(csv_paths[0], pl.read_csv(csv_paths[0]))
+    cache.max_bytes = int(os.path.getsize(first) * 1.5)
+
+    second = cache.put(csv_paths[1], pl.read_csv(csv_paths[1]))
+
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
+
+
+def test_oversized_entry_is_not_parsed_again(tmp_path):
+    csv_path = make_csv(tmp_path, "a.csv")
+    cache = ParsedFileCache(str(tmp_path / "cache"), max_bytes=100)
+    scans = []
+
+    def scan():
+        scans.append(csv_path)
+        return pl.scan_csv(csv_path)
+
+    assert cache.get_or_create(csv_path, scan=scan) is None
+    assert cache.get_or_create(csv_path, scan=scan) is None
+    assert len(scans) == 1
+    assert cache.entries() == []
+
+
+def test_scan_csv_does_not_fill_the_cache(tmp_path):
+    csv_path = make_csv(tmp_path, "a.csv")
+
+    frame = main.scan_csv(csv_path)
+
+    assert frame.collect().height == 1000
+    assert main.PARSED_FILE_CACHE.entries() == []
+    assert main.parsed_copy(csv_path) is None
+
+
+def test_cached_csv_skips_files_larger_than_the_cache(tmp_path, monkeypatch):
+    csv_path = make_csv(tmp_path, "a.csv")
+    monkeypatch.setattr(main.PARSED_FILE_CACHE, "max_bytes", os.path.getsize(csv_path) - 1)
+
+    assert main.cached_csv(csv_path) is None
+    assert main.PARSED_FILE_CACHE.entries() == []
+
+
+def test_cached_csv_fills_the_cache_for_loads(tmp_path):
+    csv_path = make_csv(tmp_path, "a.csv")
+
+    path = main.cached_csv(csv_path)
+
+    assert path is not None
+    assert main.parsed_copy(csv_path) == path
+    assert pl.read_ipc(path).equals(pl.read_csv(csv_path))
+
+
+def test_streamed_entry_replaces_a_mapped_one(tmp_path):
+    cache = ParsedFileCache(str(tmp_path / "cache"))
+    csv_path = make_csv(tmp_path, "a.csv")
+    mapped = cache.put(csv_path, pl.read_csv(csv_path))
+
+    streamed = cache.put(csv_path, pl.scan_csv(csv_path))
+
+    assert not cache.is_compressed(mapped)
+    assert cache.is_compressed(streamed)
+    assert not os.path.exists(mapped)
+    assert cache.get(csv_path) == streamed
+    assert [path for path, _, _ in cache.entries()] == [streamed]
+
+
+def test_loads_from_streamed_entries_do_not_warn(tmp_path, monkeypatch, capfd):
+    csv_path = make_csv(tmp_path, "a.csv")
+    monkeypatch.setattr(main, "use_streaming", lambda file_name, threshold=None: True)
+
+    assert main.load_csv(csv_path).equals(pl.read_csv(csv_path))
+    assert main.PARSED_FILE_CACHE.is_compressed(main.parsed_copy(csv_path))
+    assert main.load_csv(csv_path).equals(pl.read_csv(csv_path))
+
+    assert "memory_map" not in capfd.readouterr().err
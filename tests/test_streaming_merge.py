@@ -0,0 +1,90 @@
+import os
+import threading
+
+import polars as pl
+import pytest
+
+import app.main as main
+from app.CancelToken import CancelToken, JobCancelled
+from app.WorkingSetStore import WorkingSetStore
+
+
+class CountingScan:
+    """Counts the rows each input hands to the merge, to tell how often it is read"""
+    def __init__(self):
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, frame):
+        with self._lock:
+            self.rows += frame.height
+        return frame
+
+    def wrap(self, lf):
+        # Without pushdown, a filter above the count cannot thin out what it sees
+        return lf.map_batches(self, schema=lf.collect_schema(), streamable=True, predicate_pushdown=False)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = WorkingSetStore(str(tmp_path / "working-set"))
+    yield store
+    store.close()
+
+
+def inputs(tmp_path):
+    paths = []
+    for index in range(3):
+        path = str(tmp_path / f"part{index}.csv")
+        start = index * 3000
+        pl.DataFrame({
+            "email": [f"user{i % 4000}@example.com" if i % 97 else None for i in range(start, start + 5000)],
+            "value": list(range(start, start + 5000)),
+        }).write_csv(path)
+        paths.append(path)
+    # A column only one file has, filled with nulls for the others
+    pl.DataFrame({"email": ["user1@example.com", "late@example.com"], "value": [1, 2], "extra": ["x", "y"]}).write_csv(
+        str(tmp_path / "extra.csv"))
+    return paths + [str(tmp_path / "extra.csv")]
+
+
+@pytest.mark.parametrize("partitions", [1, 4, 16])
+def test_same_keys_as_the_in_memory_merge(tmp_path, store, partitions):
+    paths = inputs(tmp_path)
+    expected = main.merge_frames([pl.read_csv(path) for path in paths], "email")
+
+    result = pl.read_ipc(main.streaming_merge([pl.scan_csv(path) for path in paths], "email", partitions, store),
+                         memory_map=False)
+
+    assert result.height == expected.height
+    assert result.columns == expected.columns
+    assert result["email"].n_unique() == result.height
+    assert sorted(result["email"].to_list(), key=str) == sorted(expected["email"].to_list(), key=str)
+
+
+def test_inputs_are_read_once(tmp_path, store):
+    paths = inputs(tmp_path)
+    counter = CountingScan()
+    frames = [counter.wrap(pl.scan_csv(path)) for path in paths]
+
+    main.streaming_merge(frames, "email", 8, store)
+
+    assert counter.rows == sum(pl.read_csv(path).height for path in paths)
+
+
+def test_parts_are_cleaned_up(tmp_path, store):
+    paths = inputs(tmp_path)
+
+    result_path = main.streaming_merge([pl.scan_csv(path) for path in paths], "email", 4, store)
+
+    assert os.listdir(store.directory) == [os.path.basename(result_path)]
+
+
+def test_cancelled_merge_leaves_nothing_behind(tmp_path, store):
+    paths = inputs(tmp_path)
+    token = CancelToken()
+    token.cancel()
+
+    with pytest.raises(JobCancelled):
+        main.streaming_merge([pl.scan_csv(path) for path in paths], "email", 4, store, cancel_token=token)
+    assert os.listdir(store.directory) == []
@@ -0,0 +1,63 @@
+import polars as pl
+import pytest
+
+import app.main as main
+
+
+def baseline_subtract(frame, exclude_frame, column):
+    """The subtract before the anti-join, an is_in filter on one column"""
+    values = exclude_frame.select(pl.col(column)).unique().to_series()
+    return frame.filter(~pl.col(column).is_in(values))
+
+
+def test_matches_baseline_without_nulls():
+    frame = pl.DataFrame({"id": [1, 2, 3, 2, 5], "value": ["a", "b", "c", "d", "e"]})
+    exclude = pl.DataFrame({"id": [2, 5, 9]})
+
+    assert main.subtract_frame(frame, exclude, "id").equals(baseline_subtract(frame, exclude, "id"))
+
+
+def test_null_keys_are_kept():
+    frame = pl.DataFrame({"id": [1, None, 2, None], "value": ["a", "b", "c", "d"]})
+    exclude = pl.DataFrame({"id": [1, None]})
+
+    result = main.subtract_frame(frame, exclude, "id")
+
+    # The baseline dropped null keys, the anti-join keeps them
+    assert baseline_subtract(frame, exclude, "id")["value"].to_list() == ["c"]
+    assert result["value"].to_list() == ["b", "c", "d"]
+    assert result.filter(pl.col("id").is_not_null()).equals(baseline_subtract(frame, exclude, "id"))
+
+
+def test_mixed_key_types_are_cast_to_the_frame():
+    frame = pl.DataFrame({"id": [1, 7, 2, None], "value": ["a", "b", "c", "d"]})
+    exclude = pl.DataFrame({"id": ["1", "007", "AB12", None]})
+
+    with pytest.raises(pl.exceptions.InvalidOperationError):
+        baseline_subtract(frame, exclude, "id")
+    # "007" converts to 7, "AB12" becomes null and matches nothing
+    assert main.subtract_frame(frame, exclude, "id")["value"].to_list() == ["c", "d"]
+
+
+def test_mixed_types_match_baseline_once_cast():
+    frame = pl.DataFrame({"id": [1.5, 7.0, 2.0, 3.25], "value": ["a", "b", "c", "d"]})
+    exclude = pl.DataFrame({"id": ["1.50", "007", "x"]})
+
+    expected = baseline_subtract(frame, exclude.select(pl.col("id").cast(pl.Float64, strict=False)), "id")
+    assert main.subtract_frame(frame, exclude, "id").equals(expected)
+
+
+def test_lazy_input_gives_the_same_rows():
+    frame = pl.DataFrame({"id": [1, None, 3, 4], "name": ["a", "b", "c", None]})
+    exclude = pl.DataFrame({"id": ["3", None], "name": ["c", "b"]})
+
+    result = main.subtract_frame(frame.lazy(), exclude.lazy(), ["id", "name"])
+
+    assert isinstance(result, pl.LazyFrame)
+    assert result.collect().equals(main.subtract_frame(frame, exclude, ["id", "name"]))
+    assert result.collect()["id"].to_list() == [1, None, 4]
+
+
+def test_missing_column_raises():
+    with pytest.raises(ValueError):
+        main.subtract_frame(pl.DataFrame({"id": [1]}), pl.DataFrame({"other": [1]}), "id")
@@ -0,0 +1,78 @@
+import polars as pl
+import pytest
+
+import app.main as main
+import utils
+
+
+@pytest.fixture
+def frame():
+    return pl.DataFrame({
+        "name": ["Alice Smith", "BOB", "carol", None, "Dave Jones"],
+        "note": ["a.b", "x", "VIP client", "vip", "axb"],
+    })
+
+
+def names(frame):
+    return frame["name"].to_list()
+
+
+@pytest.mark.parametrize("case_insensitive, expected", [
+    (True, ["Alice Smith", "BOB", "carol"]),
+    (False, ["carol"]),
+])
+def test_literal_values(frame, case_insensitive, expected):
+    result = main.filter_word_match(frame, ["name"], ["alice", "bob", "carol"],
+                                    case_insensitive=case_insensitive, literal=True)
+
+    assert names(result) == expected
+
+
+def test_literal_values_are_not_patterns(frame):
+    result = main.filter_word_match(frame, ["note"], ["a.b"], literal=True)
+
+    assert names(result) == ["Alice Smith"]
+
+
+@pytest.mark.parametrize("pattern, expected", [
+    (r"\S+\s\S+", ["Alice Smith", "Dave Jones"]),
+    (r"^\w+$", ["BOB", "carol"]),
+    (r"^B", ["BOB"]),
+    ("^b", ["BOB"]),
+])
+def test_regex_ignoring_case_keeps_escapes(frame, pattern, expected):
+    result = main.filter_word_match(frame, ["name"], [pattern], case_insensitive=True)
+
+    assert names(result) == expected
+
+
+def test_regex_case_sensitive(frame):
+    result = main.filter_word_match(frame, ["name"], [r"^[A-Z]+$", "^c"], case_insensitive=False)
+
+    assert names(result) == ["BOB", "carol"]
+
+
+def test_any_column_and_exclude(frame):
+    values = ["vip", "jones"]
+
+    included = main.filter_word_match(frame, ["name", "note"], values)
+    excluded = main.filter_word_match(frame, ["name", "note"], values, include=False)
+
+    assert names(included) == ["carol", None, "Dave Jones"]
+    assert names(excluded) == ["Alice Smith", "BOB"]
+
+
+def test_lazy_frames_match_like_eager(frame):
+    result = main.filter_word_match(frame.lazy(), ["name"], [r"\s"]).collect()
+
+    assert names(result) == ["Alice Smith", "Dave Jones"]
+
+
+def test_console_word_match_uses_the_same_matcher(tmp_path, frame):
+    path = str(tmp_path / "people.csv")
+    frame.write_csv(path)
+
+    _, rows, result = utils.word_match(path, ["name"], [r"\S+\s\S+"])
+
+    assert rows == 2
+    assert names(result) == ["Alice Smith", "Dave Jones"]
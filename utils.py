@@ -1,25 +1,20 @@
 import polars as pl
 import os
 
+from app.main import word_match_mask
+
 def load_csv(file_name):
     if not os.path.exists(file_name):
         print("File not found!")
         return None
     return pl.read_csv(file_name)
 
-def word_match(file_name, selected_column_names, search_values, include=True, case_insensitive=True):
+def word_match(file_name, selected_column_names, search_values, include=True, case_insensitive=True, literal=False):
     df = load_csv(file_name)
     if df is None:
         return None, 0, None
 
-    if case_insensitive:
-        masks = [pl.any_horizontal([pl.col(col).cast(str).str.to_lowercase().str.contains(val.lower()) for val in search_values]) for col in selected_column_names]
-        mask = pl.any_horizontal(masks)
-    else:
-        search_pattern = "|".join(search_values)
-        masks = [pl.col(col).cast(str).str.contains(search_pattern) for col in selected_column_names]
-        mask = pl.any_horizontal(masks)
-    
+    mask = word_match_mask(selected_column_names, search_values, case_insensitive, literal)
     filtered_df = df.filter(mask if include else ~mask)
     row_count = filtered_df.shape[0]
     print(f"Filtered rows count: {row_count}")
@@ -82,6 +77,11 @@ def main():
             print("2. Case insensitive")
             case_insensitive = input("Enter your choice: ") == '2'
             
+            print("Match mode:")
+            print("1. Literal values")
+            print("2. Regular expressions")
+            literal = input("Enter your choice: ") != '2'
+            
             print("Select columns by number:")
             for idx, col in enumerate(current_df.columns, start=1):
                 print(f"{col} --- {idx}")
@@ -91,7 +91,7 @@ def main():
             search_values = input("Enter Search values (comma-separated): ").split(',')
             search_values = [value.strip() for value in search_values]
             
-            current_df = word_match(file_name, selected_column_names, search_values, include, case_insensitive)[2]
+            current_df = word_match(file_name, selected_column_names, search_values, include, case_insensitive, literal)[2]
             
         elif choice == '2':
             print("Select columns by number to check duplicates:")